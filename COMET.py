@@ -1,3 +1,94 @@
+import argparse
+import bisect
+import collections
+import contextlib
+import gc
+import glob
+import hashlib
+import heapq
+import hmac
+import os
+import pickle
+import stat
+import sys
+import tempfile
+import urllib.parse
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl, so the data directory is not locked there
+    fcntl = None
+
+# How passwords are hashed, as 'scrypt:<log2 of n>' or 'pbkdf2_sha256:<iterations>'
+# The cost can be raised or lowered with the LOZOL_KDF environment variable (see bench_login.py)
+DEFAULT_KDF = 'scrypt:14'
+
+def parse_kdf(kdf):
+    '''Splits a KDF setting such as 'scrypt:14' into its algorithm and cost.'''
+    algorithm, _, cost = kdf.partition(':')
+    if algorithm not in ('scrypt', 'pbkdf2_sha256') or not cost.isdigit():
+        raise ValueError(f'Unknown password hashing setting {kdf!r}')
+    return algorithm, int(cost)
+
+def current_kdf():
+    return parse_kdf(os.environ.get('LOZOL_KDF', DEFAULT_KDF))
+
+def derive_key(password, algorithm, cost, salt):
+    if algorithm == 'scrypt':
+        n = 2 ** cost
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=8, p=1, maxmem=256 * n * 8 + 2 ** 20)
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, cost)
+
+def hash_password(password, kdf=None):
+    '''Hashes a password with a random salt.
+
+    Args:
+        password: The password in plain text
+        kdf: The KDF setting to hash with, such as 'scrypt:14', or None to use the current one
+
+    Returns:
+        A string in the form "algorithm$cost$salt$hash" that can be stored in users.txt.
+    '''
+    algorithm, cost = parse_kdf(kdf) if kdf is not None else current_kdf()
+    salt = os.urandom(16)
+    return f'{algorithm}${cost}${salt.hex()}${derive_key(password, algorithm, cost, salt).hex()}'
+
+def is_hashed(stored):
+    return stored.startswith(('scrypt$', 'pbkdf2_sha256$')) and stored.count('$') == 3
+
+def check_password(stored, password):
+    '''Checks a password against what is stored for a user, taking the same time wherever they differ.
+
+    Passwords from before hashing was added are stored in plain text and are still accepted.
+    '''
+    if not is_hashed(stored):
+        return hmac.compare_digest(stored.encode(), password.encode())
+    algorithm, cost, salt, key = stored.split('$')
+    return hmac.compare_digest(derive_key(password, algorithm, int(cost), bytes.fromhex(salt)), bytes.fromhex(key))
+
+# How students on a waitlist are ordered, set with the LOZOL_WAITLIST environment variable
+# 'time' promotes students in the order they joined, 'seniority' promotes students who have taken the most courses first
+WAITLIST_PRIORITIES = {
+    'time': lambda student, prev_enrolled: 0,
+    'seniority': lambda student, prev_enrolled: -len(prev_enrolled),
+}
+
+def waitlist_priority(student, prev_enrolled):
+    '''Returns the priority of a student joining a waitlist, where lower numbers are promoted first.'''
+    setting = os.environ.get('LOZOL_WAITLIST', 'time')
+    if setting not in WAITLIST_PRIORITIES:
+        raise ValueError(f'Unknown waitlist setting {setting!r}')
+    return WAITLIST_PRIORITIES[setting](student, prev_enrolled)
+
+def needs_rehash(stored):
+    '''Returns True if the stored password is in plain text or was hashed with a different setting than the current one.'''
+    if not is_hashed(stored):
+        return True
+    algorithm, cost, _, _ = stored.split('$')
+    return (algorithm, int(cost)) != current_kdf()
+
 class User:
     '''A user which may be either an Admin or a Student
 
@@ -5,9 +96,19 @@ class User:
         username: The username used to log in to Lozol
         password: The password used to log in to Lozol
     '''
+    __slots__ = ('username', 'password')
+
     def __init__(self, username, password):
-        self.username = username
+        self.username = sys.intern(username)
         self.password = password
+
+    def check_password(self, password):
+        '''Returns True if the given password is this user's password.'''
+        return check_password(self.password, password)
+
+    def set_password(self, password):
+        '''Changes this user's password, storing only its hash.'''
+        self.password = hash_password(password)
     
 class Admin(User):
     '''An user which can create and remove classes and courses.
@@ -16,6 +117,8 @@ class Admin(User):
         username: The username used to log in to Lozol
         password: The password used to log in to Lozol
     '''
+    __slots__ = ()
+
     def __init__(self, username, password):
         super().__init__(username, password)
     
@@ -31,6 +134,8 @@ class Student(User):
         name: The actual name of the student
         unit_limit: The maximum amount of units the student is allowed to enrol in at a time
     '''
+    __slots__ = ('name', 'unit_limit')
+
     def __init__(self, id_number, password, name, unit_limit):
         super().__init__(id_number, password)
         self.name = name
@@ -46,11 +151,14 @@ class Course:
         course_name: The actual name of the course
         units: The amount of units the course is worse
         prereqs: A list of the names of the prerequisite courses this course requires
+            (older files may have 'None' here for a course without any, which is ignored)
     '''
+    __slots__ = ('course_name', 'units', 'prereqs')
+
     def __init__(self, course_name, units, prereqs):
-        self.course_name = course_name
+        self.course_name = sys.intern(course_name)
         self.units = units
-        self.prereqs = prereqs
+        self.prereqs = [sys.intern(pr) for pr in prereqs if pr != 'None']
 
     def info(self):
         info = [f'{self.course_name} / {self.units} / ']
@@ -61,35 +169,1222 @@ class Course:
                 info.append(f'{pr} ')
         return ''.join(info)
 
+class Roster:
+    '''The student IDs enrolled in a class, kept in the order that they were enrolled.
+
+    Backed by a dictionary so that checking, adding, and removing a student takes constant time
+    while still iterating in enrolment order. A student ID can only be in the roster once.
+    Student IDs are interned so that every roster shares the same string for the same student.
+    '''
+    __slots__ = ('_ids',)
+
+    def __init__(self, student_ids=()):
+        self._ids = dict.fromkeys(map(sys.intern, student_ids))
+
+    def __contains__(self, student_id):
+        return student_id in self._ids
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __repr__(self):
+        return f'Roster({list(self._ids)})'
+
+    def add(self, student_id):
+        '''Adds the student to the end of the roster.
+
+        Returns:
+            True if the student was added, False if the student was already in the roster.
+        '''
+        if student_id in self._ids:
+            return False
+        self._ids[sys.intern(student_id)] = None
+        return True
+
+    def discard(self, student_id):
+        '''Removes the student from the roster.
+
+        Returns:
+            True if the student was removed, False if the student was not in the roster.
+        '''
+        if student_id not in self._ids:
+            return False
+        del self._ids[student_id]
+        return True
+
+class Waitlist:
+    '''The students waiting for a seat in a full class, kept in a heap so that the next one is found in O(log n).
+
+    Students with a lower priority number are promoted first, and students with the same priority are
+    promoted in the order that they joined. Leaving the waitlist only marks the student's entry, which
+    is thrown away once it reaches the top of the heap.
+    '''
+    __slots__ = ('_heap', '_entries', '_joined')
+
+    def __init__(self, entries=()):
+        self._heap = []
+        self._entries = {}
+        self._joined = 0
+        for student_id, priority in entries:
+            self.add(student_id, priority)
+
+    def __contains__(self, student_id):
+        return student_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return (student_id for student_id, _ in self.entries())
+
+    def __repr__(self):
+        return f'Waitlist({self.entries()})'
+
+    def add(self, student_id, priority=0):
+        '''Adds the student to the waitlist.
+
+        Returns:
+            True if the student was added, False if the student was already on the waitlist.
+        '''
+        if student_id in self._entries:
+            return False
+        entry = [priority, self._joined, sys.intern(student_id)]
+        self._joined += 1
+        heapq.heappush(self._heap, entry)
+        self._entries[entry[2]] = entry
+        return True
+
+    def discard(self, student_id):
+        '''Removes the student from the waitlist.
+
+        Returns:
+            True if the student was removed, False if the student was not on the waitlist.
+        '''
+        entry = self._entries.pop(student_id, None)
+        if entry is None:
+            return False
+        entry[2] = None
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = [entry for entry in self._heap if entry[2] is not None]
+            heapq.heapify(self._heap)
+        return True
+
+    def pop(self):
+        '''Removes and returns the student ID that is next in line, or None if the waitlist is empty.'''
+        while self._heap:
+            _, _, student_id = heapq.heappop(self._heap)
+            if student_id is not None:
+                del self._entries[student_id]
+                return student_id
+        return None
+
+    def entries(self):
+        '''Returns a list of (student ID, priority) in the order that the students will be promoted.'''
+        return [(student_id, priority) for priority, _, student_id in sorted(self._entries.values())]
+
+    def info(self):
+        info = []
+        for student_id, priority in self.entries():
+            info.append(f'{student_id}:{priority} ' if priority else f'{student_id} ')
+        return ''.join(info)
+
+def parse_waitlist(waitlist):
+    '''Takes the space separated "student_id" or "student_id:priority" entries of a waitlist and returns a Waitlist.'''
+    entries = []
+    for entry in waitlist.split():
+        student_id, _, priority = entry.partition(':')
+        entries.append((student_id, int(priority) if priority else 0))
+    return Waitlist(entries)
+
+DAYS = ('MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN')
+
+def parse_times(times):
+    '''Takes space separated meeting times such as "MON0900-1030 WED0900-1030" and returns them as minutes of the week.
+
+    Returns:
+        A sorted tuple of (start, end) pairs, counting minutes from Monday 00:00.
+
+    Raises:
+        ValueError: If a meeting time is not in the form DAYhhmm-hhmm, ends before it starts, or overlaps
+            another of the meeting times (a Timetable relies on the times of a class never overlapping).
+    '''
+    slots = []
+    for slot in times.split():
+        day, start, end = slot[:3].upper(), slot[3:7], slot[8:]
+        if day not in DAYS or len(slot) != 12 or slot[7] != '-' or not (start + end).isdigit():
+            raise ValueError(f'Meeting time {slot!r} is not in the form DAYhhmm-hhmm')
+        start = int(start[:2]) * 60 + int(start[2:])
+        end = int(end[:2]) * 60 + int(end[2:])
+        if not start < end <= 24 * 60:
+            raise ValueError(f'Meeting time {slot!r} must end after it starts and on the same day')
+        slots.append((DAYS.index(day) * 24 * 60 + start, DAYS.index(day) * 24 * 60 + end))
+    slots.sort()
+    for before, after in zip(slots, slots[1:]):
+        if after[0] < before[1]:
+            raise ValueError(f'Meeting times {format_times((before,))} and {format_times((after,))} overlap')
+    return tuple(slots)
+
+def format_times(times):
+    '''Returns meeting times as minutes of the week in the form parse_times() reads.'''
+    formatted = []
+    for start, end in times:
+        day, start = divmod(start, 24 * 60)
+        end = end - day * 24 * 60
+        formatted.append(f'{DAYS[day]}{start // 60:02}{start % 60:02}-{end // 60:02}{end % 60:02}')
+    return ' '.join(formatted)
+
+class Timetable:
+    '''The meeting times of the classes of one student or one classroom, sorted so that a clash is found in O(log n).
+
+    The meeting times in a timetable never overlap each other, so only the meeting time starting just
+    before a new one and those starting before it ends need to be looked at.
+    '''
+    __slots__ = ('_starts', '_slots')
+
+    def __init__(self):
+        self._starts = []
+        self._slots = []
+
+    def __len__(self):
+        return len(self._slots)
+
+    def clash(self, start, end, ignore=None):
+        '''Returns the key of a class meeting at the same time as start to end, or None if there is none.
+
+        Args:
+            start: The start of the meeting time in minutes of the week
+            end: The end of the meeting time in minutes of the week
+            ignore: The key of a class whose own meeting times should not count as a clash
+        '''
+        i = bisect.bisect_left(self._starts, start)
+        if i > 0 and self._slots[i - 1][1] > start and self._slots[i - 1][2] != ignore:
+            return self._slots[i - 1][2]
+        while i < len(self._slots) and self._starts[i] < end:
+            if self._slots[i][2] != ignore:
+                return self._slots[i][2]
+            i += 1
+        return None
+
+    def add(self, start, end, key):
+        i = bisect.bisect_left(self._slots, (start, end, key))
+        self._starts.insert(i, start)
+        self._slots.insert(i, (start, end, key))
+
+    def remove(self, start, end, key):
+        i = bisect.bisect_left(self._slots, (start, end, key))
+        if i < len(self._slots) and self._slots[i] == (start, end, key):
+            del self._starts[i]
+            del self._slots[i]
+
 class Class:
     '''Teaches a course, can have many students enrolled in a class.
 
     Attributes:
         course_name: The name of the course the class is teaching
         classroom: The classroom name or location
-        student_ids: A list of the student_ids enrolled in this class
+        student_ids: A Roster of the student_ids enrolled in this class
+        capacity: The most students that can be enrolled in this class, or None if there is no limit
+        waitlist: A Waitlist of the students waiting for a seat in this class
+        times: A tuple of the (start, end) meeting times of this class in minutes of the week
     '''
-    def __init__(self, course_name, classroom, student_ids):
-        self.course_name = course_name
-        self.classroom = classroom
-        self.student_ids = student_ids
+    __slots__ = ('course_name', 'classroom', 'student_ids', 'capacity', 'waitlist', 'times')
+
+    def __init__(self, course_name, classroom, student_ids, capacity=None, waitlist=None, times=()):
+        self.course_name = sys.intern(course_name)
+        self.classroom = sys.intern(classroom)
+        self.student_ids = Roster(student_ids)
+        self.capacity = capacity
+        self.waitlist = waitlist if waitlist is not None else Waitlist()
+        self.times = tuple(times)
+
+    def is_full(self):
+        return self.capacity is not None and len(self.student_ids) >= self.capacity
+
+    def seats(self):
+        '''Returns the seats taken out of the capacity as a string, such as "28/30", or "open" if there is no limit.'''
+        if self.capacity is None:
+            return 'open'
+        return f'{len(self.student_ids)}/{self.capacity}'
     
     def info(self):
         info = [f'{self.course_name} / {self.classroom} / ']
         for s_id in self.student_ids:
             info.append(f'{s_id} ')
+        # Classes without a limit, a waitlist, or meeting times are written the same way as before those were added
+        if self.capacity is not None or self.waitlist or self.times:
+            info.append(f' / {self.capacity} / {self.waitlist.info()}')
+        if self.times:
+            info.append(f' / {format_times(self.times)}')
         return ''.join(info)
 
+class SortedIndex:
+    '''Keys kept in sorted order as they are added and removed, so that listing them never needs a sort.
+
+    Works like a set of keys. Keys added out of order (as when loading) and keys removed are only noted,
+    and are merged into the sorted keys together the next time the index is listed, so loading or
+    importing n keys takes O(n log n) instead of O(n) per key, even when adds and removes are mixed.
+    A page of the keys starting with a given prefix is found with a binary search.
+    '''
+    __slots__ = ('_keys', '_added', '_removed')
+
+    def __init__(self, keys=()):
+        self._keys = sorted(set(keys))
+        self._added = set()
+        self._removed = set()
+
+    def _sort(self):
+        if self._removed:
+            removed = self._removed
+            self._keys = [key for key in self._keys if key not in removed]
+            self._removed = set()
+        if self._added:
+            self._keys.extend(sorted(self._added))
+            self._keys.sort()
+            self._added = set()
+
+    def _in_sorted(self, key):
+        i = bisect.bisect_left(self._keys, key)
+        return i < len(self._keys) and self._keys[i] == key
+
+    def __contains__(self, key):
+        if key in self._added:
+            return True
+        return key not in self._removed and self._in_sorted(key)
+
+    def __len__(self):
+        return len(self._keys) + len(self._added) - len(self._removed)
+
+    def __iter__(self):
+        self._sort()
+        return iter(self._keys)
+
+    def __repr__(self):
+        return f'SortedIndex({list(self)})'
+
+    def add(self, key):
+        if key in self._removed:
+            self._removed.discard(key)
+        elif not self._added and (not self._keys or key > self._keys[-1]):
+            self._keys.append(key)
+        elif not self._in_sorted(key):
+            self._added.add(key)
+
+    def discard(self, key):
+        if key in self._added:
+            self._added.discard(key)
+        elif self._in_sorted(key):
+            self._removed.add(key)
+
+    def _prefix_range(self, prefix):
+        self._sort()
+        start = bisect.bisect_left(self._keys, prefix)
+        end = bisect.bisect_left(self._keys, prefix + chr(sys.maxunicode)) if prefix else len(self._keys)
+        return start, end
+
+    def starting_with(self, prefix):
+        '''Returns a sorted list of the keys that start with the prefix.'''
+        start, end = self._prefix_range(prefix)
+        return self._keys[start:end]
+
+    def page(self, number, size, prefix=''):
+        '''Returns one page of the keys that start with the prefix.
+
+        Args:
+            number: The number of the page, starting from 0
+            size: The number of keys on a page
+            prefix: The start that every key listed must have
+
+        Returns:
+            A tuple of the list of keys on the page and the number of keys that start with the prefix.
+        '''
+        start, end = self._prefix_range(prefix)
+        first = start + number * size
+        return self._keys[first:min(end, first + size)], end - start
+
+def within_one_edit(a, b):
+    '''Returns True if a can be turned into b by adding, removing, or changing at most one character.'''
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]
+    return a[i:] == b[i + 1:]
+
+class SearchIndex:
+    '''Finds records by the start of any of their words, or by a word typed with one mistake.
+
+    The words are kept in a SortedIndex, so the words starting with what was typed are found with a binary
+    search, and are also kept reversed in a second one. A word with one mistake in it still has either its
+    first half or its second half right, so the only words that need to be compared with it are those
+    starting with its first half or ending with its second half.
+
+    Words are matched without caring about case.
+    '''
+    __slots__ = ('_words', '_keys', '_prefixes', '_suffixes')
+
+    def __init__(self, entries=()):
+        '''Builds the index from (key, words) pairs in one go, which is much faster than updating it with each of them.'''
+        self._words = {}
+        self._keys = {}
+        for key, words in entries:
+            words = tuple({word.lower() for word in words})
+            if words:
+                self._words[key] = words
+            for word in words:
+                keys = self._keys.get(word)
+                if keys is None:
+                    self._keys[word] = {key}
+                else:
+                    keys.add(key)
+        self._prefixes = SortedIndex(self._keys)
+        self._suffixes = SortedIndex(word[::-1] for word in self._keys)
+
+    def update(self, key, words):
+        '''Sets the words that the record with the given key can be found by, replacing any it had before.'''
+        words = tuple({word.lower() for word in words})
+        for word in self._words.pop(key, ()):
+            keys = self._keys[word]
+            keys.discard(key)
+            if not keys:
+                del self._keys[word]
+                self._prefixes.discard(word)
+                self._suffixes.discard(word[::-1])
+        if words:
+            self._words[key] = words
+        for word in words:
+            if word not in self._keys:
+                self._keys[word] = set()
+                self._prefixes.add(word)
+                self._suffixes.add(word[::-1])
+            self._keys[word].add(key)
+
+    def starts_with(self, prefix):
+        '''Returns a set of the keys of the records with a word starting with the prefix.'''
+        keys = set()
+        for word in self._prefixes.starting_with(prefix.lower()):
+            keys.update(self._keys[word])
+        return keys
+
+    def fuzzy(self, word):
+        '''Returns a set of the keys of the records with a word at most one mistake away from the given word.'''
+        word = word.lower()
+        half = len(word) // 2
+        candidates = set(self._prefixes.starting_with(word[:half]))
+        candidates.update(reversed_word[::-1] for reversed_word in self._suffixes.starting_with(word[half:][::-1]))
+        keys = set()
+        for candidate in candidates:
+            if within_one_edit(word, candidate):
+                keys.update(self._keys[candidate])
+        return keys
+
+class Records(dict):
+    '''A dictionary of records that remembers which of its records were changed since it was last saved.
+
+    Records that are edited in place (rather than added or removed) should be marked with touch().
+    Subclasses that set keep_sorted also keep their keys in a SortedIndex for listing, and subclasses
+    that override search_words() can be searched with find().
+
+    Every record also has a version stamp, the checksum of its line in the text file as it was last read
+    or written. When another session saves the same file, comparing stamps shows which records it changed.
+
+    Attributes:
+        changed: A set of the keys of the records that were added, removed, or edited since the last save
+        versions: A dictionary mapping a key to the version stamp of the record as it is in the text file
+        file_stamp: The file_stamp() of the text file when it was last read or written, or None
+        sorted_keys: A SortedIndex of the keys, if keep_sorted is set
+    '''
+    keep_sorted = False
+
+    def __init__(self):
+        super().__init__()
+        self.changed = set()
+        self.versions = {}
+        self.file_stamp = None
+        self._search = None
+        if self.keep_sorted:
+            self.sorted_keys = SortedIndex()
+
+    def __setitem__(self, key, value):
+        if self.keep_sorted and key not in self:
+            self.sorted_keys.add(key)
+        super().__setitem__(key, value)
+        self.changed.add(key)
+        if self._search is not None:
+            self._search.update(key, self.search_words(key, value))
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.changed.add(key)
+        if self.keep_sorted:
+            self.sorted_keys.discard(key)
+        if self._search is not None:
+            self._search.update(key, ())
+
+    def touch(self, key):
+        '''Marks the record with the given key as changed.'''
+        self.changed.add(key)
+        if self._search is not None:
+            self._search.update(key, self.search_words(key, self[key]))
+
+    def search_words(self, key, value):
+        '''Returns the words that the record can be searched by, none unless a subclass says otherwise.'''
+        return ()
+
+    def mark_saved(self):
+        '''Forgets which records were changed, once they have been saved.'''
+        self.changed.clear()
+
+    def version(self, key):
+        '''Returns the version stamp of the record as this session last read or wrote it, or None if it was not in the file.'''
+        return self.versions.get(key)
+
+    def merge(self, key, theirs):
+        '''Combines this session's change to a record with a different change another session saved to it.
+
+        Records cannot be combined unless a subclass says otherwise, so the change is a conflict.
+
+        Args:
+            key: The key of the record
+            theirs: The record as the other session saved it, or None if it removed the record
+
+        Returns:
+            None if the changes cannot be combined, otherwise a list of the parts of this session's change
+            that had to be left out (and the record is replaced by the combined one).
+        '''
+        return None
+
+    def find(self, text):
+        '''Returns a set of the keys of the records matching every word of the text.
+
+        A word matches a record if the record has a word starting with it. A word that matches no record
+        that way is looked up again allowing for one mistake. The search index is only built the first
+        time this is called, and is kept up to date from then on.
+        '''
+        if self._search is None:
+            with paused_gc():
+                self._search = SearchIndex((key, self.search_words(key, value)) for key, value in self.items())
+        found = None
+        for word in text.split():
+            keys = self._search.starts_with(word) or self._search.fuzzy(word)
+            found = keys if found is None else found & keys
+        return found or set()
+
+    def __reduce__(self):
+        # Pickles the records and any indexes together so that unpickling does not rebuild the indexes
+        # The search index is left out since it is only built when a search is made
+        attributes = dict(self.__dict__)
+        attributes['_search'] = None
+        return (self.__class__, (), (dict(self), attributes))
+
+    def __setstate__(self, state):
+        records, attributes = state
+        dict.update(self, records)
+        self.__dict__.update(attributes)
+
+class UserList(Records):
+    '''All the users keyed by username, which also keeps the student IDs sorted for the student table.
+
+    Students can be found by their ID number or any part of their name with find().
+
+    Attributes:
+        students: A SortedIndex of the usernames of the users that are students
+    '''
+    def __init__(self):
+        super().__init__()
+        self.students = SortedIndex()
+
+    def __setitem__(self, username, user):
+        super().__setitem__(username, user)
+        if isinstance(user, Student):
+            self.students.add(username)
+        else:
+            self.students.discard(username)
+
+    def __delitem__(self, username):
+        super().__delitem__(username)
+        self.students.discard(username)
+
+    def search_words(self, username, user):
+        # Only students are searched for, by their ID number and any part of their name
+        if isinstance(user, Student):
+            return (username, *user.name.split())
+        return ()
+
+class ClassList(Records):
+    '''All the classes keyed by "course_name / classroom", which also keeps track of the classes each student is in.
+
+    Enrolling and dropping should go through enrol() and drop() so that the index of each student's
+    classes is kept up to date with the student_ids of every class.
+
+    Attributes:
+        enrolled: A dictionary mapping a student ID to the set of keys of the classes the student is enrolled in
+        sections: A dictionary mapping a course name to the set of keys of the classes teaching that course
+        student_times: A dictionary mapping a student ID to the Timetable of the classes the student is enrolled in
+        room_times: A dictionary mapping a classroom to the Timetable of the classes held there
+        revision: A number that goes up every time a class or an enrolment is added or removed
+        courses: The CourseList whose reference counts are updated as classes are added and removed, if any
+        bases: A dictionary mapping the key of a class whose students changed since the last save to its
+            (student IDs, waitlist entries) before then, so that the change can be merged with another session's
+    '''
+    keep_sorted = True
+
+    def __init__(self, courses=None):
+        super().__init__()
+        self.enrolled = {}
+        self.sections = {}
+        self.student_times = {}
+        self.room_times = {}
+        self.revision = 0
+        self.courses = courses
+        self.bases = {}
+
+    def __setitem__(self, key, cl):
+        if key in self:
+            del self[key]
+        super().__setitem__(key, cl)
+        for s_id in cl.student_ids:
+            self.enrolled.setdefault(s_id, set()).add(key)
+            self._add_times(self.student_times, s_id, cl, key)
+        self.sections.setdefault(cl.course_name, set()).add(key)
+        self._add_times(self.room_times, cl.classroom, cl, key)
+        if self.courses is not None:
+            self.courses.add_reference(cl.course_name)
+        self.revision += 1
+
+    def __delitem__(self, key):
+        cl = self[key]
+        for s_id in cl.student_ids:
+            self._unindex(s_id, key)
+        keys = self.sections[cl.course_name]
+        keys.discard(key)
+        if not keys:
+            del self.sections[cl.course_name]
+        self._remove_times(self.room_times, cl.classroom, cl, key)
+        if self.courses is not None:
+            self.courses.remove_reference(cl.course_name)
+        super().__delitem__(key)
+        self.bases.pop(key, None)
+        self.revision += 1
+
+    def search_words(self, key, cl):
+        return (cl.course_name, cl.classroom)
+
+    def _unindex(self, student_id, key):
+        keys = self.enrolled.get(student_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.enrolled[student_id]
+        self._remove_times(self.student_times, student_id, self[key], key)
+
+    def _add_times(self, timetables, owner, cl, key):
+        if cl.times:
+            timetable = timetables.setdefault(owner, Timetable())
+            for start, end in cl.times:
+                timetable.add(start, end, key)
+
+    def _remove_times(self, timetables, owner, cl, key):
+        timetable = timetables.get(owner)
+        if timetable is not None:
+            for start, end in cl.times:
+                timetable.remove(start, end, key)
+            if not timetable:
+                del timetables[owner]
+
+    def _clash(self, timetable, times, ignore):
+        if timetable is not None:
+            for start, end in times:
+                clash = timetable.clash(start, end, ignore)
+                if clash is not None:
+                    return clash
+        return None
+
+    def student_clash(self, student_id, key):
+        '''Returns the key of a class the student is enrolled in that meets at the same time as the class with the given key, or None.'''
+        return self._clash(self.student_times.get(student_id), self[key].times, key)
+
+    def room_clash(self, classroom, times, ignore=None):
+        '''Returns the key of a class held in the classroom at any of the given meeting times, or None.'''
+        return self._clash(self.room_times.get(classroom), times, ignore)
+
+    def _keep_base(self, key):
+        # Remembers who was in the class before this session first changed its students
+        if key not in self.changed and key not in self.bases:
+            cl = self[key]
+            self.bases[key] = (tuple(cl.student_ids), tuple(cl.waitlist.entries()))
+
+    def mark_saved(self):
+        super().mark_saved()
+        self.bases.clear()
+
+    def added_enrolments(self):
+        '''Returns a dictionary mapping the key of each class this session enrolled students in since the last save to the set of them.'''
+        added = {}
+        for key, (student_ids, _) in self.bases.items():
+            if dict.__contains__(self, key):
+                students = set(dict.__getitem__(self, key).student_ids).difference(student_ids)
+                if students:
+                    added[key] = students
+        return added
+
+    def merge(self, key, theirs):
+        '''Combines this session's enrolments in a class with the ones another session saved to it.
+
+        Only works if this session changed nothing but the students enrolled in and waiting for the class,
+        and the other session kept the class with the same seat limit and meeting times. The students this
+        session enrolled are added to the other session's roster and the ones it dropped are removed, and
+        the same for the waitlist. Enrolments that no longer fit in the seat limit are left out, and ones
+        that now clash with another of the student's classes are taken out by check_clashes() once every
+        class is merged.
+        '''
+        base = self.bases.get(key)
+        if base is None or theirs is None or key not in self:
+            return None
+        mine = self[key]
+        if (mine.capacity, mine.times) != (theirs.capacity, theirs.times):
+            return None
+
+        base_ids = set(base[0])
+        dropped = base_ids.difference(mine.student_ids)
+        roster = [s_id for s_id in theirs.student_ids if s_id not in dropped]
+        in_roster = set(roster)
+        left_out = []
+        for s_id in mine.student_ids:
+            if s_id in base_ids or s_id in in_roster:
+                continue
+            if mine.capacity is not None and len(roster) >= mine.capacity:
+                left_out.append(f'enrolment of {s_id} in {key} (the class is full)')
+            else:
+                roster.append(s_id)
+                in_roster.add(s_id)
+
+        base_waiting = {s_id for s_id, _ in base[1]}
+        left = base_waiting.difference(mine.waitlist)
+        waiting = [(s_id, priority) for s_id, priority in theirs.waitlist.entries()
+                   if s_id not in left and s_id not in in_roster]
+        is_waiting = {s_id for s_id, _ in waiting}
+        for s_id, priority in mine.waitlist.entries():
+            if s_id not in base_waiting and s_id not in is_waiting and s_id not in in_roster:
+                waiting.append((s_id, priority))
+
+        self[key] = Class(mine.course_name, mine.classroom, roster, mine.capacity, Waitlist(waiting), mine.times)
+        return left_out
+
+    def enrol(self, key, student_id):
+        '''Adds a student to the class with the given key.'''
+        self._keep_base(key)
+        if self[key].student_ids.add(student_id):
+            self.enrolled.setdefault(student_id, set()).add(key)
+            self._add_times(self.student_times, student_id, self[key], key)
+            self.changed.add(key)
+            self.revision += 1
+
+    def drop(self, key, student_id):
+        '''Removes a student from the class with the given key.'''
+        self._keep_base(key)
+        if self[key].student_ids.discard(student_id):
+            self._unindex(student_id, key)
+            self.changed.add(key)
+            self.revision += 1
+
+    def join_waitlist(self, key, student_id, priority=0):
+        '''Adds a student to the waitlist of the class with the given key.
+
+        Returns:
+            True if the student was added, False if the student was already on the waitlist.
+        '''
+        self._keep_base(key)
+        if self[key].waitlist.add(student_id, priority):
+            self.changed.add(key)
+            return True
+        return False
+
+    def promote(self, key, check):
+        '''Moves students from the waitlist of the class into its free seats.
+
+        Students are taken from the top of the waitlist in O(log n) each. A student that check() gives a
+        reason for (for example because they no longer have the units for it) is taken off the waitlist
+        and the next one is tried.
+
+        Args:
+            key: The "course_name / classroom" key of the class
+            check: A function taking a student ID and returning None if they can be enrolled, or the reason they cannot
+
+        Returns:
+            A list of the student IDs that were enrolled.
+        '''
+        cl = self[key]
+        promoted = []
+        while cl.waitlist and not cl.is_full():
+            self._keep_base(key)
+            s_id = cl.waitlist.pop()
+            self.changed.add(key)
+            if check(s_id) is None:
+                self.enrol(key, s_id)
+                promoted.append(s_id)
+        return promoted
+
+    def load_all(self):
+        '''Does nothing, since every class is always loaded (see ShardedClassList).'''
+        pass
+
+    def student_classes(self, student_id):
+        '''Returns a list of the classes that the student is currently enrolled in.'''
+        return [self[key] for key in self.enrolled.get(student_id, ())]
+
+    def course_classes(self, course_name):
+        '''Returns a list of the classes that teach the given course.'''
+        return [self[key] for key in self.sections.get(course_name, ())]
+
+class IndexEntry:
+    '''A line of a shard index, listing the shards that a course's or a student's classes are kept in.
+
+    Attributes:
+        key: The course name or student ID
+        shards: A sorted tuple of the names of the shards
+    '''
+    __slots__ = ('key', 'shards')
+
+    def __init__(self, key, shards):
+        self.key = sys.intern(key)
+        self.shards = tuple(sorted(set(shards)))
+
+    def info(self):
+        return f'{self.key} / {" ".join(self.shards)}'
+
+def parse_as_index_entry(entry):
+    '''Takes a string in the form "key / shard shard ..." and returns an IndexEntry, or None if it is not one.'''
+    read = entry.split(' / ')
+    if len(read) != 2:
+        return None
+    return IndexEntry(read[0], read[1].split())
+
+class ShardIndex(Records):
+    '''An index of which shards of a ShardedClassList each course or student is in.
+
+    An index only has to list every shard a key might be in, so when two sessions change the same entry
+    the two are merged by listing the shards from both.
+
+    Attributes:
+        courses: The CourseList that each indexed course counts as a reference in, if any, so that a
+            course with classes cannot be deleted even while its shard has not been read
+    '''
+    def __init__(self, courses=None):
+        super().__init__()
+        self.courses = courses
+
+    def __setitem__(self, key, entry):
+        if self.courses is not None and key not in self:
+            self.courses.add_reference(key)
+        super().__setitem__(key, entry)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        if self.courses is not None:
+            self.courses.remove_reference(key)
+
+    def merge(self, key, theirs):
+        shards = set(theirs.shards) if theirs is not None else set()
+        if key in self:
+            shards.update(self[key].shards)
+        if shards:
+            self[key] = IndexEntry(key, shards)
+        elif key in self:
+            del self[key]
+        return []
+
+# Where the classes are kept once they are split into shards (see shards.py)
+SHARD_DIR = 'classes'
+SHARD_INDEX = os.path.join(SHARD_DIR, 'index.txt')
+STUDENT_DIR = os.path.join(SHARD_DIR, 'students')
+# How many files the student index is spread over, so that a session only reads the ones of its students
+STUDENT_BUCKETS = 256
+
+def shard_prefix():
+    '''Returns how many leading characters of a course name name the shard of a new course, 0 for a shard per course.
+
+    Set with the LOZOL_SHARD_PREFIX environment variable. Courses already in the index stay in their shard.
+    '''
+    return int(os.environ.get('LOZOL_SHARD_PREFIX', '0'))
+
+class ShardedClassList(ClassList):
+    '''A ClassList whose classes are kept in shard files, each holding the classes of a few courses.
+
+    A shard is only read the first time something in it is needed: a class looked up by its key, the
+    classes of a course, or the classes of a student. The shard index lists the shard of every course
+    that has classes and the student index lists the shards each student is enrolled in, so that only
+    those shards are read. Listing every class (such as for the admin) reads all of the shards with
+    load_all(). Saving only writes the shards with changed classes (see save_data()).
+
+    The student index has an entry for nearly every student, so it is spread over STUDENT_BUCKETS files
+    by a hash of the student ID, and each of those is also only read when one of its students is needed.
+
+    Attributes:
+        index: A ShardIndex mapping a course name to the shard its classes are in
+        students: A ShardIndex mapping a student ID to the shards of the classes they are enrolled in, holding
+            the entries of the student index files that were read
+        loaded: A dictionary mapping the name of each shard that was read to the file_stamp() of its file
+            when it was last read or written, or None if it had no file
+        student_buckets: The same as loaded, for the student index files
+        removed: A dictionary mapping the key of each class removed since the last save to its shard, since
+            the course of a removed class may no longer be in the index
+        catalogue: The CourseList of the courses, which the index keeps the references of
+        prefix: How many leading characters of a course name name the shard of a course not in the index yet
+    '''
+    def __init__(self, courses=None):
+        # The index counts the references to courses instead of every class, since most classes are not read
+        super().__init__()
+        self.catalogue = courses
+        self.index = ShardIndex(courses)
+        self.students = ShardIndex()
+        self.loaded = {}
+        self.student_buckets = {}
+        self.removed = {}
+        self.prefix = shard_prefix()
+
+    def __reduce__(self):
+        # Only the shard index is kept in the snapshot, the rest is read from its files when needed
+        return (self.__class__, (self.catalogue,), (self.index,))
+
+    def __setstate__(self, state):
+        self.index, = state
+
+    def shard(self, course_name):
+        '''Returns the name of the shard that the classes of the course are kept in.'''
+        entry = self.index.get(course_name)
+        if entry is not None:
+            return entry.shards[0]
+        return course_name[:self.prefix] if self.prefix else course_name
+
+    def shard_path(self, shard):
+        return os.path.join(SHARD_DIR, urllib.parse.quote(shard, safe='') + '.txt')
+
+    def load_shard(self, shard):
+        '''Reads the classes of a shard from its file, if it was not read already.'''
+        if shard in self.loaded:
+            return
+        path = self.shard_path(shard)
+        self.loaded[shard] = None
+        if not os.path.exists(path):
+            return
+        self.loaded[shard] = file_stamp(path)
+        with paused_gc():
+            for key, cl, version in read_records(path, parse_as_class):
+                ClassList.__setitem__(self, key, cl)
+                self.changed.discard(key)
+                self.versions[key] = version
+
+    def load_all(self):
+        '''Reads every shard that has not been read yet.'''
+        for course_name in list(self.index):
+            self.load_shard(self.shard(course_name))
+
+    def student_bucket(self, student_id):
+        '''Returns the name of the student index file that the student's entry is kept in.'''
+        return f'{zlib.crc32(student_id.encode()) % STUDENT_BUCKETS:02x}'
+
+    def student_bucket_path(self, bucket):
+        return os.path.join(STUDENT_DIR, bucket + '.txt')
+
+    def load_student_bucket(self, bucket):
+        '''Reads the entries of a student index file, if it was not read already.'''
+        if bucket in self.student_buckets:
+            return
+        path = self.student_bucket_path(bucket)
+        self.student_buckets[bucket] = None
+        if not os.path.exists(path):
+            return
+        self.student_buckets[bucket] = file_stamp(path)
+        for key, entry, version in read_records(path, parse_as_index_entry):
+            dict.__setitem__(self.students, key, entry)
+            self.students.versions[key] = version
+
+    def student_entry(self, student_id):
+        '''Returns the IndexEntry listing the shards the student is enrolled in, or None if there are none.'''
+        self.load_student_bucket(self.student_bucket(student_id))
+        return self.students.get(student_id)
+
+    def load_student(self, student_id):
+        entry = self.student_entry(student_id)
+        if entry is not None:
+            for shard in entry.shards:
+                self.load_shard(shard)
+
+    def __contains__(self, key):
+        self.load_shard(self.shard(key.split(' / ')[0]))
+        return super().__contains__(key)
+
+    def __getitem__(self, key):
+        self.load_shard(self.shard(key.split(' / ')[0]))
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __setitem__(self, key, cl):
+        shard = self.shard(cl.course_name)
+        self.load_shard(shard)
+        old = dict.get(self, key)
+        if old is not None:
+            ClassList.__delitem__(self, key)
+        ClassList.__setitem__(self, key, cl)
+        if cl.course_name not in self.index:
+            self.index[cl.course_name] = IndexEntry(cl.course_name, (shard,))
+        for s_id in set(cl.student_ids).union(old.student_ids if old is not None else ()):
+            self._index_student(s_id, shard)
+
+    def __delitem__(self, key):
+        cl = self[key]
+        shard = self.shard(cl.course_name)
+        ClassList.__delitem__(self, key)
+        self.removed[key] = shard
+        if cl.course_name not in self.sections and cl.course_name in self.index:
+            del self.index[cl.course_name]
+        for s_id in cl.student_ids:
+            self._index_student(s_id, shard)
+
+    def _index_student(self, student_id, shard):
+        # Keeps the student index listing exactly the shards the student has classes in
+        in_shard = any(self.shard(key.split(' / ')[0]) == shard for key in self.enrolled.get(student_id, ()))
+        entry = self.student_entry(student_id)
+        shards = set(entry.shards) if entry is not None else set()
+        if in_shard == (shard in shards):
+            return
+        if in_shard:
+            shards.add(shard)
+        else:
+            shards.discard(shard)
+        if shards:
+            self.students[student_id] = IndexEntry(student_id, shards)
+        else:
+            del self.students[student_id]
+
+    def enrol(self, key, student_id):
+        super().enrol(key, student_id)
+        self._index_student(student_id, self.shard(key.split(' / ')[0]))
+
+    def drop(self, key, student_id):
+        super().drop(key, student_id)
+        self._index_student(student_id, self.shard(key.split(' / ')[0]))
+
+    def student_classes(self, student_id):
+        self.load_student(student_id)
+        return super().student_classes(student_id)
+
+    def student_clash(self, student_id, key):
+        self.load_student(student_id)
+        return super().student_clash(student_id, key)
+
+    def course_classes(self, course_name):
+        self.load_shard(self.shard(course_name))
+        return super().course_classes(course_name)
+
+    def room_clash(self, classroom, times, ignore=None):
+        # Any shard can have a class in the room
+        self.load_all()
+        return super().room_clash(classroom, times, ignore)
+
+    def find(self, text):
+        self.load_all()
+        return super().find(text)
+
+    def mark_saved(self):
+        super().mark_saved()
+        self.removed.clear()
+
+    def changed_shards(self):
+        '''Returns a set of the shards with classes that were changed since the last save.'''
+        shards = {self.shard(key.split(' / ')[0]) for key in self.changed}
+        shards.update(self.removed.values())
+        return shards
+
+    def changed_student_buckets(self):
+        '''Returns a set of the student index files with entries that were changed since the last save.'''
+        return {self.student_bucket(key) for key in self.students.changed}
+
+    def student_bucket_keys(self, buckets):
+        '''Returns a dictionary mapping each of the given student index files to the keys of its entries.'''
+        keys = {bucket: [] for bucket in buckets}
+        for key in self.students:
+            bucket_keys = keys.get(self.student_bucket(key))
+            if bucket_keys is not None:
+                bucket_keys.append(key)
+        return keys
+
+    def shard_keys(self, shards):
+        '''Returns a dictionary mapping each of the given shards to the keys of its classes, in the order they are kept.'''
+        keys = {shard: [] for shard in shards}
+        for key in dict.keys(self):
+            shard_keys = keys.get(self.shard(key.split(' / ')[0]))
+            if shard_keys is not None:
+                shard_keys.append(key)
+        return keys
+
+class CourseList(Records):
+    '''All the courses keyed by course name, which also keeps track of how the courses depend on each other.
+
+    The prerequisites form a graph that must not have any cycles. Adding a course that would create a
+    cycle raises a ValueError. All the prerequisites of a course (including the prerequisites of its
+    prerequisites) are worked out once and kept. Adding a course adds its prerequisites to those kept for
+    the courses that depend on it, and removing one forgets only those of the courses that depend on it.
+    The courses are also kept in an order where every course comes after its prerequisites.
+
+    Each course also has a count of the courses that require it and the classes that teach it, so the
+    courses that can be deleted (those with neither) are always known without looking through everything.
+
+    Attributes:
+        dependents: A dictionary mapping a course name to the set of courses that directly require it
+        references: A dictionary mapping a course name to how many courses require it plus how many classes teach it
+        deletable: A SortedIndex of the names of the courses that no course requires and no class teaches
+    '''
+    keep_sorted = True
+
+    def __init__(self):
+        super().__init__()
+        self.dependents = {}
+        self.references = {}
+        self.deletable = SortedIndex()
+        self._all_prereqs = {}
+        self._order = []
+
+    def __setitem__(self, course_name, course):
+        # A course that nothing requires yet cannot be part of a cycle, so most new courses skip the check
+        for pr in course.prereqs:
+            if pr == course_name or course_name in self.dependents and course_name in self.all_prereqs(pr):
+                raise ValueError(f'{course_name} requiring {pr} would create a cycle of prerequisites')
+        if course_name in self:
+            del self[course_name]
+        super().__setitem__(course_name, course)
+        for pr in course.prereqs:
+            self.dependents.setdefault(pr, set()).add(course_name)
+            self.add_reference(pr)
+        if course_name not in self.references:
+            self.deletable.add(course_name)
+
+        if course_name in self.dependents:
+            # Courses loaded before this one already require it, so they gain its prerequisites and have to
+            # move after it in the order (which keeps them after everything else they require)
+            dependents = self.all_dependents(course_name)
+            prereqs = self.all_prereqs(course_name)
+            for dependent in dependents:
+                if dependent in self._all_prereqs:
+                    self._all_prereqs[dependent] = self._all_prereqs[dependent] | prereqs
+            self._order = ([name for name in self._order if name not in dependents] + [course_name]
+                           + [name for name in self._order if name in dependents])
+        else:
+            self._order.append(course_name)
+
+    def __delitem__(self, course_name):
+        for pr in self[course_name].prereqs:
+            dependents = self.dependents[pr]
+            dependents.discard(course_name)
+            if not dependents:
+                del self.dependents[pr]
+            self.remove_reference(pr)
+        super().__delitem__(course_name)
+        self.deletable.discard(course_name)
+        self._order.remove(course_name)
+
+        # The courses that depend on it may have other ways to some of its prerequisites, so they are worked out again
+        self._all_prereqs.pop(course_name, None)
+        if course_name in self.dependents:
+            for dependent in self.all_dependents(course_name):
+                self._all_prereqs.pop(dependent, None)
+
+    def search_words(self, course_name, course):
+        return (course_name,)
+
+    def add_reference(self, course_name):
+        '''Counts one more course or class that refers to the given course, so it can no longer be deleted.'''
+        self.references[course_name] = self.references.get(course_name, 0) + 1
+        self.deletable.discard(course_name)
+
+    def remove_reference(self, course_name):
+        '''Counts one less course or class that refers to the given course.'''
+        self.references[course_name] -= 1
+        if not self.references[course_name]:
+            del self.references[course_name]
+            if course_name in self:
+                self.deletable.add(course_name)
+
+    def all_prereqs(self, course_name):
+        '''Returns a frozenset of every course that must be taken before the given course, directly or not.'''
+        if course_name in self._all_prereqs:
+            return self._all_prereqs[course_name]
+
+        # Courses that are not in the list are not cached, since nothing would clear them once they are added
+        uncached = {}
+        def done(name):
+            return name in self._all_prereqs or name in uncached
+
+        # Works out the prerequisites of the prerequisites first, without recursing. The first time a course
+        # is at the top of the stack its prerequisites are put on top of it, and the second time they are
+        # all done, so its own can be worked out. A course can be put on the stack more than once (when two
+        # courses require it), and is only worked out the first time it gets to the top.
+        visiting = set()
+        stack = [course_name]
+        while stack:
+            name = stack[-1]
+            if done(name):
+                stack.pop()
+                continue
+            prereqs = self[name].prereqs if name in self else ()
+            if name not in visiting:
+                visiting.add(name)
+                # A prerequisite that is still being visited would be a cycle, which __setitem__ never lets in
+                stack.extend(pr for pr in prereqs if not done(pr) and pr not in visiting)
+                continue
+            stack.pop()
+            visiting.discard(name)
+            all_prereqs = set(prereqs)
+            for pr in prereqs:
+                all_prereqs.update(self._all_prereqs.get(pr, uncached.get(pr, ())))
+            if name in self:
+                self._all_prereqs[name] = frozenset(all_prereqs)
+            else:
+                uncached[name] = frozenset(all_prereqs)
+        if course_name in self._all_prereqs:
+            return self._all_prereqs[course_name]
+        return uncached[course_name]
+
+    def all_dependents(self, course_name):
+        '''Returns a set of every course that requires the given course, directly or not.'''
+        dependents = set()
+        stack = [course_name]
+        while stack:
+            for dependent in self.dependents.get(stack.pop(), ()):
+                if dependent not in dependents:
+                    dependents.add(dependent)
+                    stack.append(dependent)
+        return dependents
+
+    def requires(self, course_name, prereq):
+        '''Returns True if the prereq has to be taken at some point before the given course.'''
+        return prereq in self.all_prereqs(course_name)
+
+    def topological_order(self):
+        '''Returns a list of all the course names where every course comes after all of its prerequisites.'''
+        return list(self._order)
+
 class PrevEnrolments:
     '''Links students and courses that each student has previously been enrolled in.
 
     Attributes:
         student_id: The student that the previously enrolled courses are referring to
-        prev_enrolled: A list of all the courses that the student has previously been enrolled in
+        prev_enrolled: A tuple of all the courses that the student has previously been enrolled in
     '''
+    __slots__ = ('student_id', 'prev_enrolled')
+
     def __init__(self, student_id, prev_enrolled):
-        self.student_id = student_id
-        self.prev_enrolled = prev_enrolled
+        self.student_id = sys.intern(student_id)
+        self.prev_enrolled = tuple(map(sys.intern, prev_enrolled))
     
     def info(self):
         info = [f'{self.student_id} / ']
@@ -102,6 +1397,289 @@ class PrevEnrolments:
 
         return ''.join(info)
 
+def prev_cache_size():
+    '''Returns how many previous enrolments a PrevEnrolmentList keeps in memory once they are read.
+
+    Set with the LOZOL_PREV_CACHE environment variable.
+    '''
+    return int(os.environ.get('LOZOL_PREV_CACHE', '1000'))
+
+class PrevEnrolmentList(Records):
+    '''All the previous enrolments keyed by student ID, read from prev_enrolments.txt only when they are looked up.
+
+    Starting only indexes where each student's line is in the file. A student's previous enrolments are
+    read the first time they are looked up and kept in a cache of the most recently used ones, so memory
+    grows with the students using Lozol rather than with every student who ever enrolled. The file stays
+    open, so lookups keep reading the file as it was indexed even if another session replaces it, until
+    this session saves and indexes it again.
+
+    Previous enrolments that were added or edited since the last save are kept outside the cache, so they
+    are never evicted before they are saved.
+
+    Attributes:
+        path: The path of the text file
+        offsets: A dictionary mapping a student ID to where their line starts in the file
+        indexed: The file_stamp() of the file when it was indexed
+        removed: A set of the student IDs in the file that were removed since the last save
+        cache: An OrderedDict of the previous enrolments that were read, least recently used first
+        max_size: How many previous enrolments the cache holds before evicting the least recently used
+        hits: The number of lookups found in the cache
+        misses: The number of lookups read from the file
+        evictions: The number of previous enrolments evicted from the cache
+    '''
+    def __init__(self, path='prev_enrolments.txt'):
+        super().__init__()
+        self.path = path
+        self.offsets = {}
+        self.indexed = None
+        self.removed = set()
+        self.cache = collections.OrderedDict()
+        self.max_size = prev_cache_size()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._file = None
+
+    def __reduce__(self):
+        # Only the index is kept in the snapshot, the previous enrolments are read from the file when needed
+        return (self.__class__, (self.path,), (self.offsets, self.indexed))
+
+    def __setstate__(self, state):
+        self.offsets, self.indexed = state
+
+    def index(self):
+        '''Indexes where each student's line starts in the file, forgetting the records kept since the last save.'''
+        self.close()
+        dict.clear(self)
+        self.offsets = {}
+        self.versions = {}
+        self.removed.clear()
+        if not os.path.exists(self.path):
+            self.indexed = None
+            return
+        self._file = open(self.path, 'rb')
+        self.indexed = file_stamp(self.path)
+        offset = 0
+        # Lines are split the same way parse_as_prev_enrolments() does, so the same lines are indexed
+        for line in self._file:
+            read = line.rstrip(b'\r\n').split(b' / ')
+            if len(read) == 2:
+                self.offsets[sys.intern(read[0].decode())] = offset
+            offset += len(line)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _read_line(self, student_id):
+        '''Returns the student's line of the file as it was indexed, or None if they are not in it.'''
+        if self._file is None:
+            # Unpickled from the snapshot, so the file is opened again, and indexed again if it changed
+            if os.path.exists(self.path) and file_stamp(self.path) == self.indexed:
+                self._file = open(self.path, 'rb')
+            else:
+                self.index()
+        offset = self.offsets.get(student_id)
+        if offset is None:
+            return None
+        self._file.seek(offset)
+        return self._file.readline().rstrip(b'\r\n').decode()
+
+    def __contains__(self, student_id):
+        return dict.__contains__(self, student_id) or (student_id in self.offsets and student_id not in self.removed)
+
+    def __getitem__(self, student_id):
+        if dict.__contains__(self, student_id):
+            return dict.__getitem__(self, student_id)
+        pe = self.cache.get(student_id)
+        if pe is not None:
+            self.cache.move_to_end(student_id)
+            self.hits += 1
+            return pe
+        line = self._read_line(student_id) if student_id not in self.removed else None
+        if line is None:
+            raise KeyError(student_id)
+        pe = parse_as_prev_enrolments(line)
+        self.misses += 1
+        self.cache[student_id] = pe
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+            self.evictions += 1
+        return pe
+
+    def get(self, student_id, default=None):
+        return self[student_id] if student_id in self else default
+
+    def __setitem__(self, student_id, pe):
+        super().__setitem__(student_id, pe)
+        self.cache.pop(student_id, None)
+        self.removed.discard(student_id)
+
+    def __delitem__(self, student_id):
+        if student_id not in self:
+            raise KeyError(student_id)
+        if dict.__contains__(self, student_id):
+            dict.__delitem__(self, student_id)
+        if student_id in self.offsets:
+            self.removed.add(student_id)
+        self.cache.pop(student_id, None)
+        self.changed.add(student_id)
+
+    def __iter__(self):
+        for student_id in self.offsets:
+            if student_id not in self.removed:
+                yield student_id
+        for student_id in dict.__iter__(self):
+            if student_id not in self.offsets:
+                yield student_id
+
+    def __len__(self):
+        added = sum(1 for student_id in dict.__iter__(self) if student_id not in self.offsets)
+        return len(self.offsets) - len(self.removed) + added
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [self[student_id] for student_id in self]
+
+    def items(self):
+        return [(student_id, self[student_id]) for student_id in self]
+
+    def version(self, student_id):
+        if student_id in self.versions:
+            return self.versions[student_id]
+        line = self._read_line(student_id)
+        return record_version(line) if line is not None else None
+
+    def mark_saved(self):
+        super().mark_saved()
+        if not os.path.exists(self.path) or file_stamp(self.path) != self.indexed:
+            # The file was just written, so it is indexed again, but the cached records are still what is in it
+            self.index()
+
+    def cache_info(self):
+        '''Returns a dictionary of the cache's hits, misses, evictions, size, and max_size.'''
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self.cache), 'max_size': self.max_size}
+
+class Eligibility:
+    '''The classes that a student is allowed to enrol in.
+
+    The courses that the student has the prerequisites for (and has not taken before) are worked out
+    once, the first time they are needed. The list of available classes is then only rebuilt when the
+    student's enrolments or unit limit change, or when a class is added or removed. Checking a single
+    class does not need either of them.
+
+    Attributes:
+        student: The student that the eligibility is for
+        courses: The already existing list of courses
+        classes: The already existing list of classes
+        prev_enrolled: A set of the courses that the student has previously been enrolled in
+        eligible_courses: A set of the names of the courses that the student can take
+    '''
+    def __init__(self, student, courses, classes, prev_enrolled):
+        self.student = student
+        self.courses = courses
+        self.classes = classes
+        self.prev_enrolled = set(prev_enrolled)
+        self._eligible_courses = None
+        self._cache_key = None
+        self._avail_classes = None
+
+    @property
+    def eligible_courses(self):
+        if self._eligible_courses is None:
+            self._eligible_courses = set()
+            for course in self.courses.values():
+                if course.course_name not in self.prev_enrolled and self.prev_enrolled.issuperset(course.prereqs):
+                    self._eligible_courses.add(course.course_name)
+        return self._eligible_courses
+
+    def units_remaining(self):
+        '''Returns how many more units the student can enrol in.'''
+        units_remaining = self.student.unit_limit
+        for cl in self.classes.student_classes(self.student.username):
+            units_remaining -= self.courses[cl.course_name].units
+        return units_remaining
+
+    def available_classes(self):
+        '''Returns a set of the classes the student can enrol in (units fit, course not currently/previously enrolled).'''
+        cache_key = (self.classes.revision, self.student.unit_limit)
+        if cache_key != self._cache_key:
+            units_remaining = self.units_remaining()
+            courses_enrolled = {cl.course_name for cl in self.classes.student_classes(self.student.username)}
+
+            self._avail_classes = set()
+            for course_name in self.eligible_courses - courses_enrolled:
+                if self.courses[course_name].units <= units_remaining:
+                    self._avail_classes.update(self.classes.course_classes(course_name))
+            self._cache_key = cache_key
+        return self._avail_classes
+
+    def check(self, key):
+        '''Checks whether the student can enrol in the class with the given key.
+
+        Args:
+            key: The "course_name / classroom" key of the class
+
+        Returns:
+            None if the student can enrol in the class, otherwise a string with the reason they cannot.
+        '''
+        if key not in self.classes:
+            return 'class not found'
+        course_name = self.classes[key].course_name
+        if course_name not in self.courses:
+            return 'course not found'
+        if self.student.username in self.classes[key].student_ids:
+            return 'already enrolled in class'
+        if course_name in self.prev_enrolled:
+            return 'course previously taken'
+        missing = [pr for pr in self.courses[course_name].prereqs if pr not in self.prev_enrolled]
+        if missing:
+            return f'missing prerequisites: {" ".join(missing)}'
+
+        units_remaining = self.student.unit_limit
+        for cl in self.classes.student_classes(self.student.username):
+            if cl.course_name == course_name:
+                return 'already enrolled in course'
+            units_remaining -= self.courses[cl.course_name].units
+        if self.courses[course_name].units > units_remaining:
+            return 'not enough units remaining'
+        clash = self.classes.student_clash(self.student.username, key)
+        if clash is not None:
+            return f'time clash with {clash}'
+        if self.classes[key].is_full():
+            return 'class is full'
+        return None
+
+def promote_waitlisted(key, users, courses, classes, prev_enrolments):
+    '''Fills the free seats of a class with the students on its waitlist that can still take it.
+
+    Each student's unit limit and prerequisites are checked again with Eligibility.check(), which only
+    looks at the classes that student is enrolled in.
+
+    Args:
+        key: The "course_name / classroom" key of the class
+        users: All the users in the Lozol system
+        courses: All the courses in the Lozol system
+        classes: All the classes in the Lozol system
+        prev_enrolments: All the students with their previous enrolments
+
+    Returns:
+        A list of the student IDs that were enrolled.
+    '''
+    def check(student_id):
+        student = users.get(student_id)
+        if not isinstance(student, Student):
+            return 'student not found'
+        prev_enrolled = []
+        if student_id in prev_enrolments:
+            prev_enrolled = prev_enrolments[student_id].prev_enrolled
+        return Eligibility(student, courses, classes, prev_enrolled).check(key)
+    return classes.promote(key, check)
+
 def parse_as_user(user):
     '''Takes a string representing user info and creates a user with that information.
 
@@ -114,7 +1692,7 @@ def parse_as_user(user):
     Returns:
         Either a Student or an Admin with the relevant information given in the string.
     '''
-    read = user.split(' / ')
+    read = user.strip().split(' / ')
     if read[0] == 'Student':
         if len(read) != 5:
             return None
@@ -129,8 +1707,8 @@ def parse_as_user(user):
 def parse_as_class(cl):
     '''Takes a string representing class info and creates a class with that information.
 
-    Parses a string and gets the course name and classroom,
-    and returns an instance of a Class.
+    Parses a string and gets the course name, classroom, and enrolled students, followed by the
+    seat limit, waitlist, and meeting times if the class has them, and returns an instance of a Class.
 
     Args:
         cl: String representation of the class
@@ -139,10 +1717,14 @@ def parse_as_class(cl):
         A Class with the relevant information from the string
     '''
     read = cl.split(' / ')
-    if len(read) != 3:
-        return None
-    else:
+    if len(read) == 3:
         return Class(read[0], read[1], read[2].split())
+    elif len(read) in (5, 6):
+        capacity = None if read[3] == 'None' else int(read[3])
+        times = parse_times(read[5]) if len(read) == 6 else ()
+        return Class(read[0], read[1], read[2].split(), capacity, parse_waitlist(read[4]), times)
+    else:
+        return None
 
 def parse_as_course(course):
     '''Takes a string representing course info and creates a course with that information.
@@ -204,42 +1786,158 @@ def design_line(s, num):
         str.append (s)
     return ''.join(str)
 
-def enrol_class(student, courses, classes, prev_enrolments):
+def class_problem(courses, classes, course_name, classroom):
+    '''Returns what is wrong with the course name and classroom of a new class, or None if nothing is.'''
+    if not course_name or not classroom:
+        return 'Course name or classroom name cannot be blank'
+    elif len(course_name) >= 20:
+        return 'Course name is too long (>= 20 characters)'
+    elif len(classroom) >= 15:
+        return 'Classroom name is too long (>= 15 characters)'
+    elif ' ' in classroom:
+        return 'Classroom name must have no spaces'
+    elif f'{course_name} / {classroom}' in classes:
+        return 'Class with same name and classroom already found'
+    elif course_name not in courses:
+        return 'Course not in previously made courses'
+    return None
+
+def times_problem(classes, classroom, times):
+    '''Returns what is wrong with the meeting times of a new class held in the classroom, or None if nothing is.'''
+    clash = classes.room_clash(classroom, times)
+    if clash is not None:
+        return f'{classroom} is already used by {clash} at that time'
+    return None
+
+def capacity_problem(capacity):
+    if capacity is not None and capacity < 1:
+        return 'Seat limit must be a positive whole number'
+    return None
+
+def course_name_problem(courses, course_name):
+    '''Returns what is wrong with the name of a new course, or None if nothing is.'''
+    if not course_name:
+        return 'Course name cannot be blank'
+    elif len(course_name) >= 20:
+        return 'Course name is too long (>= 20 characters)'
+    elif ' ' in course_name:
+        return 'Course name cannot have spaces'
+    elif course_name in courses:
+        return 'Course with same name already found'
+    return None
+
+def units_problem(units):
+    if units < 0 or units > 50:
+        return 'Units cannot be less than 0 or more than 50'
+    return None
+
+def prereqs_problem(courses, prereqs):
+    for prereq in prereqs:
+        if prereq not in courses:
+            return 'At least one of the prerequisites specified was not in already existing list of classes'
+    return None
+
+def student_name_problem(name):
+    if len(name) >= 30:
+        return 'Name too long'
+    return None
+
+def unit_limit_problem(unit_limit):
+    if unit_limit > 30:
+        return 'Unit limit too large'
+    return None
+
+# How many rows of a catalogue are listed at a time
+PAGE_SIZE = 20
+
+def show_listing(header, index, render, empty='None', search=None):
+    '''Prints the rows of a sorted index a page at a time, letting the user move between pages and filter by name.
+
+    Listings that fit on a single page are printed whole without asking anything.
+
+    Args:
+        header: The column headings to print above the rows
+        index: A SortedIndex of the keys of the rows
+        render: A function taking a key and returning the row to print for it
+        empty: What to print if there are no rows
+        search: A function taking what the user typed and returning a set of the keys whose names match it,
+            for listings not keyed by name (such as students, keyed by ID number). Without it, the keys
+            themselves are filtered by what they start with.
+    '''
+    prefix = ''
+    matches = None
+    number = 0
+    while True:
+        if matches is None:
+            keys, total = index.page(number, PAGE_SIZE, prefix)
+        else:
+            keys, total = matches[number * PAGE_SIZE:(number + 1) * PAGE_SIZE], len(matches)
+        print(header)
+        if not keys:
+            print(empty)
+        for key in keys:
+            print(render(key))
+        if len(index) <= PAGE_SIZE:
+            return
+
+        pages = max(1, -(-total // PAGE_SIZE))
+        filtered = f'{"matching" if matches is not None else "starting with"} {prefix!r}'
+        print(f'Page {number + 1} of {pages} ({total} {filtered if prefix else "in total"})')
+        query = input('[n]ext page, [p]revious page, [f]ilter by name, or press Enter to continue: ').lower()
+        if query == 'n' and number + 1 < pages:
+            number += 1
+        elif query == 'p' and number > 0:
+            number -= 1
+        elif query == 'f':
+            if search is not None:
+                prefix = input('Search names and ID numbers (leave blank for all): ')
+            else:
+                prefix = input('Show names starting with (leave blank for all): ')
+            matches = sorted(key for key in search(prefix) if key in index) if search is not None and prefix else None
+            number = 0
+        elif not query:
+            return
+        print(design_line('-', 100))
+
+def print_suggestions(classes, text, allowed):
+    '''Prints up to 5 of the allowed classes that match what the student typed, in case it had a mistake in it.
+
+    Args:
+        classes: The already existing list of classes
+        text: The course name and classroom the student typed
+        allowed: The classes that the student could have meant
+    '''
+    # Falls back to the course name alone, in case the classroom was the part that was wrong
+    matches = classes.find(text) or classes.find(text.split()[0])
+    matches = sorted(key for key in matches if classes[key] in allowed)
+    if matches:
+        print(f'Did you mean: {", ".join(matches[:5])}?')
+
+def enrol_class(student, courses, classes, prev_enrolments, journal=None):
     '''Asks student in which classes the student wants to enrol in.
 
     Asks the student in which classes of the already created classes the student wants to enrol in,
-    taking note of unit limit and prerequisites.
+    taking note of unit limit and prerequisites. A student can join the waitlist of a class that is full.
 
     Args:
         student: The student that will enrol in classes
         classes: The already existing list of classes
         prev_enrolments: The already existing list of students with their current and past enrolments
+        journal: The Journal that changes are recorded to, if any
     '''
 
-    prev_enrolments = prev_enrolments[student.username].prev_enrolled
+    prev_enrolled = []
+    if student.username in prev_enrolments:
+        prev_enrolled = prev_enrolments[student.username].prev_enrolled
+    eligibility = Eligibility(student, courses, classes, prev_enrolled)
     try:
         while True:
             curr_enrolled = set()
-            courses_enrolled = set()
-            units_remaining = student.unit_limit
-
-            # Counts how many units student has left
-            for cl in classes.values():
-                if student.username in cl.student_ids:
-                    courses_enrolled.add(cl.course_name)
-                    curr_enrolled.add(f'{cl.course_name} / {cl.classroom}')
-                    units_remaining -= courses[cl.course_name].units
+            for cl in classes.student_classes(student.username):
+                curr_enrolled.add(f'{cl.course_name} / {cl.classroom}')
 
             # Gets all available classes that the student can enrol in (units fit, course not currently/previously enrolled)
-            avail_classes = set()
-            for cl in classes.values():
-                course = courses[cl.course_name]
-                if course.units <= units_remaining and cl.course_name not in courses_enrolled and cl.course_name not in prev_enrolments:
-                    for prereq in course.prereqs:
-                        if prereq not in prev_enrolments:
-                            break
-                    else:
-                        avail_classes.add(cl)
+            avail_classes = eligibility.available_classes()
 
             if not avail_classes:
                 print('No classes available for you to enrol in (may be due to units remaining, or previous/current enrolments).')
@@ -250,13 +1948,13 @@ def enrol_class(student, courses, classes, prev_enrolments):
             print('List of Classes')
 
             print(design_line('-', 100))
-            print(f"{'Class Name':<20}{'Classroom':<15}")
+            print(f"{'Class Name':<20}{'Classroom':<15}{'Seats':<10}{'Times':<30}")
 
             def take_name(cl):
                 return cl.course_name
 
             for cl in sorted(avail_classes, key = take_name):
-                print(f'{cl.course_name:<20}{cl.classroom:<15}')
+                print(f'{cl.course_name:<20}{cl.classroom:<15}{cl.seats():<10}{format_times(cl.times):<30}')
 
             print(design_line('-', 100))
 
@@ -279,10 +1977,32 @@ def enrol_class(student, courses, classes, prev_enrolments):
                     print('Class name is too long (>= 20 characters), please try again.')
                 elif len(classroom) >= 15:
                     print('Classroom name is too long (>= 15 characters), please try again.')
-                elif classes[f'{course_name} / {classroom}'] not in avail_classes:
+                elif classes.get(f'{course_name} / {classroom}') not in avail_classes:
                     print('Class with same name and classroom not found, please try again.')
+                    print_suggestions(classes, f'{course_name} {classroom}', avail_classes)
+                elif classes.student_clash(student.username, f'{course_name} / {classroom}') is not None:
+                    print(f"Class meets at the same time as {classes.student_clash(student.username, f'{course_name} / {classroom}')}, please try again.")
+                elif classes[f'{course_name} / {classroom}'].is_full():
+                    key = f'{course_name} / {classroom}'
+                    if student.username in classes[key].waitlist:
+                        print('Class is full and you are already on its waitlist.')
+                        break
+                    while True:
+                        query = input('Class is full, would you like to join its waitlist? (y/n): ').lower()
+                        if 'y' in query:
+                            priority = waitlist_priority(student, prev_enrolled)
+                            classes.join_waitlist(key, student.username, priority)
+                            if journal is not None:
+                                journal.record('waitlist', student.username, course_name, classroom, priority)
+                            print(f'Added to the waitlist, you will be enrolled when a seat frees up ({len(classes[key].waitlist)} waiting).')
+                            break
+                        elif 'n' in query:
+                            break
+                    break
                 else:
-                    classes[f'{course_name} / {classroom}'].student_ids.append(student.username)
+                    classes.enrol(f'{course_name} / {classroom}', student.username)
+                    if journal is not None:
+                        journal.record('enrol', student.username, course_name, classroom)
                     break
 
             exit_enrol = False
@@ -304,24 +2024,25 @@ def enrol_class(student, courses, classes, prev_enrolments):
         print('\n-- Forced exit, exiting dropping... --')
         print(design_line('-', 100))
 
-def drop_class(student, classes):
+def drop_class(student, users, courses, classes, prev_enrolments, journal=None):
     '''Asks student in which classes the student wants to drop.
 
     Asks the student in which classes of the already created classes the student wants to enrol in.
+    The seat freed up by a drop goes to the next student on the class' waitlist that can still take it.
 
     Args:
         student: The student that will enrol in classes
+        users: All the users, to check the waitlisted students against
+        courses: The already existing list of courses
         classes: The already existing list of classes
         prev_enrolments: The already existing list of students with their current and past enrolments
+        journal: The Journal that changes are recorded to, if any
     '''
     
     try:
         while True:
             # Gets all classes student is currently enrolled in
-            curr_enrolled = set()
-            for cl in classes.values():
-                if student.username in cl.student_ids:
-                    curr_enrolled.add(cl)
+            curr_enrolled = set(classes.student_classes(student.username))
 
             if not curr_enrolled:
                 print('No available classes to drop.')
@@ -352,10 +2073,15 @@ def drop_class(student, classes):
                     print('Class name is too long (>= 20 characters), please try again.')
                 elif len(classroom) >= 15:
                     print('Classroom name is too long (>= 15 characters), please try again.')
-                elif classes[f'{course_name} / {classroom}'] not in curr_enrolled:
+                elif classes.get(f'{course_name} / {classroom}') not in curr_enrolled:
                     print('Class with same name and classroom not found, please try again.')
+                    print_suggestions(classes, f'{course_name} {classroom}', curr_enrolled)
                 else:
-                    classes[f'{course_name} / {classroom}'].student_ids.remove(student.username)
+                    classes.drop(f'{course_name} / {classroom}', student.username)
+                    # Replaying the drop from the journal promotes the same students again
+                    promote_waitlisted(f'{course_name} / {classroom}', users, courses, classes, prev_enrolments)
+                    if journal is not None:
+                        journal.record('drop', student.username, course_name, classroom)
                     break
 
             exit_enrol = False
@@ -377,7 +2103,7 @@ def drop_class(student, classes):
         print('\n-- Forced exit, exiting dropping... --')
         print(design_line('-', 100))
 
-def create_class(courses, classes):
+def create_class(courses, classes, journal=None):
     '''Asks admin for inputs to create a number of new classes.
 
     Asks the admin for details which include name of classes, classroom number, number of units, 
@@ -385,6 +2111,7 @@ def create_class(courses, classes):
 
     Args:
         classes: The already existing list of classes
+        journal: The Journal that changes are recorded to, if any
     '''
 
     try:
@@ -392,13 +2119,12 @@ def create_class(courses, classes):
             print('Press Ctrl + C at any time to exit creation\n')
             print('List of Classes')
             print(design_line('-', 100))
-            print(f"{'Class Name':<20}{'Classroom':<15}")
 
-            if not classes:
-                print('No Classes Available')
-            else:
-                for cl in [value for _, value in sorted(classes.items())]:
-                    print(f'{cl.course_name:<20}{cl.classroom:<15}')
+            def class_row(key):
+                return f'{classes[key].course_name:<20}{classes[key].classroom:<15}'
+
+            classes.load_all()
+            show_listing(f"{'Class Name':<20}{'Classroom':<15}", classes.sorted_keys, class_row, 'No Classes Available')
 
             print(design_line('-', 100))
 
@@ -408,10 +2134,11 @@ def create_class(courses, classes):
                 break
 
             print('List of Courses')
-            print(f"{'Course Name':<20}{'Units':<7}")
-            
-            for c in [value for _, value in sorted(courses.items())]:
-                print(f'{c.course_name:<20}{c.units:<7}')
+
+            def course_row(name):
+                return f'{name:<20}{courses[name].units:<7}'
+
+            show_listing(f"{'Course Name':<20}{'Units':<7}", courses.sorted_keys, course_row)
 
             print(design_line('-', 100))
 
@@ -420,23 +2147,43 @@ def create_class(courses, classes):
             while True:
                 course_name = input('Please input the name of the course of the new class: ')
                 classroom = input("Please input where it's going to be held: ")
-                if not course_name or not classroom:
-                    print('Course name or classroom name cannot be blank, please try again.')
-                elif len(course_name) >= 20:
-                    print('Course name is too long (>= 20 characters), please try again.')
-                elif len(classroom) >= 15:
-                    print('Classroom name is too long (>= 15 characters), please try again.')
-                elif ' ' in classroom:
-                    print('Classroom name must have no spaces, please try again.')
-                elif f'{course_name} / {classroom}' in classes:
-                    print('Class with same name and classroom already found, please try again.')
-                elif course_name not in courses:
-                    print('Course not in previously made courses, please try again.')
-                else:
-                    classes[f'{course_name} / {classroom}'] = Class(course_name, classroom, list())
+                problem = class_problem(courses, classes, course_name, classroom)
+                if problem is None:
                     break
+                print(f'{problem}, please try again.')
                 print(design_line('-', 100))
 
+            times = ()
+            while True:
+                try:
+                    times = parse_times(input('Please input the meeting times, such as MON0900-1030 WED0900-1030 (leave blank for none): '))
+                except ValueError as e:
+                    print(f'{e}, please try again.')
+                    continue
+                problem = times_problem(classes, classroom, times)
+                if problem is None:
+                    break
+                print(f'{problem}, please try again.')
+
+            capacity = None
+            while True:
+                capacity = input('Please input the seat limit of the class (leave blank for no limit): ')
+                if not capacity:
+                    capacity = None
+                    break
+                try:
+                    capacity = int(capacity)
+                except ValueError:
+                    capacity = 0
+                problem = capacity_problem(capacity)
+                if problem is None:
+                    break
+                print(f'{problem}, please try again.')
+
+            classes[f'{course_name} / {classroom}'] = Class(course_name, classroom, (), capacity, times=times)
+            if journal is not None:
+                journal.record('create_class', course_name, classroom, capacity, format_times(times))
+
             print(design_line('-', 100))
             print(f'{course_name} in room {classroom} was added.')
 
@@ -459,13 +2206,14 @@ def create_class(courses, classes):
         print('\n-- Forced exit, exiting addition... --')
         print(design_line('-', 100))
             
-def remove_class(classes):
+def remove_class(classes, journal=None):
     '''Asks admin for inputs to delete a number of new classes.
 
     Asks the admin which of all the previously created classes they want to delete.
 
     Args:
         classes: The already existing list of classes
+        journal: The Journal that changes are recorded to, if any
     '''
 
     try:
@@ -474,10 +2222,12 @@ def remove_class(classes):
             print('List of Classes')
             
             print(design_line('-', 100))
-            print(f"{'Class Name':<20}{'Classroom':<15}")
 
-            for cl in [value for _, value in sorted(classes.items())]:
-                print(f'{cl.course_name:<20}{cl.classroom:<15}')
+            def class_row(key):
+                return f'{classes[key].course_name:<20}{classes[key].classroom:<15}'
+
+            classes.load_all()
+            show_listing(f"{'Class Name':<20}{'Classroom':<15}", classes.sorted_keys, class_row)
 
             print(design_line('-', 100))
 
@@ -496,6 +2246,8 @@ def remove_class(classes):
                     print('Specified combination of class and classroom is not in classes, please try again.')
                 else:
                     del classes[f'{course_name} / {classroom}']
+                    if journal is not None:
+                        journal.record('remove_class', course_name, classroom)
                     break
                 print(design_line('-', 100))
 
@@ -521,7 +2273,7 @@ def remove_class(classes):
         print('\n-- Forced exit, exiting deletion... --')
         print(design_line('-', 100))
 
-def create_course(courses):
+def create_course(courses, journal=None):
     '''Asks admin for inputs to create a number of new courses.
 
     Asks the admin for details which include name of courses, number of units, 
@@ -529,6 +2281,7 @@ def create_course(courses):
 
     Args:
         courses: The already existing list of courses
+        journal: The Journal that changes are recorded to, if any
     '''
 
     try:
@@ -537,36 +2290,31 @@ def create_course(courses):
             print('List of Courses')
             
             print(design_line('-', 100))
-            print(f"{'Course Name':<20}{'Units':<7}")
 
-            for c in [value for _, value in sorted(courses.items())]:
-                print(f'{c.course_name:<20}{c.units:<7}')
+            def course_row(name):
+                return f'{name:<20}{courses[name].units:<7}'
+
+            show_listing(f"{'Course Name':<20}{'Units':<7}", courses.sorted_keys, course_row)
 
             print(design_line('-', 100))
 
             course_name = None
             while True:
                 course_name = input('Please input the name of the new course: ')
-                if not course_name:
-                    print('Course name cannot be blank, please try again.')
-                elif len(course_name) >= 20:
-                    print('Course name is too long (>= 20 characters), please try again.')
-                elif ' ' in course_name:
-                    print('Course name cannot have spaces, please try again.')
-                elif course_name in courses:
-                    print('Course with same name already found, please try again.')
-                else:
+                problem = course_name_problem(courses, course_name)
+                if problem is None:
                     break
+                print(f'{problem}, please try again.')
                 print(design_line('-', 100))
             
             units = None
             while True:
                 try:
                     units = int(input('Please input how many units the course will be worth: '))
-                    if units < 0 or units > 50:
-                        print('Units cannot be less than 0 or more than 50, please try again.')
-                    else:
+                    problem = units_problem(units)
+                    if problem is None:
                         break
+                    print(f'{problem}, please try again.')
                 except ValueError:
                     print('Input was not a single integer, please try again.') 
                 print(design_line('-', 100))
@@ -574,19 +2322,16 @@ def create_course(courses):
             prereqs = None
             while True:
                 prereqs = input('Please input what prereqs the course will or will not have (separated by spaces): ').strip().split()
-                for prereq in prereqs:
-                    if prereq not in courses:
-                        break
-                else:
+                problem = prereqs_problem(courses, prereqs)
+                if problem is None:
                     break
-                print('At least one of the prerequisites specified was not in already existing list of classes. Please try again.')
+                print(f'{problem}. Please try again.')
                 print(design_line('-', 100))
 
-            if not prereqs:
-                prereqs = ['None']
-            
             new_course = Course(course_name, units, prereqs)
             courses[course_name] = new_course
+            if journal is not None:
+                journal.record('create_course', course_name, units, ' '.join(prereqs))
 
             print(design_line('-', 100))
             print(f'{new_course.course_name} with units {new_course.units} was added.')
@@ -610,30 +2355,21 @@ def create_course(courses):
         print('\n-- Forced exit, exiting addition... --')
         print(design_line('-', 100))
 
-def remove_course(courses, classes):
+def remove_course(courses, classes, journal=None):
     '''Asks admin for inputs to remove a number of new courses.
 
     Asks the admin which of all the previously created courses they want to delete.
 
     Args:
         courses: The already existing list of courses
+        classes: The already existing list of classes, which keeps the reference counts of courses up to date
+        journal: The Journal that changes are recorded to, if any
     '''
 
     try:
         while True:
-            # Unavailable courses are courses which have a class or is a prerequisite of another course
-            unavail_courses = set()
-            for course in courses.values():
-                unavail_courses.update(course.prereqs)
-            for cl in classes.values():
-                unavail_courses.add(cl.course_name)
-            
-            avail_courses = set()
-            for c in [c for _, c in sorted(courses.items())]:
-                if c.course_name not in unavail_courses:
-                    avail_courses.add(c)
-
-            if not avail_courses:
+            # Courses which have a class or are a prerequisite of another course are never in courses.deletable
+            if not courses.deletable:
                 print('No available courses to delete (may be because all courses have a class/is a prerequisite of a current course).')
                 print('Exiting deletion...')
                 break
@@ -642,10 +2378,11 @@ def remove_course(courses, classes):
             print('List of Courses that can be Deleted')
             
             print(design_line('-', 100))
-            print(f"{'Course Name':<20}{'Units':<7}")
 
-            for c in avail_courses:
-                print(f'{c.course_name:<20}{c.units:<7}')
+            def course_row(name):
+                return f'{name:<20}{courses[name].units:<7}'
+
+            show_listing(f"{'Course Name':<20}{'Units':<7}", courses.deletable, course_row)
             print(design_line('-', 100))
 
             course_name = None
@@ -655,10 +2392,12 @@ def remove_course(courses, classes):
                     print('Course name cannot be blank, please try again.')
                 elif len(course_name) >= 20:
                     print('Course name is too long (>= 20 characters), please try again.')
-                elif course_name not in avail_courses:
+                elif course_name not in courses.deletable:
                     print('Course name not found, please try again.')
                 else:
                     del courses[course_name]
+                    if journal is not None:
+                        journal.record('remove_course', course_name)
                     break
                 print(design_line('-', 100))
 
@@ -684,14 +2423,15 @@ def remove_course(courses, classes):
         print('\n-- Forced exit, exiting deletion... --')
         print(design_line('-', 100))
 
-def edit_students(students):
+def edit_students(users, journal=None):
     '''Allows the admin to edit any of the students' information directly.
 
     Asks the admin for details on which students they want to edit information for and
     what information they want to change.
     
     Args:
-        students: All the students currently in the Lozol system
+        users: The UserList of all the users currently in the Lozol system, only the students of which are shown
+        journal: The Journal that changes are recorded to, if any
     '''
     try:
         while True:
@@ -699,20 +2439,30 @@ def edit_students(students):
             print('List of Students')
 
             print(design_line('-', 100))
-            
-            print(f"{'ID Number':<10}{'Name':<30}{'Unit Limit':<15}")
-            for student in students.values():
-                print(f'{student.username:<10}{student.name:<30}{student.unit_limit:<15}')
+
+            def student_row(id_number):
+                student = users[id_number]
+                return f'{student.username:<10}{student.name:<30}{student.unit_limit:<15}'
+
+            show_listing(f"{'ID Number':<10}{'Name':<30}{'Unit Limit':<15}", users.students, student_row,
+                         search=users.find)
 
             print(design_line('-', 100))
 
-            id_number = input('Please input the ID number of the student you wish to edit: ')
-            if id_number not in students:
+            id_number = input('Please input the ID number of the student you wish to edit (or part of their name to search): ')
+            if id_number not in users or not isinstance(users[id_number], Student):
                 print('ID number not in list of students, please try again.')
+                matches = sorted(users.find(id_number))
+                if matches:
+                    print(f'Students matching {id_number!r}:')
+                    for match in matches[:PAGE_SIZE]:
+                        print(student_row(match))
+                    if len(matches) > PAGE_SIZE:
+                        print(f'... and {len(matches) - PAGE_SIZE} more')
                 print(design_line('-', 100))
             else:
                 while True:
-                    student = students[id_number]
+                    student = users[id_number]
                     print(design_line('-', 100))
                     print(f"{'Student Name':<30}{'Unit Limit':<15}")
                     print(f"{student.name:<30}{student.unit_limit:<15}")
@@ -725,10 +2475,14 @@ def edit_students(students):
                         while True:
                             print(design_line('-', 100))
                             new_name = input('Please input new name: ')
-                            if len(new_name) >= 30:
-                                print('Name too long, please try again.')
+                            problem = student_name_problem(new_name)
+                            if problem is not None:
+                                print(f'{problem}, please try again.')
                             else:
-                                students[id_number].name = new_name
+                                users[id_number].name = new_name
+                                users.touch(id_number)
+                                if journal is not None:
+                                    journal.record('edit_name', id_number, new_name)
                                 print('Name changed.')
                                 print(design_line('-', 100))
                                 break
@@ -737,10 +2491,14 @@ def edit_students(students):
                             print(design_line('-', 100))
                             try:
                                 new_unit_limit = int(input('Please input new unit limit: '))
-                                if new_unit_limit > 30:
-                                    print('Unit limit too large, please try again.')
+                                problem = unit_limit_problem(new_unit_limit)
+                                if problem is not None:
+                                    print(f'{problem}, please try again.')
                                 else:
-                                    students[id_number].unit_limit = new_unit_limit
+                                    users[id_number].unit_limit = new_unit_limit
+                                    users.touch(id_number)
+                                    if journal is not None:
+                                        journal.record('edit_limit', id_number, new_unit_limit)
                                     print('Unit limit changed.')
                                     print(design_line('-', 100))
                                     break
@@ -754,7 +2512,7 @@ def edit_students(students):
         print(design_line('-', 100))
     pass
 
-def edit_student_password(users, id_number):
+def edit_student_password(users, id_number, journal=None):
     '''Allows a student to edit their password.
 
     Asks the student for their old password and then asks for the new password to change their
@@ -763,13 +2521,14 @@ def edit_student_password(users, id_number):
     Args:
         users: The whole list of students in the Lozol system
         id_number: The id number of the student changing their password
+        journal: The Journal that changes are recorded to, if any
     '''
     try:
         student = users[id_number]
         while True:
             print('Press Ctrl + C at any time to exit editing password')
             query = input('Please enter your current password: ')
-            if student.password != query:
+            if not student.check_password(query):
                 print('Wrong password, please try again.')
                 print(design_line('-', 100))
             else:
@@ -778,8 +2537,8 @@ def edit_student_password(users, id_number):
             print(design_line('-', 100))
             print('Press Ctrl + C at any time to exit editing password')
             print(design_line('-', 100))
-            print(f"{'ID Number':<10}{'Your Password':<30}")
-            print(f'{student.username:<10}{student.password:<30}')
+            print(f"{'ID Number':<10}")
+            print(f'{student.username:<10}')
             print(design_line('-', 100))
             query = input('Please input new password: ')
             confirm = input('Please confirm your new password: ')
@@ -787,7 +2546,10 @@ def edit_student_password(users, id_number):
                 print('Passwords not the same, please try again.')
                 print(design_line('-', 100))
             else:
-                users[id_number].password = query
+                users[id_number].set_password(query)
+                users.touch(id_number)
+                if journal is not None:
+                    journal.record('password', id_number, users[id_number].password)
                 print('Password saved.')
                 print(design_line('-', 100))
     except KeyboardInterrupt:
@@ -795,37 +2557,679 @@ def edit_student_password(users, id_number):
         print(design_line('-', 100))
     pass
 
-def main():
-    users = {}
-    courses = {}
-    classes = {}
-    prev_enrolments = {}
+DATA_FILES = ('users.txt', 'courses.txt', 'classes.txt', 'prev_enrolments.txt')
+SNAPSHOT_PATH = 'lozol.snapshot'
+SNAPSHOT_VERSION = 14
+
+def data_paths():
+    '''Returns the paths of the text files the data is read from when starting.
+
+    Once the classes are split into shards (see shards.py), the shard index and the student index take
+    the place of classes.txt, and the shards and student index files are only read when they are needed.
+    '''
+    if os.path.exists(SHARD_INDEX):
+        return ('users.txt', 'courses.txt', SHARD_INDEX, 'prev_enrolments.txt')
+    return DATA_FILES
+
+def record_files(users, courses, classes, prev_enrolments):
+    '''Returns a list of (path, records) for every text file of data_paths(), with the records kept in it.'''
+    if isinstance(classes, ShardedClassList):
+        return list(zip(data_paths(), (users, courses, classes.index, prev_enrolments)))
+    return list(zip(DATA_FILES, (users, courses, classes, prev_enrolments)))
+
+def data_files_stamp():
+    '''Returns the size and modification time of each of the text files, used to tell if the snapshot is stale.'''
+    stamp = [SNAPSHOT_VERSION]
+    for path in data_paths():
+        stat = os.stat(path)
+        stamp.append((path, stat.st_size, stat.st_mtime_ns))
+    return stamp
+
+def snapshot_trusted(snapshot_stat):
+    '''Returns whether the snapshot can only have been written by someone who could already change the text files.
+
+    Unpickling the snapshot can run any code written into it, so it is only read if it is owned by the
+    current user or by the owner of one of the text files, and if no one else can write to it who could
+    not also write to every text file.
+
+    Args:
+        snapshot_stat: The os.stat_result of the open snapshot file
+    '''
+    owners = {os.getuid()}
+    writable = stat.S_IWGRP | stat.S_IWOTH
+    for path in data_paths():
+        data_stat = os.stat(path)
+        owners.add(data_stat.st_uid)
+        writable &= data_stat.st_mode
+    return snapshot_stat.st_uid in owners and not snapshot_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH) & ~writable
+
+def load_snapshot():
+    '''Reads the already parsed data from the snapshot, if the text files have not changed since it was written.
+
+    Returns:
+        A tuple of the users, courses, classes, and previous enrolments, or None if there is no up to date
+        snapshot or it is not trusted (see snapshot_trusted).
+    '''
+    try:
+        with open(SNAPSHOT_PATH, 'rb') as snapshot:
+            if not snapshot_trusted(os.fstat(snapshot.fileno())):
+                return None
+            if pickle.load(snapshot) != data_files_stamp():
+                return None
+            return pickle.load(snapshot)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
 
+def write_snapshot(users, courses, classes, prev_enrolments):
+    '''Writes the parsed data to the snapshot so that the next start does not have to parse the text files.'''
+    # Sessions loading at the same time can each write the snapshot, so each writes its own temporary file
+    tmp_path = f'{SNAPSHOT_PATH}.{os.getpid()}.tmp'
     try:
-        with open('users.txt') as users_txt:
-            for user in users_txt.readlines():
-                parsed_user = parse_as_user(user.strip())
-                if parsed_user is not None:
-                    users[parsed_user.username] = parsed_user
-                
-        with open('courses.txt') as courses_txt:
-            for course in courses_txt.readlines():
-                parsed_course = parse_as_course(course.strip('\n'))
-                if parsed_course is not None:
-                    courses[parsed_course.course_name] = parsed_course
-
-        with open('classes.txt') as classes_txt:
-            for cl in classes_txt.readlines():
-                parsed_class = parse_as_class(cl.strip('\n'))
-                if parsed_class is not None:
-                    classes[f'{parsed_class.course_name} / {parsed_class.classroom}'] = parsed_class
-
-        with open('prev_enrolments.txt') as prev_enrolments_txt:
-            for p_enrol in prev_enrolments_txt.readlines():
-                parsed_p_enrol = parse_as_prev_enrolments(p_enrol.strip('\n'))
-                if parsed_p_enrol is not None:
-                    prev_enrolments[parsed_p_enrol.student_id] = parsed_p_enrol
+        with open(tmp_path, 'wb') as snapshot:
+            # Readable and writable by the same people as users.txt, so that other sessions trust it
+            os.fchmod(snapshot.fileno(), stat.S_IMODE(os.stat(data_paths()[0]).st_mode))
+            pickle.dump(data_files_stamp(), snapshot, pickle.HIGHEST_PROTOCOL)
+            pickle.dump((users, courses, classes, prev_enrolments), snapshot, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, SNAPSHOT_PATH)
+    except OSError:
+        # The snapshot only speeds up the next start, so Lozol carries on without it
+        pass
+
+@contextlib.contextmanager
+def paused_gc():
+    '''Pauses garbage collection inside a with block.
+
+    Loading creates a very large number of objects at once, none of which can be garbage yet, and the
+    garbage collector would otherwise keep scanning all of them while they are being created.
+    '''
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+def load_data():
+    '''Reads all the users, courses, classes, and previous enrolments, from the snapshot if it is up to date.
+
+    Holds a shared lock on the data directory while reading, so that another session cannot be halfway
+    through saving the text files.
+
+    Returns:
+        A tuple of the users, courses, classes, and previous enrolments, each keyed the same way
+        that the rest of Lozol expects (classes are keyed by "course_name / classroom").
+    '''
+    with data_lock(), paused_gc():
+        data = load_snapshot()
+        if data is None:
+            data = parse_data()
+            write_snapshot(*data)
+        for path, records in record_files(*data):
+            records.file_stamp = file_stamp(path)
+    return data
+
+def record_version(line):
+    '''Returns the version stamp of a record, the checksum of its line in a text file.'''
+    return zlib.crc32(line.encode())
+
+def record_key(record):
+    '''Returns the key that a user, course, class, or previous enrolment is kept under.'''
+    if isinstance(record, User):
+        return record.username
+    elif isinstance(record, Course):
+        return record.course_name
+    elif isinstance(record, Class):
+        return f'{record.course_name} / {record.classroom}'
+    elif isinstance(record, IndexEntry):
+        return record.key
+    return record.student_id
+
+def read_records(path, parse):
+    '''Parses every line of a text file.
+
+    Args:
+        path: The path of the text file
+        parse: The function that parses a line of the file, such as parse_as_user()
+
+    Yields:
+        A (key, record, version stamp) tuple for every line that could be parsed.
+    '''
+    with open(path) as records_txt:
+        for line in records_txt.readlines():
+            line = line.strip('\n')
+            record = parse(line)
+            if record is not None:
+                yield record_key(record), record, record_version(line)
+
+# The names of the functions that parse each data file, looked up when a file is read so that the
+# timed wrappers --metrics puts in their place are called
+RECORD_PARSERS = {
+    'users.txt': 'parse_as_user',
+    'courses.txt': 'parse_as_course',
+    'classes.txt': 'parse_as_class',
+    'prev_enrolments.txt': 'parse_as_prev_enrolments',
+    SHARD_INDEX: 'parse_as_index_entry',
+}
+
+def record_parser(path):
+    '''Returns the function that parses a line of a data file, such as parse_as_user() for users.txt.'''
+    return globals()[RECORD_PARSERS[path]]
+
+def parse_data():
+    '''Reads all the users, courses, classes, and previous enrolments by parsing their text files.
+
+    The previous enrolments are only indexed, since each student's are read when they are first looked up.
+
+    Returns:
+        A tuple of the users, courses, classes, and previous enrolments.
+    '''
+    users = UserList()
+    courses = CourseList()
+    classes = ShardedClassList(courses) if os.path.exists(SHARD_INDEX) else ClassList(courses)
+    prev_enrolments = PrevEnrolmentList()
+    prev_enrolments.index()
+    data = (users, courses, classes, prev_enrolments)
+
+    for path, records in record_files(*data):
+        if records is prev_enrolments:
+            continue
+        for key, record, version in read_records(path, record_parser(path)):
+            try:
+                records[key] = record
+            except ValueError as e:
+                print(f'Skipping course {key}: {e}')
+                continue
+            records.versions[key] = version
+
+    for _, records in record_files(*data):
+        records.mark_saved()
+    return data
+
+def write_records(path, records, keys):
+    '''Writes the records with the given keys to a text file, in order, and updates their version stamps.'''
+    lines = []
+    for key in keys:
+        line = records[key].info()
+        lines.append(line)
+        records.versions[key] = record_version(line)
+    write_atomic(path, lines)
+
+def write_atomic(path, lines):
+    '''Writes the lines to a file without ever leaving a half-written file behind.
+
+    The lines are written in one go to a temporary file next to the file, which is then renamed over it.
+
+    Args:
+        path: The path of the file to write
+        lines: The lines to write, without their line endings
+    '''
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as tmp_txt:
+        tmp_txt.write('\n'.join(lines))
+        tmp_txt.flush()
+        os.fsync(tmp_txt.fileno())
+    os.replace(tmp_path, path)
+
+def file_stamp(path):
+    '''Returns the inode, size, and modification time of a file, which change whenever the file is written.'''
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+LOCK_PATH = 'lozol.lock'
+
+@contextlib.contextmanager
+def data_lock(exclusive=False):
+    '''Holds an advisory lock on the data directory inside a with block.
+
+    Any number of sessions can hold the shared lock to read the text files at once, but saving takes
+    the exclusive lock, so no session ever reads the files while another is halfway through writing them.
+    Does nothing on systems without fcntl.
+    '''
+    if fcntl is None:
+        yield
+        return
+    with open(LOCK_PATH, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+def merge_records(path, records, parse, keys=None):
+    '''Brings the records up to date with the text file after another session saved it, keeping this session's changes.
+
+    The records that only the other session changed are taken from the file. A record that this session
+    changed too is kept as this session has it if the other session did not change it (its version stamp
+    in the file is the same as when this session read it). If both changed it and the changes cannot be
+    merged with records.merge(), the other session's record is kept and this session's change is rejected.
+
+    Args:
+        path: The path of the text file
+        records: The records kept in the file
+        parse: The function that parses a line of the file
+        keys: The keys of the records kept in the file, if the records are spread over several files (as
+            the classes of a ShardedClassList are), otherwise all of them
+
+    Returns:
+        A tuple of a dictionary mapping each key in the file to its record there, and a list of the
+        changes of this session that were rejected.
+    '''
+    theirs = {}
+    versions = {}
+    for key, record, version in read_records(path, parse):
+        theirs[key] = record
+        versions[key] = version
+
+    rejected = []
+    mine = set(records.changed)
+    for key in list((records.keys() if keys is None else set(keys)) | theirs.keys()):
+        version = versions.get(key)
+        if version == records.version(key):
+            # The other session did not change this record
+            continue
+        if key in mine and key in records and key in theirs and records[key].info() == theirs[key].info():
+            # Both sessions made the same change
+            records.versions[key] = version
+            continue
+        if key in mine:
+            left_out = records.merge(key, theirs.get(key))
+            if left_out is not None:
+                rejected.extend(left_out)
+                continue
+            rejected.append(f'{key} (changed by another session)')
+        take_theirs(records, key, theirs.get(key))
+        if version is None:
+            records.versions.pop(key, None)
+        else:
+            records.versions[key] = version
+        if key not in mine:
+            # The file already has the other session's change, so it does not have to be written again
+            records.changed.discard(key)
+    return theirs, rejected
+
+def take_theirs(records, key, record):
+    '''Replaces a record with the one another session saved, or removes it if that session removed it.'''
+    if record is not None:
+        records[key] = record
+    elif key in records:
+        del records[key]
+
+def check_references(courses, classes, their_courses, their_classes):
+    '''Rejects the changes that merged into records another session's changes removed.
+
+    A course removed by one session can still be required by a course or taught by a class that another
+    session added, so the removal is undone. A course or class this session added that requires a course
+    the other session removed is taken back out.
+
+    Returns:
+        A list of the changes that were rejected.
+    '''
+    rejected = []
+    for course_name in list(courses.changed):
+        if course_name not in courses and courses.references.get(course_name) and course_name in their_courses:
+            courses[course_name] = their_courses[course_name]
+            rejected.append(f'removing {course_name} (another session now uses it)')
+    for course_name in list(courses.changed):
+        course = courses.get(course_name)
+        if course is not None and any(pr not in courses for pr in course.prereqs):
+            take_theirs(courses, course_name, their_courses.get(course_name))
+            rejected.append(f'{course_name} (a prerequisite was removed by another session)')
+    for key in list(classes.changed):
+        cl = classes.get(key)
+        if cl is not None and cl.course_name not in courses:
+            take_theirs(classes, key, their_classes.get(key))
+            rejected.append(f'{key} (its course was removed by another session)')
+    return rejected
+
+def check_clashes(classes, added):
+    '''Rejects the enrolments this session made that clash with a class another session enrolled the same student in.
+
+    Each session only checks its own student's timetable when enrolling, so two sessions can enrol a
+    student in two classes that meet at the same time. Once their changes are merged, this session's
+    enrolment is taken back out.
+
+    Args:
+        classes: The classes, with the other session's changes merged in
+        added: The enrolments this session made, as returned by classes.added_enrolments() before merging
 
+    Returns:
+        A list of the changes that were rejected.
+    '''
+    rejected = []
+    for key, students in added.items():
+        if key not in classes:
+            continue
+        for s_id in sorted(students):
+            if s_id not in classes[key].student_ids:
+                continue
+            clash = classes.student_clash(s_id, key)
+            if clash is not None:
+                classes.drop(key, s_id)
+                rejected.append(f'enrolment of {s_id} in {key} (clashes with {clash}, changed by another session)')
+    return rejected
+
+def save_data(users, courses, classes, prev_enrolments):
+    '''Writes the users, courses, classes, and previous enrolments that were changed back to their text files.
+
+    Only the files of the records that were changed since they were last saved are written, and if the
+    classes are split into shards, only the shards with changed classes. Holds the exclusive lock on the
+    data directory while saving, so that sessions save one at a time. If another session saved since this
+    one read the files, its changes are merged in first (see merge_records()), so neither session loses
+    the other's changes.
+
+    Args:
+        users: All the users in the Lozol system
+        courses: All the courses in the Lozol system
+        classes: All the classes in the Lozol system
+        prev_enrolments: All the students with their previous enrolments
+
+    Returns:
+        A list of the changes that could not be saved because another session changed the same records.
+    '''
+    files = record_files(users, courses, classes, prev_enrolments)
+    if not classes.changed and not any(records.changed for _, records in files):
+        # Nothing to save, and another session may have saved since, so the snapshot is left as it is
+        return []
+    sharded = isinstance(classes, ShardedClassList)
+    rejected = []
+    added = classes.added_enrolments()
+    with data_lock(exclusive=True):
+        theirs = {}
+        for path, records in files:
+            if records.file_stamp is not None and file_stamp(path) != records.file_stamp:
+                theirs[path], merge_rejected = merge_records(path, records, record_parser(path))
+                rejected.extend(merge_rejected)
+        if sharded:
+            for shard, keys in classes.shard_keys(classes.changed_shards()).items():
+                path = classes.shard_path(shard)
+                if os.path.exists(path) and file_stamp(path) != classes.loaded.get(shard):
+                    theirs[path], merge_rejected = merge_records(path, classes, parse_as_class, keys)
+                    rejected.extend(merge_rejected)
+
+        if theirs.keys() - {'users.txt', 'prev_enrolments.txt'}:
+            # A course or class was saved by another session, so one of them may now need one that was removed
+            if 'courses.txt' not in theirs:
+                theirs['courses.txt'] = {key: course for key, course, _ in read_records('courses.txt', parse_as_course)}
+            their_classes = {}
+            class_paths = [classes.shard_path(shard) for shard in classes.changed_shards()] if sharded else ['classes.txt']
+            for path in class_paths:
+                if path in theirs:
+                    their_classes.update(theirs[path])
+                elif os.path.exists(path):
+                    their_classes.update((key, cl) for key, cl, _ in read_records(path, parse_as_class))
+            rejected.extend(check_references(courses, classes, theirs['courses.txt'], their_classes))
+            rejected.extend(check_clashes(classes, added))
+
+        if sharded:
+            for key in classes.changed:
+                if not dict.__contains__(classes, key):
+                    classes.versions.pop(key, None)
+            for shard, keys in classes.shard_keys(classes.changed_shards()).items():
+                path = classes.shard_path(shard)
+                write_records(path, classes, keys)
+                classes.loaded[shard] = file_stamp(path)
+            classes.mark_saved()
+
+            # The student index files are merged last, since merging the classes can change their entries
+            buckets = classes.changed_student_buckets()
+            for bucket, keys in classes.student_bucket_keys(buckets).items():
+                path = classes.student_bucket_path(bucket)
+                if os.path.exists(path) and file_stamp(path) != classes.student_buckets.get(bucket):
+                    merge_records(path, classes.students, parse_as_index_entry, keys)
+            os.makedirs(STUDENT_DIR, exist_ok=True)
+            for bucket, keys in classes.student_bucket_keys(buckets).items():
+                path = classes.student_bucket_path(bucket)
+                write_records(path, classes.students, keys)
+                classes.student_buckets[bucket] = file_stamp(path)
+            classes.students.mark_saved()
+        for path, records in files:
+            if records.changed:
+                records.versions = {}
+                write_records(path, records, list(records.keys()))
+                records.mark_saved()
+            if records.file_stamp is not None:
+                records.file_stamp = file_stamp(path)
+        write_snapshot(users, courses, classes, prev_enrolments)
+    return rejected
+
+class TextStorage:
+    '''Stores the Lozol data in the ' / ' separated users.txt, courses.txt, classes.txt, and prev_enrolments.txt.
+
+    Any other storage (such as SqliteStorage in sqlite_storage.py) provides the same load() and save() methods.
+    '''
+    def load(self):
+        '''Returns a tuple of the users, courses, classes, and previous enrolments.'''
+        return load_data()
+
+    def save(self, users, courses, classes, prev_enrolments):
+        '''Saves the records that were changed since they were last saved.
+
+        Returns:
+            A list of the changes that could not be saved because another session changed the same records.
+        '''
+        return save_data(users, courses, classes, prev_enrolments)
+
+    def close(self):
+        pass
+
+def open_storage():
+    '''Returns the storage that Lozol should use.
+
+    The text files are used unless the LOZOL_DB environment variable gives the path to an SQLite database.
+    '''
+    db_path = os.environ.get('LOZOL_DB')
+    if db_path:
+        from sqlite_storage import SqliteStorage
+        return SqliteStorage(db_path)
+    return TextStorage()
+
+JOURNAL_PATTERN = 'journal*.txt'
+
+def compact_interval(default):
+    '''Returns how many changes a journal records before it is compacted, or None to only compact when saving.
+
+    Set with the LOZOL_COMPACT_EVERY environment variable, where 0 turns automatic compacting off. The
+    server compacts every 100 changes unless it is set, but an interactive session only saves when the
+    user says so, since compacting saves the session's changes for good.
+
+    Args:
+        default: The number of changes to use if LOZOL_COMPACT_EVERY is not set, 0 to only compact when saving
+    '''
+    every = int(os.environ.get('LOZOL_COMPACT_EVERY', str(default)))
+    return every if every > 0 else None
+
+class Journal:
+    '''An append-only file of every change made, so that changes are kept even if Lozol exits unexpectedly.
+
+    Each change is written as a single line (for example "enrol / 11828579 / CCPROG1 / G302B") and flushed
+    straight away. Every session has a journal of its own, locked for as long as the session runs. When
+    Lozol starts, the changes in any journal that is not locked (one left behind by a session that ended
+    without saving) are replayed on top of what was loaded from the text files and taken over by the new
+    session. Compacting writes everything to the text files and empties the journal.
+
+    Attributes:
+        path: The path to the journal file, or None to make a new one when it is opened
+        data: A tuple of the users, courses, classes, and previous enrolments the changes apply to
+        storage: The storage that the data is saved to when compacting
+        compact_every: The number of recorded changes after which the journal is compacted, or None to never do it automatically
+        entries: The number of changes in the journal since it was last compacted
+        session_start: The size of the journal file when this session started
+        rejected: The changes that automatic compacting could not save because another session changed the same records
+        compactions: The number of times the journal was compacted automatically
+    '''
+    def __init__(self, path, users, courses, classes, prev_enrolments, compact_every=None, storage=None):
+        self.path = path
+        self.data = (users, courses, classes, prev_enrolments)
+        self.storage = storage if storage is not None else TextStorage()
+        self.compact_every = compact_every
+        self.entries = 0
+        self.session_start = 0
+        self.rejected = []
+        self.compactions = 0
+        self._file = None
+
+    def replay(self):
+        '''Applies all the changes in the journals that were left behind to the data, and takes them over.
+
+        Each journal's changes are copied into this session's journal before the old journal is removed,
+        so they are still kept if this session also ends without saving.
+
+        Returns:
+            The number of changes that were replayed.
+        '''
+        if self._file is None:
+            self.open()
+        with data_lock(exclusive=True):
+            for path in sorted(glob.glob(JOURNAL_PATTERN)):
+                if path == self.path:
+                    continue
+                try:
+                    journal_txt = open(path, 'r+')
+                except FileNotFoundError:
+                    continue
+                with journal_txt:
+                    if not lock_journal(journal_txt):
+                        # Another session is still running and recording to it
+                        continue
+                    if os.fstat(journal_txt.fileno()).st_nlink == 0:
+                        # Another session took it over while this one was waiting to open it
+                        continue
+                    for entry in journal_txt.readlines():
+                        if entry.strip():
+                            self.apply(entry.strip('\n').split(' / '))
+                            self._file.write(entry if entry.endswith('\n') else entry + '\n')
+                            self.entries += 1
+                    self._file.flush()
+                    os.remove(path)
+            self.session_start = self._file.tell()
+        return self.entries
+
+    def apply(self, entry):
+        '''Applies a single change to the data, ignoring changes that no longer make sense.'''
+        users, courses, classes, prev_enrolments = self.data
+        op, fields = entry[0], entry[1:]
+        try:
+            if op == 'enrol' and f'{fields[1]} / {fields[2]}' in classes:
+                # Another session may have since enrolled the student in a class at the same time
+                if classes.student_clash(fields[0], f'{fields[1]} / {fields[2]}') is None:
+                    classes.enrol(f'{fields[1]} / {fields[2]}', fields[0])
+            elif op == 'drop' and f'{fields[1]} / {fields[2]}' in classes:
+                classes.drop(f'{fields[1]} / {fields[2]}', fields[0])
+                promote_waitlisted(f'{fields[1]} / {fields[2]}', users, courses, classes, prev_enrolments)
+            elif op == 'waitlist' and f'{fields[1]} / {fields[2]}' in classes:
+                classes.join_waitlist(f'{fields[1]} / {fields[2]}', fields[0], int(fields[3]))
+            elif op == 'create_class':
+                # Journals from before seat limits and meeting times were added have neither recorded
+                capacity = None if len(fields) < 3 or fields[2] == 'None' else int(fields[2])
+                times = parse_times(fields[3]) if len(fields) > 3 else ()
+                classes[f'{fields[0]} / {fields[1]}'] = Class(fields[0], fields[1], (), capacity, times=times)
+            elif op == 'remove_class' and f'{fields[0]} / {fields[1]}' in classes:
+                del classes[f'{fields[0]} / {fields[1]}']
+            elif op == 'create_course':
+                courses[fields[0]] = Course(fields[0], int(fields[1]), fields[2].split())
+            elif op == 'remove_course' and fields[0] in courses:
+                del courses[fields[0]]
+            elif op == 'edit_name' and fields[0] in users:
+                users[fields[0]].name = fields[1]
+                users.touch(fields[0])
+            elif op == 'edit_limit' and fields[0] in users:
+                users[fields[0]].unit_limit = int(fields[1])
+                users.touch(fields[0])
+            elif op == 'password' and fields[0] in users:
+                users[fields[0]].password = fields[1]
+                users.touch(fields[0])
+        except (IndexError, ValueError):
+            pass
+
+    def open(self):
+        '''Opens the journal for recording changes made in this session, making a new journal file if it has no path.'''
+        with data_lock(exclusive=True):
+            if self.path is None:
+                fd, path = tempfile.mkstemp(prefix='journal.', suffix='.txt', dir='.')
+                os.close(fd)
+                self.path = os.path.basename(path)
+            self._file = open(self.path, 'a')
+            lock_journal(self._file)
+        self.session_start = self._file.tell()
+
+    def close(self):
+        '''Closes the journal, removing it if it has no changes left in it.'''
+        if self._file is not None:
+            if os.fstat(self._file.fileno()).st_size == 0:
+                os.remove(self.path)
+            self._file.close()
+            self._file = None
+
+    def record(self, *fields):
+        '''Appends a change to the journal.
+
+        Args:
+            fields: The name of the change followed by its details, for example 'drop', student ID, course name, classroom
+        '''
+        if self._file is None:
+            self.open()
+        self._file.write(' / '.join(str(field) for field in fields) + '\n')
+        self._file.flush()
+        self.entries += 1
+        if self.compact_every is not None and self.entries >= self.compact_every:
+            self.rejected.extend(self.compact())
+            self.compactions += 1
+
+    def compact(self):
+        '''Saves all the changed data to the storage and empties the journal.
+
+        Returns:
+            A list of the changes that could not be saved because another session changed the same records.
+        '''
+        rejected = self.storage.save(*self.data) or []
+        if self._file is not None:
+            # The journal is emptied without closing it, which would let another session take it over
+            self._file.truncate(0)
+        self.entries = 0
+        self.session_start = 0
+        return rejected
+
+    def discard_session(self):
+        '''Removes the changes recorded in this session from the journal, keeping any from earlier sessions.'''
+        if self._file is not None:
+            self._file.truncate(self.session_start)
+        self.close()
+
+def lock_journal(journal_file):
+    '''Locks a journal so that no other session takes it over.
+
+    Returns:
+        False if another session already has it locked, otherwise True.
+    '''
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(journal_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='The Lozol enrolment system.')
+    parser.add_argument('--metrics', metavar='PATH', default=os.environ.get('LOZOL_METRICS'),
+                        help='time every action, parser, and file operation and write the timings to PATH on exit '
+                             '(in the Prometheus text format if PATH ends in .prom, as JSON otherwise)')
+    parser.add_argument('--compact-every', type=int, metavar='N', default=compact_interval(0),
+                        help='save and empty the journal after every N changes, so they are saved even if you later '
+                             'choose not to save (default: LOZOL_COMPACT_EVERY, or only when you choose to save)')
+    args = parser.parse_args()
+    metrics = None
+    if args.metrics:
+        from metrics import instrument_comet
+        metrics = instrument_comet(sys.modules[__name__])
+
+    storage = open_storage()
+    users, courses, classes, prev_enrolments = storage.load()
+    journal = Journal(None, users, courses, classes, prev_enrolments, compact_every=args.compact_every or None,
+                      storage=storage)
+    journal.open()
+    if journal.replay():
+        print(f'Restored {journal.entries} unsaved changes from earlier sessions.')
+
+    try:
         exit_login = False
         login_user = None
 
@@ -836,7 +3240,7 @@ def main():
             print(design_line('=', 100))
 
             found = False
-            if username not in users or users[username].password != password:
+            if username not in users or not users[username].check_password(password):
                 print('Invalid login details.')
                 while True:
                     query = input('Exit program? (y or n): ').lower()
@@ -847,6 +3251,11 @@ def main():
                         break
             else:
                 login_user = users[username]
+                if needs_rehash(login_user.password):
+                    # Passwords stored in plain text or with an old setting are rehashed the next time the user logs in
+                    login_user.set_password(password)
+                    users.touch(username)
+                    journal.record('password', username, login_user.password)
                 print('Login found. Proceeding to user page.')
                 break
                 
@@ -866,19 +3275,15 @@ def main():
                             print(design_line('=', 100))
 
                         if num == 1:
-                            create_class(courses, classes)
+                            create_class(courses, classes, journal)
                         elif num == 2:
-                            remove_class(classes)
+                            remove_class(classes, journal)
                         elif num == 3:
-                            create_course(courses)
+                            create_course(courses, journal)
                         elif num == 4:
-                            remove_course(courses, classes)
+                            remove_course(courses, classes, journal)
                         elif num == 5:
-                            students = {}
-                            for username, user in users.items():
-                                if isinstance(user, Student):
-                                    students[username] = user
-                            edit_students(students)
+                            edit_students(users, journal)
                         elif num == 6:
                             exit_login = True
                         else:
@@ -902,11 +3307,11 @@ def main():
                             print(design_line('=', 100))
 
                         if num == 1:
-                            enrol_class(login_user, courses, classes, prev_enrolments)
+                            enrol_class(login_user, courses, classes, prev_enrolments, journal)
                         elif num == 2:
-                            drop_class(login_user, classes)
+                            drop_class(login_user, users, courses, classes, prev_enrolments, journal)
                         elif num == 3:
-                            edit_student_password(users, login_user.username)
+                            edit_student_password(users, login_user.username, journal)
                         elif num == 4:
                             exit_login = True
                         else:
@@ -925,39 +3330,34 @@ def main():
         print(design_line('!', 100))
     
     try:
+        if journal.compactions:
+            print('Changes up to the last automatic save are already saved; choosing not to save discards only later changes.')
         while True:
             save = input('Save changes? (y/n): ').lower()
             if 'y' in save:
-                with open('users.txt', 'w') as users_txt:
-                    for i, user in enumerate(users.values()):
-                        users_txt.write(user.info())
-                        if i != len(users.values()) - 1:
-                            users_txt.write('\n')
-
-                with open('courses.txt', 'w') as courses_txt:
-                    for i, user in enumerate(courses.values()):
-                        courses_txt.write(user.info())
-                        if i != len(courses.values()) - 1:
-                            courses_txt.write('\n')
-
-                with open('classes.txt', 'w') as classes_txt:
-                    for i, cl in enumerate(classes.values()):
-                        classes_txt.write(cl.info())
-                        if i != len(classes.values()) - 1:
-                            classes_txt.write('\n')
-
-                with open('prev_enrolments.txt', 'w') as prev_enrolments_txt:
-                    for i, st in enumerate(prev_enrolments.values()):
-                        prev_enrolments_txt.write(st.info())
-                        if i != len(prev_enrolments.values()) - 1:
-                            prev_enrolments_txt.write('\n')
+                rejected = journal.rejected + journal.compact()
                 break
             elif 'n' in save:
+                # Changes already compacted during the session were saved (or rejected) then
+                rejected = journal.rejected
+                journal.discard_session()
                 break
+        if rejected:
+            print('These changes were not saved, since another session saved different changes to the same records first:')
+            for change in rejected:
+                print(f'  {change}')
     except KeyboardInterrupt:
         print(design_line('!', 100))
-        print('Saving interrupted, no changed were saved.')
+        print('Saving interrupted, changes are kept in the journal and will be restored next time.')
         print(design_line('!', 100))
+    finally:
+        journal.close()
+        storage.close()
+        if metrics is not None:
+            metrics.export(args.metrics)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    # Runs main() from the imported module so that modules which import COMET (such as sqlite_storage)
+    # create the same Student and Admin classes that main() checks logins against
+    import COMET
+    COMET.main()
@@ -0,0 +1,240 @@
+import argparse
+import multiprocessing
+import random
+
+from COMET import Student, ClassList, Eligibility, load_data, save_data
+
+def parse_as_preferences(preferences):
+    '''Takes a string representing a student's ranked sections and splits it into its parts.
+
+    Args:
+        preferences: String in the form "student_id / course_name classroom / course_name classroom ...",
+            with the student's first choice first
+
+    Returns:
+        A tuple of the student ID and a list of the "course_name / classroom" keys in order of preference,
+        or None if the string is not a list of preferences.
+    '''
+    read = preferences.split(' / ')
+    if len(read) < 2:
+        return None
+    keys = []
+    for section in read[1:]:
+        parts = section.split()
+        if len(parts) != 2:
+            return None
+        keys.append(f'{parts[0]} / {parts[1]}')
+    return read[0], keys
+
+def draft_order(student_ids, seed=None):
+    '''Returns the student IDs in a random order, which is the order they pick in during the first round.'''
+    order = sorted(student_ids)
+    random.Random(seed).shuffle(order)
+    return order
+
+def allocate(order, preferences, users, courses, classes, prev_enrolments):
+    '''Assigns students to the sections they ranked, by random serial dictatorship in rounds.
+
+    In each round every student, in the draft order, is enrolled in their highest ranked section that they
+    can still take. The order is reversed every round so that the first student does not also pick first in
+    the second round. A section a student cannot take is skipped for good, since seats, units, and free
+    time only ever run out as the rounds go on, so every preference is checked at most once.
+
+    Uses Eligibility.check(), so unit limits, prerequisites, previous enrolments, time clashes, and seat
+    limits are all respected.
+
+    Args:
+        order: The student IDs in the order they pick in the first round
+        preferences: A dictionary mapping a student ID to their list of "course_name / classroom" keys, best first
+        users: The users that the student IDs belong to
+        courses: All the courses in the Lozol system
+        classes: The classes to enrol into, which must include every class that a student ranked or is enrolled in
+        prev_enrolments: The students with their previous enrolments
+
+    Returns:
+        A dictionary mapping a student ID to a list of (key, reason) tuples, one per preference, where the
+        reason is None if the student was enrolled.
+    '''
+    results = {}
+    eligibilities = {}
+    for student_id in order:
+        student = users.get(student_id)
+        if not isinstance(student, Student):
+            results[student_id] = [(key, 'student not found') for key in preferences[student_id]]
+            continue
+        prev_enrolled = []
+        if student_id in prev_enrolments:
+            prev_enrolled = prev_enrolments[student_id].prev_enrolled
+        eligibilities[student_id] = Eligibility(student, courses, classes, prev_enrolled)
+        results[student_id] = []
+
+    picking = [student_id for student_id in order if student_id in eligibilities]
+    while picking:
+        still_picking = []
+        for student_id in picking:
+            ranked = preferences[student_id]
+            checked = results[student_id]
+            while len(checked) < len(ranked):
+                key = ranked[len(checked)]
+                reason = eligibilities[student_id].check(key)
+                checked.append((key, reason))
+                if reason is None:
+                    classes.enrol(key, student_id)
+                    break
+            if len(checked) < len(ranked):
+                still_picking.append(student_id)
+        picking = still_picking[::-1]
+    return results
+
+def department(course_name, prefix):
+    return course_name[:prefix]
+
+def split_departments(order, preferences, prefix):
+    '''Splits the students into groups that can be allocated on their own, one group per set of linked departments.
+
+    Two departments are linked when a student ranked sections in both, since the student's units are shared
+    between them. Students in different groups never compete for the same sections.
+
+    Returns:
+        A list of lists of student IDs, each in draft order.
+    '''
+    parent = {}
+
+    def find(dept):
+        while parent.setdefault(dept, dept) != dept:
+            parent[dept] = parent[parent[dept]]
+            dept = parent[dept]
+        return dept
+
+    for student_id in order:
+        depts = {department(key.split(' / ')[0], prefix) for key in preferences[student_id]}
+        first = find(depts.pop()) if depts else None
+        for dept in depts:
+            parent[find(dept)] = first
+
+    groups = {}
+    for student_id in order:
+        keys = preferences[student_id]
+        root = find(department(keys[0].split(' / ')[0], prefix)) if keys else None
+        groups.setdefault(root, []).append(student_id)
+    return list(groups.values())
+
+def _allocate_group(args):
+    return allocate(*args)
+
+def allocate_parallel(order, preferences, users, courses, classes, prev_enrolments, processes=None, prefix=2):
+    '''Allocates each group of independent departments in its own process and enrols the results into classes.
+
+    Gives the same allocation as allocate(), since students in different groups never affect each other.
+
+    Args:
+        processes: The number of worker processes, or None for one per core
+        prefix: The number of leading characters of a course name that name its department
+
+    Returns:
+        The same as allocate().
+    '''
+    jobs = []
+    for group in split_departments(order, preferences, prefix):
+        keys = set()
+        for student_id in group:
+            keys.update(key for key in preferences[student_id] if key in classes)
+            keys.update(f'{cl.course_name} / {cl.classroom}' for cl in classes.student_classes(student_id))
+        group_classes = ClassList()
+        for key in keys:
+            group_classes[key] = classes[key]
+        jobs.append((group, {s_id: preferences[s_id] for s_id in group},
+                     {s_id: users[s_id] for s_id in group if s_id in users}, courses, group_classes,
+                     {s_id: prev_enrolments[s_id] for s_id in group if s_id in prev_enrolments}))
+
+    results = {}
+    with multiprocessing.Pool(processes) as pool:
+        for group_results in pool.imap_unordered(_allocate_group, jobs):
+            for student_id, checked in group_results.items():
+                for key, reason in checked:
+                    if reason is None:
+                        classes.enrol(key, student_id)
+                results[student_id] = checked
+    return results
+
+def read_preferences(lines):
+    '''Reads lines of preferences into a dictionary mapping a student ID to their ranked keys, and a list of malformed lines.'''
+    preferences = {}
+    malformed = []
+    for line in lines:
+        line = line.strip('\n')
+        if not line.strip():
+            continue
+        parsed = parse_as_preferences(line)
+        if parsed is None:
+            malformed.append(line)
+        else:
+            preferences[parsed[0]] = parsed[1]
+    return preferences, malformed
+
+def confirm_saved(results, classes):
+    '''Rejects the allocated sections that were left out when the classes were saved.
+
+    Saving merges in the changes of any session that saved first, which can take back an enrolment (for
+    example when the other session filled the section), so the merged classes are checked again.
+
+    Args:
+        results: The dictionary returned by allocate() or allocate_parallel()
+        classes: The classes, as they were saved
+
+    Returns:
+        The results, with the enrolments that were not saved given a reason.
+    '''
+    confirmed = {}
+    for student_id, checked in results.items():
+        confirmed[student_id] = []
+        for key, reason in checked:
+            if reason is None and (key not in classes or student_id not in classes[key].student_ids):
+                reason = 'not saved, another session changed the section first'
+            confirmed[student_id].append((key, reason))
+    return confirmed
+
+def main():
+    parser = argparse.ArgumentParser(description="Allocate the whole term's sections from every student's ranked preferences.")
+    parser.add_argument('preferences', help='file with one "student_id / course_name classroom / ..." line per student')
+    parser.add_argument('results', nargs='?', default='allocation_results.txt')
+    parser.add_argument('--seed', type=int, help='seed for the random draft order, so that a run can be repeated')
+    parser.add_argument('--processes', type=int, default=1, help='worker processes, one group of departments each (0 for one per core)')
+    parser.add_argument('--department-prefix', type=int, default=2, help='leading characters of a course name that name its department')
+    args = parser.parse_args()
+
+    users, courses, classes, prev_enrolments = load_data()
+    with open(args.preferences) as preferences_txt:
+        preferences, malformed = read_preferences(preferences_txt)
+    order = draft_order(preferences, args.seed)
+
+    if args.processes == 1:
+        results = allocate(order, preferences, users, courses, classes, prev_enrolments)
+    else:
+        results = allocate_parallel(order, preferences, users, courses, classes, prev_enrolments,
+                                    args.processes or None, args.department_prefix)
+
+    rejected = save_data(users, courses, classes, prev_enrolments)
+    results = confirm_saved(results, classes)
+    if rejected:
+        print('These changes were not saved, since another session saved different changes to the same records first:')
+        for change in rejected:
+            print(f'  {change}')
+
+    allocated = 0
+    lines = [f'{line} / rejected: malformed preferences' for line in malformed]
+    for student_id in order:
+        for rank, (key, reason) in enumerate(results[student_id], 1):
+            course_name, classroom = key.split(' / ')
+            if reason is None:
+                allocated += 1
+                lines.append(f'{student_id} / {course_name} / {classroom} / allocated (choice {rank})')
+            else:
+                lines.append(f'{student_id} / {course_name} / {classroom} / rejected: {reason}')
+    with open(args.results, 'w') as results_txt:
+        results_txt.write('\n'.join(lines))
+
+    print(f'{allocated} sections allocated to {len(preferences)} students, results written to {args.results}.')
+
+if __name__ == '__main__':
+    main()
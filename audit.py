@@ -0,0 +1,124 @@
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+import time
+
+from COMET import Student, load_data
+
+# The courses every worker process checks students against, set once per process by _init_worker()
+_catalogue = None
+
+def make_catalogue(courses):
+    '''Returns a list of (course name, units, prerequisites) for every course, sorted by name.'''
+    return [(course.course_name, course.units, course.prereqs) for _, course in sorted(courses.items())]
+
+def make_profiles(users, classes, courses, prev_enrolments):
+    '''Returns what the audit needs to know about each student, which is much smaller to send to a worker than the data.
+
+    Returns:
+        A list of (student ID, units remaining, courses previously taken, courses currently enrolled in) tuples.
+    '''
+    profiles = []
+    for user in users.values():
+        if not isinstance(user, Student):
+            continue
+        taken = ()
+        if user.username in prev_enrolments:
+            taken = prev_enrolments[user.username].prev_enrolled
+        enrolled = set()
+        units_remaining = user.unit_limit
+        for cl in classes.student_classes(user.username):
+            enrolled.add(cl.course_name)
+            if cl.course_name in courses:
+                units_remaining -= courses[cl.course_name].units
+        profiles.append((user.username, units_remaining, frozenset(taken), frozenset(enrolled)))
+    return profiles
+
+def audit_student(profile, catalogue):
+    '''Checks whether a student can take each course, using the same rules and reasons as Eligibility.check().
+
+    Yields:
+        A (student ID, course name, "yes" or "no", reason) row for every course.
+    '''
+    student_id, units_remaining, taken, enrolled = profile
+    for course_name, units, prereqs in catalogue:
+        if course_name in taken:
+            yield student_id, course_name, 'no', 'course previously taken'
+            continue
+        missing = [pr for pr in prereqs if pr not in taken]
+        if missing:
+            yield student_id, course_name, 'no', f'missing prerequisites: {" ".join(missing)}'
+        elif course_name in enrolled:
+            yield student_id, course_name, 'no', 'already enrolled in course'
+        elif units > units_remaining:
+            yield student_id, course_name, 'no', 'not enough units remaining'
+        else:
+            yield student_id, course_name, 'yes', ''
+
+def _init_worker(catalogue):
+    global _catalogue
+    _catalogue = catalogue
+
+def _audit_shard(profiles):
+    '''Audits a shard of students and returns the CSV rows as text, ready to be written out in order.'''
+    out = io.StringIO()
+    writer = csv.writer(out)
+    rows = 0
+    for profile in profiles:
+        for row in audit_student(profile, _catalogue):
+            writer.writerow(row)
+            rows += 1
+    return out.getvalue(), rows
+
+def audit(profiles, catalogue, report, processes=1, shard_size=500):
+    '''Audits every student against every course and streams the rows to the report.
+
+    The students are split into shards that are audited across a pool of processes. Shards are written
+    as soon as they are done, in the same order as the students, so the report never has to fit in memory.
+
+    Args:
+        profiles: The students from make_profiles()
+        catalogue: The courses from make_catalogue()
+        report: A text file to write the CSV report to
+        processes: The number of worker processes
+        shard_size: The number of students audited by a worker at a time
+
+    Returns:
+        The number of rows written, not counting the header.
+    '''
+    report.write('student_id,course_name,eligible,reason\r\n')
+    shards = [profiles[i:i + shard_size] for i in range(0, len(profiles), shard_size)]
+    rows = 0
+    if processes == 1:
+        _init_worker(catalogue)
+        for text, shard_rows in map(_audit_shard, shards):
+            report.write(text)
+            rows += shard_rows
+        return rows
+
+    with multiprocessing.Pool(processes, _init_worker, (catalogue,)) as pool:
+        for text, shard_rows in pool.imap(_audit_shard, shards):
+            report.write(text)
+            rows += shard_rows
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description='Report which students can take which courses, and why not.')
+    parser.add_argument('report', nargs='?', default='eligibility_audit.csv')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='worker processes to audit with')
+    parser.add_argument('--shard-size', type=int, default=500, help='students audited by a worker at a time')
+    args = parser.parse_args()
+
+    users, courses, classes, prev_enrolments = load_data()
+    start = time.perf_counter()
+    profiles = make_profiles(users, classes, courses, prev_enrolments)
+    with open(args.report, 'w', newline='') as report:
+        rows = audit(profiles, make_catalogue(courses), report, args.processes, args.shard_size)
+    elapsed = time.perf_counter() - start
+    print(f'Audited {len(profiles)} students against {len(courses)} courses ({rows} rows) in {elapsed:.2f}s '
+          f'with {args.processes} processes, report written to {args.report}.')
+
+if __name__ == '__main__':
+    main()
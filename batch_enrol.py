@@ -0,0 +1,124 @@
+import sys
+
+from COMET import Student, Eligibility, load_data, save_data
+
+def parse_as_request(request):
+    '''Takes a string representing an enrolment request and splits it into its parts.
+
+    Args:
+        request: String in the form "student_id / course_name / classroom"
+
+    Returns:
+        A tuple of the student ID, course name, and classroom, or None if the string is not a request.
+    '''
+    read = request.split(' / ')
+    if len(read) != 3:
+        return None
+    else:
+        return read[0], read[1], read[2]
+
+def enrol_batch(requests, users, courses, classes, prev_enrolments):
+    '''Applies many enrolment requests without asking for any input.
+
+    Uses the same rules as enrolling through the student dashboard (unit limit, no enrolling in the same
+    course twice, no previously taken courses, prerequisites). Requests are applied in order, so an
+    earlier request can use up the units that a later one needed.
+
+    Args:
+        requests: An iterable of lines in the form "student_id / course_name / classroom"
+        users: All the users in the Lozol system
+        courses: All the courses in the Lozol system
+        classes: All the classes in the Lozol system
+        prev_enrolments: All the students with their previous enrolments
+
+    Returns:
+        A list with one (request, reason) tuple per request, where reason is None if the request was accepted.
+    '''
+    eligibilities = {}
+    results = []
+    for request in requests:
+        request = request.strip('\n')
+        if not request.strip():
+            continue
+
+        parsed = parse_as_request(request)
+        if parsed is None:
+            results.append((request, 'malformed request'))
+            continue
+
+        student_id, course_name, classroom = parsed
+        eligibility = eligibilities.get(student_id)
+        if eligibility is None:
+            student = users.get(student_id)
+            if not isinstance(student, Student):
+                results.append((request, 'student not found'))
+                continue
+            prev_enrolled = []
+            if student_id in prev_enrolments:
+                prev_enrolled = prev_enrolments[student_id].prev_enrolled
+            eligibility = Eligibility(student, courses, classes, prev_enrolled)
+            eligibilities[student_id] = eligibility
+
+        key = f'{course_name} / {classroom}'
+        reason = eligibility.check(key)
+        if reason is None:
+            classes.enrol(key, student_id)
+        results.append((request, reason))
+    return results
+
+def confirm_saved(results, classes):
+    '''Rejects the accepted requests whose enrolments were left out when the classes were saved.
+
+    Saving merges in the changes of any session that saved first, which can take back an enrolment (for
+    example when the other session filled the class), so the merged classes are checked again.
+
+    Args:
+        results: The (request, reason) tuples returned by enrol_batch()
+        classes: The classes, as they were saved
+
+    Returns:
+        The results, with the enrolments that were not saved given a reason.
+    '''
+    confirmed = []
+    for request, reason in results:
+        if reason is None:
+            student_id, course_name, classroom = parse_as_request(request)
+            key = f'{course_name} / {classroom}'
+            if key not in classes or student_id not in classes[key].student_ids:
+                reason = 'not saved, another session changed the class first'
+        confirmed.append((request, reason))
+    return confirmed
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        print(f'Usage: python {sys.argv[0]} <requests file> [results file]')
+        sys.exit(1)
+
+    users, courses, classes, prev_enrolments = load_data()
+
+    with open(sys.argv[1]) as requests_txt:
+        results = enrol_batch(requests_txt, users, courses, classes, prev_enrolments)
+
+    rejected = save_data(users, courses, classes, prev_enrolments)
+    results = confirm_saved(results, classes)
+    if rejected:
+        print('These changes were not saved, since another session saved different changes to the same records first:')
+        for change in rejected:
+            print(f'  {change}')
+
+    results_path = sys.argv[2] if len(sys.argv) == 3 else 'enrolment_results.txt'
+    accepted = 0
+    with open(results_path, 'w') as results_txt:
+        lines = []
+        for request, reason in results:
+            if reason is None:
+                accepted += 1
+                lines.append(f'{request} / accepted')
+            else:
+                lines.append(f'{request} / rejected: {reason}')
+        results_txt.write('\n'.join(lines))
+
+    print(f'{accepted} of {len(results)} requests accepted, results written to {results_path}.')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import COMET
+from allocate import allocate, allocate_parallel, draft_order
+from generate_data import write_data
+
+def make_preferences(users, classes, choices, prefix, seed):
+    '''Has every student rank random sections from a single department, so that departments can be allocated apart.'''
+    rng = random.Random(seed)
+    departments = {}
+    for key, cl in classes.items():
+        departments.setdefault(cl.course_name[:prefix], []).append(key)
+    names = sorted(departments)
+    preferences = {}
+    for user in users.values():
+        if isinstance(user, COMET.Student):
+            keys = departments[rng.choice(names)]
+            preferences[user.username] = rng.sample(keys, min(choices, len(keys)))
+    return preferences
+
+def main():
+    parser = argparse.ArgumentParser(description='Time allocating a whole term from ranked preferences.')
+    parser.add_argument('--students', type=int, default=50000)
+    parser.add_argument('--courses', type=int, default=2000)
+    parser.add_argument('--sections', type=int, default=5000)
+    parser.add_argument('--choices', type=int, default=8, help='sections ranked by each student')
+    parser.add_argument('--capacity', type=int, default=60, help='seat limit of every section')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    # Course names are COURSE0, COURSE1, ..., so the first 7 characters split them into 10 departments
+    prefix = 7
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        write_data(args.students, args.courses, args.sections, seed=0)
+        users, courses, classes, prev_enrolments = COMET.parse_data()
+        for cl in classes.values():
+            cl.capacity = max(args.capacity, len(cl.student_ids))
+        COMET.write_snapshot(users, courses, classes, prev_enrolments)
+        preferences = make_preferences(users, classes, args.choices, prefix, seed=0)
+        order = draft_order(preferences, seed=0)
+
+        timings = []
+        allocations = []
+        for processes in (1, args.processes):
+            # Every run starts from a fresh copy of the data
+            users, courses, classes, prev_enrolments = COMET.load_snapshot()
+            start = time.perf_counter()
+            if processes == 1:
+                results = allocate(order, preferences, users, courses, classes, prev_enrolments)
+            else:
+                results = allocate_parallel(order, preferences, users, courses, classes, prev_enrolments, processes, prefix)
+            timings.append(time.perf_counter() - start)
+            allocations.append({(s_id, key) for s_id, checked in results.items() for key, reason in checked if reason is None})
+
+        print(f'{args.students} students ranking {args.choices} of {args.sections} sections')
+        print(f'Allocated:             {len(allocations[0])} sections')
+        print(f'1 process:             {timings[0]:.2f}s')
+        print(f'{args.processes} processes:           {timings[1]:.2f}s')
+        print(f'Same allocation:       {allocations[0] == allocations[1]}')
+
+if __name__ == '__main__':
+    main()
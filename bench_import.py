@@ -0,0 +1,83 @@
+import argparse
+import csv
+import io
+import os
+import random
+import tempfile
+import time
+
+import COMET
+from bulk import COLUMNS, import_rows
+
+def make_rows(rows, seed=0):
+    '''Makes the CSV text of rows users, rows courses, and rows classes, with about 1 in 100 rows of each invalid.'''
+    rng = random.Random(seed)
+    files = {}
+
+    users = [COLUMNS['users']]
+    for i in range(rows):
+        unit_limit = rng.randint(10, 30) if rng.random() > 0.01 else 99
+        users.append(('Student', str(10000000 + i), 'password', f'Student {i}', unit_limit))
+    files['users'] = users
+
+    courses = [COLUMNS['courses']]
+    has_prereqs = []
+    for i in range(rows):
+        prereqs = ' '.join(f'COURSE{j}' for j in rng.sample(range(i), min(i, rng.randint(0, 2))))
+        has_prereqs.append(bool(prereqs))
+        units = rng.choice((5, 10, 15)) if rng.random() > 0.01 else 60
+        courses.append((f'COURSE{i}', units, prereqs))
+    files['courses'] = courses
+
+    classes = [COLUMNS['classes']]
+    for i in range(rows):
+        # Every room holds one class in each of 5 slots, so about 1 in 100 clashes with a room's earlier class
+        slot = i % 5 if rng.random() > 0.01 else (i - 1) % 5
+        day = COMET.DAYS[slot]
+        # No student has taken any courses, so only the classes of courses without prerequisites have students
+        student_count = 0 if has_prereqs[i] else rng.randint(0, 5)
+        student_ids = ' '.join(str(10000000 + rng.randrange(rows)) for _ in range(student_count))
+        classes.append((f'COURSE{i}', f'R{i // 5}', 60, f'{day}0900-1030', student_ids))
+    files['classes'] = classes
+
+    texts = {}
+    for kind, kind_rows in files.items():
+        out = io.StringIO()
+        csv.writer(out).writerows(kind_rows)
+        texts[kind] = out.getvalue()
+    return texts
+
+def main():
+    parser = argparse.ArgumentParser(description='Time importing users, courses, and classes from CSV files.')
+    parser.add_argument('--rows', type=int, default=100000, help='rows in each CSV file')
+    args = parser.parse_args()
+
+    texts = make_rows(args.rows)
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        for file_name in COMET.DATA_FILES:
+            open(file_name, 'w').close()
+        users, courses, classes, prev_enrolments = COMET.parse_data()
+
+        print(f'{args.rows} rows per file')
+        total = 0.0
+        # Users and courses come first, since the classes refer to both
+        for kind in ('users', 'courses', 'classes'):
+            rejected = csv.writer(io.StringIO())
+            options = {'prev_enrolments': prev_enrolments} if kind == 'classes' else {}
+            start = time.perf_counter()
+            added, rejects = import_rows(kind, csv.DictReader(io.StringIO(texts[kind])), users, courses, classes, rejected,
+                                         **options)
+            elapsed = time.perf_counter() - start
+            total += elapsed
+            print(f'Import {kind + ":":<9} {elapsed:.2f}s ({added / elapsed:,.0f} rows/s, {added} added, {rejects} rejected)')
+
+        start = time.perf_counter()
+        COMET.save_data(users, courses, classes, prev_enrolments)
+        elapsed = time.perf_counter() - start
+        total += elapsed
+        print(f'Save:             {elapsed:.2f}s')
+        print(f'Total:            {total:.2f}s ({3 * args.rows / total:,.0f} rows/s)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+import argparse
+import time
+
+import COMET
+
+SETTINGS = ['scrypt:12', 'scrypt:13', 'scrypt:14', 'scrypt:15',
+            'pbkdf2_sha256:100000', 'pbkdf2_sha256:300000', 'pbkdf2_sha256:600000']
+
+def logins_per_second(kdf, seconds):
+    '''Returns how many logins a single core can check per second with the given setting.'''
+    user = COMET.Admin('admin', COMET.hash_password('correct horse battery staple', kdf))
+    logins = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        user.check_password('correct horse battery staple')
+        logins += 1
+    return logins / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure how many logins per second per core each password hashing setting allows.')
+    parser.add_argument('--seconds', type=float, default=2.0, help='how long to measure each setting for')
+    parser.add_argument('settings', nargs='*', default=SETTINGS, help="settings such as 'scrypt:14' or 'pbkdf2_sha256:300000'")
+    args = parser.parse_args()
+
+    print(f"{'Setting':<25}{'Logins/s/core':>15}{'ms/login':>12}")
+    for kdf in args.settings:
+        rate = logins_per_second(kdf, args.seconds)
+        print(f'{kdf:<25}{rate:>15.1f}{1000 / rate:>12.2f}')
+
+if __name__ == '__main__':
+    main()
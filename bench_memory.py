@@ -0,0 +1,43 @@
+import argparse
+import gc
+import os
+import tempfile
+import tracemalloc
+
+import COMET
+from generate_data import write_data
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure how much memory the parsed Lozol data takes up.')
+    parser.add_argument('--students', type=int, default=100000)
+    parser.add_argument('--courses', type=int, default=2000)
+    parser.add_argument('--classes', type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        write_data(args.students, args.courses, args.classes)
+
+        gc.collect()
+        tracemalloc.start()
+        data = COMET.parse_data()
+        gc.collect()
+        started, _ = tracemalloc.get_traced_memory()
+        # Previous enrolments are only read when looked up, so every one is read to measure them too
+        prev_enrolments = data[3]
+        prev_enrolments.max_size = len(prev_enrolments.offsets)
+        for student_id in prev_enrolments.offsets:
+            prev_enrolments[student_id]
+        gc.collect()
+        used, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        prev_enrolments.close()
+
+        print(f'{args.students} students, {args.courses} courses, {args.classes} classes')
+        print(f'On start (previous enrolments only indexed): {started / 1e6:.1f} MB')
+        print(f'Total (every previous enrolment read): {used / 1e6:.1f} MB')
+        print(f'Per 100k students: {used / 1e6 * 100000 / args.students:.1f} MB')
+        del data
+
+if __name__ == '__main__':
+    main()
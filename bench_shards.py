@@ -0,0 +1,72 @@
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+import COMET
+import shards
+from generate_data import write_data
+
+def session(student_id, listing=False):
+    '''Parses the data and looks up one student's classes, the way a student's session starts.
+
+    With listing, also lists the classes the student can enrol in, as the enrolment menu does.
+    '''
+    users, courses, classes, prev_enrolments = COMET.parse_data()
+    classes.student_classes(student_id)
+    if listing:
+        prev_enrolled = prev_enrolments[student_id].prev_enrolled if student_id in prev_enrolments else ()
+        COMET.Eligibility(users[student_id], courses, classes, prev_enrolled).available_classes()
+    return users, courses, classes, prev_enrolments
+
+def measure(student_id, repeat, listing=False):
+    '''Returns the best time of repeat sessions, the memory a session's data takes up, and the shards it read.'''
+    best = float('inf')
+    for _ in range(repeat):
+        with COMET.paused_gc():
+            start = time.perf_counter()
+            session(student_id, listing)
+            best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    data = session(student_id, listing)
+    gc.collect()
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    loaded = len(getattr(data[2], 'loaded', ()))
+    del data
+    return best, used, loaded
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare starting a student session with classes.txt against sharded classes.')
+    parser.add_argument('--students', type=int, default=100000)
+    parser.add_argument('--courses', type=int, default=2000)
+    parser.add_argument('--classes', type=int, default=10000)
+    parser.add_argument('--prefix', type=int, default=0, help='leading characters of a course name that name its shard')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        write_data(args.students, args.courses, args.classes)
+        users = COMET.parse_data()[0]
+        student_id = next(user.username for user in users.values() if isinstance(user, COMET.Student))
+        del users
+
+        flat = {listing: measure(student_id, args.repeat, listing) for listing in (False, True)}
+        count, shard_count = shards.split(args.prefix)
+        sharded = {listing: measure(student_id, args.repeat, listing) for listing in (False, True)}
+
+        print(f'{args.students} students, {args.courses} courses, {count} classes in {shard_count} shards')
+        for listing, name in ((False, 'Start'), (True, 'Start and list')):
+            flat_time, flat_memory, _ = flat[listing]
+            sharded_time, sharded_memory, loaded = sharded[listing]
+            print(f'{name + ":":<16} classes.txt {flat_time:.3f}s, {flat_memory / 1e6:.1f} MB; '
+                  f'sharded {sharded_time:.3f}s, {sharded_memory / 1e6:.1f} MB ({loaded} shards read); '
+                  f'{flat_time / sharded_time:.1f}x')
+
+if __name__ == '__main__':
+    main()
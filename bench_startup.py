@@ -0,0 +1,37 @@
+import argparse
+import os
+import tempfile
+import time
+
+import COMET
+from generate_data import write_data
+
+def timed(function):
+    with COMET.paused_gc():
+        start = time.perf_counter()
+        function()
+        return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare starting Lozol by parsing the text files against loading the snapshot.')
+    parser.add_argument('--students', type=int, default=100000)
+    parser.add_argument('--courses', type=int, default=2000)
+    parser.add_argument('--classes', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        write_data(args.students, args.courses, args.classes)
+
+        cold = min(timed(COMET.parse_data) for _ in range(args.repeat))
+        COMET.write_snapshot(*COMET.parse_data())
+        snapshot = min(timed(COMET.load_data) for _ in range(args.repeat))
+
+        print(f'{args.students} students, {args.courses} courses, {args.classes} classes')
+        print(f'Parsing text files: {cold:.3f}s')
+        print(f'Loading snapshot:   {snapshot:.3f}s ({os.path.getsize(COMET.SNAPSHOT_PATH) / 1e6:.1f} MB)')
+        print(f'Speedup:            {cold / snapshot:.1f}x')
+
+if __name__ == '__main__':
+    main()
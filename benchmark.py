@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import COMET
+from generate_data import write_data
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def measure(function, repeat):
+    '''Runs a function a number of times with the garbage collector paused, like bench_startup.py does.
+
+    Returns:
+        A dictionary with the median, fastest, and slowest time in seconds.
+    '''
+    times = []
+    for _ in range(repeat):
+        with COMET.paused_gc():
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+    return {'median': statistics.median(times), 'min': min(times), 'max': max(times)}
+
+def run(args):
+    '''Times the enrolment hot paths on a made up dataset and returns the results.'''
+    write_data(args.students, args.courses, args.sections, args.seed)
+    results = {}
+
+    results['parse_data'] = measure(COMET.parse_data, args.repeat)
+    COMET.write_snapshot(*COMET.parse_data())
+    results['load_snapshot'] = measure(COMET.load_data, args.repeat)
+
+    users, courses, classes, prev_enrolments = COMET.load_data()
+    rng = random.Random(args.seed)
+    students = rng.sample([user for user in users.values() if isinstance(user, COMET.Student)],
+                          min(args.sample, args.students))
+
+    def available_classes():
+        for student in students:
+            prev_enrolled = []
+            if student.username in prev_enrolments:
+                prev_enrolled = prev_enrolments[student.username].prev_enrolled
+            COMET.Eligibility(student, courses, classes, prev_enrolled).available_classes()
+    results['available_classes'] = measure(available_classes, args.repeat)
+
+    def student_classes():
+        for student in students:
+            classes.student_classes(student.username)
+    results['student_classes'] = measure(student_classes, args.repeat)
+
+    # The first search builds the index, every search after that uses it
+    results['build_search_index'] = measure(lambda: (setattr(users, '_search', None), users.find('')), args.repeat)
+
+    def find_students():
+        for student in students:
+            users.find(student.username[:-1])
+    results['find_prefix'] = measure(find_students, args.repeat)
+
+    def find_with_typos():
+        for student in students:
+            users.find(student.username[:-2] + 'x' + student.username[-1])
+    results['find_fuzzy'] = measure(find_with_typos, args.repeat)
+
+    results['deletable_courses'] = measure(lambda: courses.deletable.page(0, COMET.PAGE_SIZE), args.repeat)
+
+    def save_one_change():
+        classes.touch(next(iter(classes)))
+        COMET.save_data(users, courses, classes, prev_enrolments)
+    results['save_one_change'] = measure(save_one_change, args.repeat)
+
+    def save_everything():
+        for collection in (users, courses, classes, prev_enrolments):
+            collection.changed.update(collection)
+        COMET.save_data(users, courses, classes, prev_enrolments)
+    results['save_everything'] = measure(save_everything, args.repeat)
+
+    # The per-student paths are reported per student so that changing --sample does not change the numbers
+    for name in ('available_classes', 'student_classes', 'find_prefix', 'find_fuzzy'):
+        results[name] = {stat: seconds / len(students) for stat, seconds in results[name].items()}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the Lozol enrolment hot paths and print the results as JSON.')
+    parser.add_argument('--students', type=int, default=100000)
+    parser.add_argument('--courses', type=int, default=2000)
+    parser.add_argument('--sections', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--sample', type=int, default=1000, help='number of students to time the per-student paths with')
+    parser.add_argument('--output', help='write the JSON to this file instead of printing it')
+    args = parser.parse_args()
+
+    version = git_version()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        try:
+            results = run(args)
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        'version': version,
+        'python': sys.version.split()[0],
+        'parameters': {name: getattr(args, name) for name in ('students', 'courses', 'sections', 'seed', 'repeat', 'sample')},
+        'results': results,
+    }
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+import argparse
+import csv
+import sys
+
+from COMET import (Admin, Student, Course, Class, Eligibility, hash_password, is_hashed, parse_times, format_times, open_storage,
+                   class_problem, times_problem, capacity_problem, course_name_problem, units_problem, prereqs_problem,
+                   student_name_problem, unit_limit_problem)
+
+COLUMNS = {
+    'courses': ('course_name', 'units', 'prereqs'),
+    'classes': ('course_name', 'classroom', 'capacity', 'times', 'student_ids'),
+    'users': ('kind', 'username', 'password', 'name', 'unit_limit'),
+}
+# The columns an import file must have, the others can be left out
+REQUIRED = {
+    'courses': ('course_name', 'units'),
+    'classes': ('course_name', 'classroom'),
+    'users': ('kind', 'username', 'password'),
+}
+
+def field_problem(row):
+    # ' / ' separates the fields of the text files and each record is a single line, so no field can contain
+    # either. Quoted CSV fields can have line breaks in them, and tabs are rejected along with them.
+    for value in row.values():
+        if not isinstance(value, str):
+            # Columns past the header (which csv puts in a list) are not imported
+            continue
+        if ' / ' in value:
+            return 'Fields cannot contain " / "'
+        if any(character in value for character in '\n\r\t'):
+            return 'Fields cannot contain line breaks or tabs'
+    return None
+
+def import_course(row, users, courses, classes):
+    '''Checks a row the same way create_course() does and adds the course if nothing is wrong with it.
+
+    Returns:
+        None if the course was added, otherwise what was wrong with the row.
+    '''
+    course_name = row['course_name']
+    try:
+        units = int(row['units'])
+    except (TypeError, ValueError):
+        # A short row has None for the columns it is missing
+        return 'Units must be a single integer'
+    prereqs = (row.get('prereqs') or '').split()
+    problem = course_name_problem(courses, course_name) or units_problem(units) or prereqs_problem(courses, prereqs)
+    if problem is None:
+        courses[course_name] = Course(course_name, units, prereqs)
+    return problem
+
+def import_class(row, users, courses, classes, prev_enrolments=None):
+    '''Checks a row the same way create_class() does and adds the class if nothing is wrong with it.
+
+    Each student in the student_ids column is enrolled the same way enrol_class() would enrol them, so a
+    student without the prerequisites or units for the class, or with a class at the same time, rejects the row.
+
+    Args:
+        prev_enrolments: All the students with their previous enrolments, or None to treat every student
+            as having taken no courses
+
+    Returns:
+        None if the class was added, otherwise what was wrong with the row.
+    '''
+    course_name, classroom = row['course_name'], row['classroom']
+    problem = class_problem(courses, classes, course_name, classroom)
+    if problem is not None:
+        return problem
+
+    capacity = row.get('capacity') or None
+    if capacity is not None:
+        try:
+            capacity = int(capacity)
+        except ValueError:
+            capacity = 0
+    try:
+        times = parse_times(row.get('times') or '')
+    except ValueError as e:
+        return str(e)
+    problem = capacity_problem(capacity) or times_problem(classes, classroom, times)
+    if problem is not None:
+        return problem
+
+    student_ids = list(dict.fromkeys((row.get('student_ids') or '').split()))
+    for s_id in student_ids:
+        if not isinstance(users.get(s_id), Student):
+            return f'Student {s_id} not found'
+    if capacity is not None and len(student_ids) > capacity:
+        return 'More students than the seat limit'
+
+    key = f'{course_name} / {classroom}'
+    classes[key] = Class(course_name, classroom, (), capacity, times=times)
+    for s_id in student_ids:
+        prev_enrolled = ()
+        if prev_enrolments is not None and s_id in prev_enrolments:
+            prev_enrolled = prev_enrolments[s_id].prev_enrolled
+        reason = Eligibility(users[s_id], courses, classes, prev_enrolled).check(key)
+        if reason is not None:
+            del classes[key]
+            return f'Student {s_id} cannot enrol: {reason}'
+        classes.enrol(key, s_id)
+    return None
+
+def import_user(row, users, courses, classes, hash_passwords=False):
+    '''Checks a row and adds the user if nothing is wrong with it, using the same limits as edit_students().
+
+    Returns:
+        None if the user was added, otherwise what was wrong with the row.
+    '''
+    kind, username, password = row['kind'], row['username'], row['password']
+    if kind not in ('Student', 'Admin'):
+        return 'Kind must be Student or Admin'
+    if not username or ' ' in username:
+        return 'Username cannot be blank or have spaces'
+    if username in users:
+        return 'User with same username already found'
+    if not password:
+        return 'Password cannot be blank'
+    if hash_passwords and not is_hashed(password):
+        password = hash_password(password)
+
+    if kind == 'Admin':
+        users[username] = Admin(username, password)
+        return None
+    name = row.get('name') or ''
+    try:
+        unit_limit = int(row.get('unit_limit') or '')
+    except ValueError:
+        return 'Unit limit must be a single integer'
+    problem = student_name_problem(name) or unit_limit_problem(unit_limit)
+    if problem is None:
+        users[username] = Student(username, password, name, unit_limit)
+    return problem
+
+IMPORTERS = {'courses': import_course, 'classes': import_class, 'users': import_user}
+
+def import_rows(kind, reader, users, courses, classes, rejected, **options):
+    '''Streams the rows of a CSV file into the data, adding every valid row in a single pass.
+
+    Rows are checked in order against everything added so far, so a course can require a course from an
+    earlier row of the same file.
+
+    Args:
+        kind: 'courses', 'classes', or 'users'
+        reader: A csv.DictReader over the file
+        users: All the users in the Lozol system
+        courses: All the courses in the Lozol system
+        classes: All the classes in the Lozol system
+        rejected: A csv.writer that every rejected row is written to, with its line number and reason
+        options: Options passed on to the importer, such as hash_passwords for users or prev_enrolments for classes
+
+    Returns:
+        A tuple of the number of rows added and rejected.
+    '''
+    importer = IMPORTERS[kind]
+    added = 0
+    rejects = 0
+    for row in reader:
+        problem = field_problem(row) or importer(row, users, courses, classes, **options)
+        if problem is None:
+            added += 1
+        else:
+            rejected.writerow([reader.line_num, problem] + [row.get(column) or '' for column in COLUMNS[kind]])
+            rejects += 1
+    return added, rejects
+
+def export_rows(kind, writer, users, courses, classes):
+    '''Writes every course, class, or user to a CSV file in the columns that import_rows() reads.'''
+    writer.writerow(COLUMNS[kind])
+    if kind == 'courses':
+        # Prerequisites are written before the courses requiring them, so the file can be imported again
+        for course in map(courses.get, courses.topological_order()):
+            writer.writerow([course.course_name, course.units, ' '.join(course.prereqs)])
+    elif kind == 'classes':
+        classes.load_all()
+        for cl in classes.values():
+            writer.writerow([cl.course_name, cl.classroom, '' if cl.capacity is None else cl.capacity,
+                             format_times(cl.times), ' '.join(cl.student_ids)])
+    else:
+        for user in users.values():
+            if isinstance(user, Student):
+                writer.writerow(['Student', user.username, user.password, user.name, user.unit_limit])
+            else:
+                writer.writerow(['Admin', user.username, user.password, '', ''])
+
+def main():
+    parser = argparse.ArgumentParser(description='Import or export Lozol courses, classes, and users as CSV files.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help='add the valid rows of a CSV file and report the rejected ones')
+    import_parser.add_argument('kind', choices=COLUMNS)
+    import_parser.add_argument('file')
+    import_parser.add_argument('--rejected', help='where to write the rejected rows (default: FILE.rejected.csv)')
+    import_parser.add_argument('--hash-passwords', action='store_true',
+                               help='hash plain text passwords now instead of the first time each user logs in')
+    export_parser = commands.add_parser('export', help='write everything of a kind to a CSV file')
+    export_parser.add_argument('kind', choices=COLUMNS)
+    export_parser.add_argument('file')
+    args = parser.parse_args()
+
+    storage = open_storage()
+    users, courses, classes, prev_enrolments = storage.load()
+    try:
+        if args.command == 'export':
+            with open(args.file, 'w', newline='') as csv_file:
+                export_rows(args.kind, csv.writer(csv_file), users, courses, classes)
+            print(f'{args.kind.capitalize()} written to {args.file}.')
+            return
+
+        rejected_path = args.rejected or f'{args.file}.rejected.csv'
+        with open(args.file, newline='') as csv_file, open(rejected_path, 'w', newline='') as rejected_file:
+            reader = csv.DictReader(csv_file)
+            missing = [column for column in REQUIRED[args.kind] if column not in (reader.fieldnames or ())]
+            if missing:
+                print(f'{args.file} is missing the column(s) {", ".join(missing)}.')
+                sys.exit(1)
+            rejected = csv.writer(rejected_file)
+            rejected.writerow(('line', 'reason') + COLUMNS[args.kind])
+            options = {}
+            if args.kind == 'users':
+                options['hash_passwords'] = args.hash_passwords
+            elif args.kind == 'classes':
+                options['prev_enrolments'] = prev_enrolments
+            added, rejects = import_rows(args.kind, reader, users, courses, classes, rejected, **options)
+
+        conflicts = storage.save(users, courses, classes, prev_enrolments) or []
+        print(f'{added} {args.kind} added, {rejects} rejected (see {rejected_path}).')
+        for change in conflicts:
+            print(f'Not saved, since another session changed it first: {change}')
+    finally:
+        storage.close()
+
+if __name__ == '__main__':
+    main()
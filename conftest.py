@@ -0,0 +1,24 @@
+import pytest
+
+USERS = '''Admin / admin / admin
+Student / 100 / pw / Ana Reyes / 20
+Student / 200 / pw / Ben Cruz / 20
+Student / 300 / pw / Cara Santos / 6'''
+COURSES = '''CCPROG1 / 3 / 
+magic / 2 / 
+CCPROG2 / 3 / CCPROG1 '''
+CLASSES = '''CCPROG1 / G302B / 
+magic / M204 / 300 
+CCPROG2 / G302A / 
+CCPROG1 / G303 / 200 / 1 /  / TUE0900-1030'''
+PREV_ENROLMENTS = '''100 / CCPROG1
+200 /  '''
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    '''Runs a test inside a data directory holding a few users, courses, classes, and previous enrolments.'''
+    for name, text in (('users.txt', USERS), ('courses.txt', COURSES), ('classes.txt', CLASSES),
+                       ('prev_enrolments.txt', PREV_ENROLMENTS)):
+        (tmp_path / name).write_text(text)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,71 @@
+import argparse
+import os
+import random
+
+def write_data(students, courses, sections, seed=None):
+    '''Writes made up but valid users.txt, courses.txt, classes.txt, and prev_enrolments.txt into the current directory.
+
+    Courses only require courses made before them, so the prerequisites never have a cycle. Each student's
+    previous enrolments only contain courses whose prerequisites they had already taken, and every
+    student has the password "password" in plain text (it is hashed the first time they log in).
+
+    Args:
+        students: How many students to make
+        courses: How many courses to make
+        sections: How many classes to make, spread over the courses
+        seed: The seed for the random numbers, so that the same data can be made again
+    '''
+    rng = random.Random(seed)
+    course_names = [f'COURSE{i}' for i in range(courses)]
+    student_ids = [str(10000000 + i) for i in range(students)]
+
+    prereqs = []
+    for i in range(courses):
+        prereqs.append(rng.sample(course_names[:i], min(i, rng.choice((0, 0, 1, 1, 2, 3)))))
+
+    with open('users.txt', 'w') as users_txt:
+        lines = ['Admin / admin / admin']
+        for s_id in student_ids:
+            lines.append(f'Student / {s_id} / password / Student {s_id} / {rng.randint(18, 24)}')
+        users_txt.write('\n'.join(lines))
+
+    with open('courses.txt', 'w') as courses_txt:
+        lines = []
+        for name, course_prereqs in zip(course_names, prereqs):
+            lines.append(f'{name} / {rng.randint(1, 5)} / {"".join(f"{pr} " for pr in course_prereqs)}')
+        courses_txt.write('\n'.join(lines))
+
+    with open('classes.txt', 'w') as classes_txt:
+        lines = []
+        for i in range(sections):
+            roster = rng.sample(student_ids, min(students, rng.randint(0, 40)))
+            lines.append(f'{course_names[i % courses]} / R{i} / {"".join(f"{s_id} " for s_id in roster)}')
+        classes_txt.write('\n'.join(lines))
+
+    with open('prev_enrolments.txt', 'w') as prev_enrolments_txt:
+        lines = []
+        for s_id in student_ids:
+            taken = set()
+            # Only the first courses are looked at, like a student in their first few terms
+            for i in range(min(courses, rng.randint(0, 40))):
+                if rng.random() < 0.4 and taken.issuperset(prereqs[i]):
+                    taken.add(course_names[i])
+            lines.append(f'{s_id} / {"".join(f"{pe} " for pe in course_names if pe in taken)}')
+        prev_enrolments_txt.write('\n'.join(lines))
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a made up Lozol dataset of any size.')
+    parser.add_argument('--students', type=int, default=100000)
+    parser.add_argument('--courses', type=int, default=2000)
+    parser.add_argument('--sections', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='.', help='the directory to write the four text files to')
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    os.chdir(args.out)
+    write_data(args.students, args.courses, args.sections, args.seed)
+    print(f'Wrote {args.students} students, {args.courses} courses, and {args.sections} classes to {args.out}.')
+
+if __name__ == '__main__':
+    main()
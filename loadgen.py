@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from COMET import Student, load_data, is_hashed
+
+async def request(reader, writer, latencies, **fields):
+    start = time.perf_counter()
+    writer.write(json.dumps(fields).encode() + b'\n')
+    await writer.drain()
+    response = json.loads(await reader.readline())
+    latencies.append(time.perf_counter() - start)
+    return response
+
+async def client(host, port, student, password, rounds, latencies, login_latencies):
+    '''Logs in as a student and keeps listing, enrolling in, and dropping classes.'''
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        response = await request(reader, writer, login_latencies, op='login', username=student.username, password=password)
+        if not response['ok']:
+            return
+        for _ in range(rounds):
+            listing = await request(reader, writer, latencies, op='list')
+            if listing['available']:
+                course_name, classroom = random.choice(listing['available'])
+                await request(reader, writer, latencies, op='enrol', course_name=course_name, classroom=classroom)
+            if listing['enrolled']:
+                course_name, classroom = random.choice(listing['enrolled'])
+                await request(reader, writer, latencies, op='drop', course_name=course_name, classroom=classroom)
+    finally:
+        writer.close()
+
+async def run(host, port, clients, rounds, password=None):
+    users, _, _, _ = load_data()
+    # Hashed passwords cannot be read back, so those students can only be used if their password is given
+    students = [user for user in users.values() if isinstance(user, Student) and (password is not None or not is_hashed(user.password))]
+    if not students:
+        print('No students in users.txt to log in as (use --password if their passwords are hashed).')
+        return
+
+    latencies = []
+    login_latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, students[i % len(students)],
+                                 password if password is not None else students[i % len(students)].password,
+                                 rounds, latencies, login_latencies) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    if not latencies:
+        print('No requests were made.')
+        return
+    # Logins are timed apart from the rest, since checking a password is slow on purpose
+    print(f'{len(latencies) + len(login_latencies)} requests from {clients} clients in {elapsed:.2f}s')
+    print(f'{(len(latencies) + len(login_latencies)) / elapsed:.0f} requests/s')
+    for name, times in (('Logins', login_latencies), ('Other requests', latencies)):
+        times.sort()
+        p50 = times[len(times) // 2]
+        p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+        print(f'{name + ":":<16}p50 {p50 * 1000:.2f}ms, p99 {p99 * 1000:.2f}ms')
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the throughput and latency of the Lozol enrolment server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8642)
+    parser.add_argument('--clients', type=int, default=100, help='number of students connected at the same time')
+    parser.add_argument('--rounds', type=int, default=50, help='list/enrol/drop rounds per client')
+    parser.add_argument('--password', help='the password every student logs in with, if their passwords are hashed')
+    args = parser.parse_args()
+    asyncio.run(run(args.host, args.port, args.clients, args.rounds, args.password))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import bisect
+import json
+import time
+
+# The upper bounds in seconds of the latency histogram buckets, from 10 microseconds up to 10 seconds
+BUCKETS = (0.00001, 0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+# The functions of COMET that are timed: the dashboard actions, the parsers, and the file reads and writes
+COMET_FUNCTIONS = (
+    'enrol_class', 'drop_class', 'edit_student_password',
+    'create_class', 'remove_class', 'create_course', 'remove_course', 'edit_students',
+    'parse_as_user', 'parse_as_course', 'parse_as_class', 'parse_as_prev_enrolments', 'parse_data',
+    'load_data', 'load_snapshot', 'write_snapshot', 'write_atomic', 'save_data',
+)
+COMET_METHODS = (('Journal', 'record'), ('Journal', 'replay'), ('Journal', 'compact'))
+
+class Histogram:
+    '''Counts how many timings fell into each of the BUCKETS.
+
+    Attributes:
+        counts: The number of timings in each bucket, with one more bucket at the end for timings above every bound
+        total: The sum of all the timings in seconds
+        count: The number of timings
+    '''
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def cumulative(self):
+        '''Returns a list of (upper bound, number of timings at or below it) pairs, ending with "+Inf".'''
+        pairs = []
+        running = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), self.counts):
+            running += count
+            pairs.append((bound, running))
+        return pairs
+
+class Metrics:
+    '''Keeps a latency histogram and an error counter for every function that was instrumented.
+
+    Attributes:
+        histograms: A dictionary mapping a function name to its Histogram
+        errors: A dictionary mapping a function name to the number of times it raised an exception
+    '''
+    def __init__(self):
+        self.histograms = {}
+        self.errors = {}
+
+    def timed(self, name, function):
+        '''Returns a wrapper around the function that times every call to it.'''
+        histogram = self.histograms.setdefault(name, Histogram())
+        errors = self.errors
+        errors.setdefault(name, 0)
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except BaseException:
+                errors[name] += 1
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        wrapper.__wrapped__ = function
+        return wrapper
+
+    def instrument(self, owner, attribute, name=None):
+        '''Replaces a function of a module or class with a timed wrapper around it.
+
+        Functions that are looked up by name when they are called (as all of COMET's are) are then timed
+        without changing any of the code that calls them. Nothing is replaced unless this is called, so
+        Lozol runs exactly as before when metrics are turned off.
+
+        Args:
+            owner: The module or class the function belongs to
+            attribute: The name of the function
+            name: The name to report the timings under, the attribute if not given
+        '''
+        setattr(owner, attribute, self.timed(name or attribute, getattr(owner, attribute)))
+
+    def to_json(self):
+        return {
+            name: {
+                'count': histogram.count,
+                'errors': self.errors[name],
+                'total_seconds': histogram.total,
+                'mean_seconds': histogram.total / histogram.count if histogram.count else None,
+                'buckets': {str(bound): count for bound, count in histogram.cumulative()},
+            }
+            for name, histogram in sorted(self.histograms.items()) if histogram.count
+        }
+
+    def to_prometheus(self):
+        '''Returns the metrics in the Prometheus text exposition format.'''
+        lines = ['# HELP lozol_call_seconds Time taken by each Lozol function call.',
+                 '# TYPE lozol_call_seconds histogram']
+        for name, histogram in sorted(self.histograms.items()):
+            if not histogram.count:
+                continue
+            for bound, count in histogram.cumulative():
+                lines.append(f'lozol_call_seconds_bucket{{function="{name}",le="{bound}"}} {count}')
+            lines.append(f'lozol_call_seconds_sum{{function="{name}"}} {histogram.total}')
+            lines.append(f'lozol_call_seconds_count{{function="{name}"}} {histogram.count}')
+        lines.append('# HELP lozol_call_errors_total Lozol function calls that raised an exception.')
+        lines.append('# TYPE lozol_call_errors_total counter')
+        for name, errors in sorted(self.errors.items()):
+            if self.histograms[name].count:
+                lines.append(f'lozol_call_errors_total{{function="{name}"}} {errors}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        '''Writes the metrics to a file, in the Prometheus text format if it ends in .prom and as JSON otherwise.'''
+        with open(path, 'w') as metrics_file:
+            if path.endswith('.prom'):
+                metrics_file.write(self.to_prometheus())
+            else:
+                json.dump(self.to_json(), metrics_file, indent=2)
+
+def instrument_comet(comet):
+    '''Times the dashboard actions, parsers, and file operations of the COMET module.
+
+    Returns:
+        The Metrics the timings are kept in.
+    '''
+    metrics = Metrics()
+    for attribute in COMET_FUNCTIONS:
+        metrics.instrument(comet, attribute)
+    for class_name, attribute in COMET_METHODS:
+        metrics.instrument(getattr(comet, class_name), attribute, f'{class_name}.{attribute}')
+    return metrics
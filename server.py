@@ -0,0 +1,273 @@
+import argparse
+import asyncio
+import collections
+import contextlib
+import json
+
+from COMET import (Student, Eligibility, Journal, load_data, save_data, hash_password, needs_rehash,
+                   promote_waitlisted, waitlist_priority, compact_interval)
+
+class MemoryEnrolments:
+    '''Logs in, lists, enrols, and drops against the users, courses, classes, and previous enrolments in memory.
+
+    Provides the same methods as SqliteStorage so that the server can use either.
+
+    Attributes:
+        users: All the users in the Lozol system
+        courses: All the courses in the Lozol system
+        classes: All the classes in the Lozol system
+        prev_enrolments: All the students with their previous enrolments
+        eligibilities: An OrderedDict mapping a student ID to the Eligibility of that student, least recently
+            used first, which holds as many students as the previous enrolments cache does
+        journal: The Journal every change is recorded in (and compacted by), or None to only save on shutdown
+    '''
+    def __init__(self, users, courses, classes, prev_enrolments, journal=None):
+        self.users = users
+        self.courses = courses
+        self.classes = classes
+        self.prev_enrolments = prev_enrolments
+        self.eligibilities = collections.OrderedDict()
+        self.journal = journal
+
+    def record(self, *fields):
+        if self.journal is not None:
+            self.journal.record(*fields)
+
+    def eligibility(self, student):
+        eligibility = self.eligibilities.get(student.username)
+        if eligibility is not None:
+            self.eligibilities.move_to_end(student.username)
+            return eligibility
+        prev_enrolled = []
+        if student.username in self.prev_enrolments:
+            prev_enrolled = self.prev_enrolments[student.username].prev_enrolled
+        eligibility = Eligibility(student, self.courses, self.classes, prev_enrolled)
+        self.eligibilities[student.username] = eligibility
+        # Each Eligibility keeps the student's previous enrolments, so it is evicted along with them
+        while len(self.eligibilities) > self.prev_enrolments.max_size:
+            self.eligibilities.popitem(last=False)
+        return eligibility
+
+    def find_user(self, username):
+        return self.users.get(username)
+
+    def save_password(self, user):
+        self.users.touch(user.username)
+        self.record('password', user.username, user.password)
+
+    def listing(self, student):
+        avail = sorted((cl.course_name, cl.classroom) for cl in self.eligibility(student).available_classes())
+        enrolled = sorted((cl.course_name, cl.classroom) for cl in self.classes.student_classes(student.username))
+        return avail, enrolled
+
+    def enrol(self, student_id, course_name, classroom):
+        key = f'{course_name} / {classroom}'
+        reason = self.eligibility(self.users[student_id]).check(key)
+        if reason is None:
+            self.classes.enrol(key, student_id)
+            self.record('enrol', student_id, course_name, classroom)
+        return reason
+
+    def drop(self, student_id, course_name, classroom):
+        key = f'{course_name} / {classroom}'
+        if key not in self.classes or student_id not in self.classes[key].student_ids:
+            return 'not enrolled in class'
+        self.classes.drop(key, student_id)
+        self.record('drop', student_id, course_name, classroom)
+        promote_waitlisted(key, self.users, self.courses, self.classes, self.prev_enrolments)
+        return None
+
+    def join_waitlist(self, student_id, course_name, classroom):
+        key = f'{course_name} / {classroom}'
+        eligibility = self.eligibility(self.users[student_id])
+        reason = eligibility.check(key)
+        if reason != 'class is full':
+            return reason or 'class is not full'
+        priority = waitlist_priority(eligibility.student, eligibility.prev_enrolled)
+        if not self.classes.join_waitlist(key, student_id, priority):
+            return 'already on waitlist'
+        self.record('waitlist', student_id, course_name, classroom, priority)
+        return None
+
+    def save(self):
+        '''Saves all the changes, returning a list of those that another session saved different changes to first.'''
+        if self.journal is None:
+            return save_data(self.users, self.courses, self.classes, self.prev_enrolments)
+        rejected = self.journal.rejected + self.journal.compact()
+        self.journal.rejected = []
+        return rejected
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+class EnrolmentServer:
+    '''Serves login, enrol, drop, waitlist, and list requests from many clients over TCP.
+
+    Each request is a single line of JSON with an "op" field, and each response is a single line of JSON
+    with an "ok" field. Enrolling and dropping lock only the student and the class involved, so requests
+    for different students and classes never wait on each other.
+
+    Attributes:
+        enrolments: The MemoryEnrolments or SqliteStorage that requests are carried out against
+        class_locks: A dictionary mapping a class key to the lock for that class and how many requests hold
+            or wait on it, with only the classes that some request is using
+        student_locks: The same for student IDs
+    '''
+    def __init__(self, enrolments):
+        self.enrolments = enrolments
+        self.class_locks = {}
+        self.student_locks = {}
+
+    @contextlib.asynccontextmanager
+    async def locked(self, locks, key):
+        '''Holds the lock for the given key, dropping it once no request holds or waits on it.
+
+        Args:
+            locks: class_locks or student_locks
+            key: The class key or student ID to lock
+        '''
+        if key not in locks:
+            locks[key] = [asyncio.Lock(), 0]
+        entry = locks[key]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del locks[key]
+
+    async def login(self, username, password):
+        '''Returns the user with the given username and password, or None if the login details are wrong.
+
+        Checking and rehashing a password takes tens of milliseconds on purpose, so both run in a worker
+        thread (hashlib lets go of the GIL while hashing) instead of holding up every other client.
+        '''
+        user = self.enrolments.find_user(username)
+        if user is None or not await asyncio.to_thread(user.check_password, password):
+            return None
+        if needs_rehash(user.password):
+            user.password = await asyncio.to_thread(hash_password, password)
+            self.enrolments.save_password(user)
+        return user
+
+    async def handle(self, session, request):
+        '''Handles a single request from a client.
+
+        Args:
+            session: A dictionary holding the student logged in on this connection
+            request: The decoded JSON request
+
+        Returns:
+            A dictionary that will be sent back to the client as JSON.
+
+        Raises:
+            TypeError: If a username, password, course name, or classroom is not a string
+        '''
+        op = request.get('op')
+        for field in ('username', 'password', 'course_name', 'classroom'):
+            if field in request and not isinstance(request[field], str):
+                raise TypeError(f'{field} must be a string')
+        if op == 'login':
+            user = await self.login(request.get('username'), request.get('password'))
+            if user is None:
+                return {'ok': False, 'error': 'invalid login details'}
+            if not isinstance(user, Student):
+                return {'ok': False, 'error': 'only students can use the enrolment server'}
+            session['student'] = user
+            return {'ok': True, 'name': user.name}
+
+        student = session.get('student')
+        if student is None:
+            return {'ok': False, 'error': 'not logged in'}
+
+        if op == 'list':
+            avail, enrolled = self.enrolments.listing(student)
+            return {'ok': True, 'available': avail, 'enrolled': enrolled}
+
+        if op in ('enrol', 'drop', 'waitlist'):
+            course_name = request.get('course_name')
+            classroom = request.get('classroom')
+            async with self.locked(self.student_locks, student.username):
+                async with self.locked(self.class_locks, f'{course_name} / {classroom}'):
+                    if op == 'enrol':
+                        reason = self.enrolments.enrol(student.username, course_name, classroom)
+                    elif op == 'waitlist':
+                        reason = self.enrolments.join_waitlist(student.username, course_name, classroom)
+                    else:
+                        reason = self.enrolments.drop(student.username, course_name, classroom)
+            if reason is not None:
+                return {'ok': False, 'error': reason}
+            return {'ok': True}
+
+        return {'ok': False, 'error': f'unknown op {op!r}'}
+
+    async def serve_client(self, reader, writer):
+        session = {}
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    response = await self.handle(session, request)
+                except (ValueError, AttributeError, TypeError):
+                    response = {'ok': False, 'error': 'malformed request'}
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+async def serve(host, port, db_path=None, prev_cache=None, compact_every=None):
+    if db_path is not None:
+        from sqlite_storage import SqliteStorage
+        enrolments = SqliteStorage(db_path)
+    else:
+        data = load_data()
+        if prev_cache is not None:
+            data[3].max_size = prev_cache
+        # Changes are journalled as they are made, so they survive a crash and are saved every compact_every changes
+        journal = Journal(None, *data, compact_every=compact_every)
+        journal.open()
+        if journal.replay():
+            print(f'Restored {journal.entries} unsaved changes from earlier sessions.')
+        enrolments = MemoryEnrolments(*data, journal=journal)
+    server = EnrolmentServer(enrolments)
+    tcp_server = await asyncio.start_server(server.serve_client, host, port)
+    print(f'Lozol enrolment server listening on {host}:{port}, press Ctrl + C to stop and save.')
+    try:
+        async with tcp_server:
+            await tcp_server.serve_forever()
+    finally:
+        if isinstance(enrolments, MemoryEnrolments):
+            rejected = enrolments.save()
+            print('Changes saved.')
+            for change in rejected:
+                print(f'  Not saved, another session changed it first: {change}')
+            info = enrolments.prev_enrolments.cache_info()
+            print(f'Previous enrolments cache: {info["hits"]} hits, {info["misses"]} misses, '
+                  f'{info["evictions"]} evictions, {info["size"]} of {info["max_size"]} kept.')
+        enrolments.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve Lozol enrolment to many clients at the same time.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8642)
+    parser.add_argument('--db', help='serve straight from this SQLite database instead of the text files')
+    parser.add_argument('--prev-cache', type=int,
+                        help="how many students' previous enrolments to keep in memory (default: LOZOL_PREV_CACHE or 1000)")
+    parser.add_argument('--compact-every', type=int, metavar='N', default=compact_interval(100),
+                        help='save and empty the journal after every N changes (default: LOZOL_COMPACT_EVERY or 100)')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.db, args.prev_cache, args.compact_every or None))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
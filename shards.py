@@ -0,0 +1,74 @@
+import argparse
+import os
+import shutil
+
+from COMET import (ShardedClassList, CourseList, SHARD_DIR, SHARD_INDEX, STUDENT_DIR, data_lock, parse_data,
+                   parse_as_class, read_records, write_records, write_atomic, shard_prefix)
+
+def split(prefix):
+    '''Splits classes.txt into a shard per course (or per course name prefix) in the classes directory.
+
+    Args:
+        prefix: How many leading characters of a course name name its shard, 0 for a shard per course
+
+    Returns:
+        The number of classes and the number of shards they were split into.
+    '''
+    classes = ShardedClassList(CourseList())
+    classes.prefix = prefix
+    for key, cl, _ in read_records('classes.txt', parse_as_class):
+        classes[key] = cl
+
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    shards = classes.changed_shards()
+    for shard, keys in classes.shard_keys(shards).items():
+        write_records(classes.shard_path(shard), classes, keys)
+    os.makedirs(STUDENT_DIR, exist_ok=True)
+    buckets = classes.changed_student_buckets()
+    for bucket, keys in classes.student_bucket_keys(buckets).items():
+        write_records(classes.student_bucket_path(bucket), classes.students, keys)
+    # The index is written last, since Lozol reads the shards once it is there
+    write_records(SHARD_INDEX, classes.index, list(classes.index))
+    os.remove('classes.txt')
+    return len(classes), len(shards)
+
+def join():
+    '''Puts the classes of every shard back into classes.txt and removes the classes directory.
+
+    Returns:
+        The number of classes.
+    '''
+    # Parsed rather than loaded, since main() already holds the lock that load_data() would wait for
+    users, courses, classes, prev_enrolments = parse_data()
+    classes.load_all()
+    write_atomic('classes.txt', [cl.info() for cl in classes.values()])
+    shutil.rmtree(SHARD_DIR)
+    return len(classes)
+
+def main():
+    parser = argparse.ArgumentParser(description='Split the classes into shard files that Lozol only reads when '
+                                                 'needed, or put them back into classes.txt. Run it while no '
+                                                 'other Lozol session is open.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    split_parser = commands.add_parser('split', help='split classes.txt into the classes directory')
+    split_parser.add_argument('--prefix', type=int, default=shard_prefix(),
+                              help='leading characters of a course name that name its shard, 0 (the default, or '
+                                   'LOZOL_SHARD_PREFIX) for a shard per course')
+    commands.add_parser('join', help='put the shards back into classes.txt')
+    args = parser.parse_args()
+
+    with data_lock(exclusive=True):
+        if args.command == 'split':
+            if os.path.exists(SHARD_INDEX):
+                parser.error('the classes are already split into shards')
+            count, shards = split(args.prefix)
+            print(f'{count} classes split into {shards} shards in {SHARD_DIR}/.')
+            if args.prefix != shard_prefix():
+                print(f'Set LOZOL_SHARD_PREFIX={args.prefix} so that the classes of new courses are sharded the same way.')
+        else:
+            if not os.path.exists(SHARD_INDEX):
+                parser.error('the classes are not split into shards')
+            print(f'{join()} classes put back into classes.txt.')
+
+if __name__ == '__main__':
+    main()
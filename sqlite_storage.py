@@ -0,0 +1,393 @@
+import sqlite3
+import sys
+
+from COMET import (Admin, Student, Course, CourseList, Class, ClassList, PrevEnrolments, Records, UserList, Eligibility,
+                   TextStorage, parse_waitlist, waitlist_priority, parse_times, format_times,
+                   take_theirs)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    password TEXT NOT NULL,
+    name TEXT,
+    unit_limit INTEGER
+);
+CREATE TABLE IF NOT EXISTS courses (
+    course_name TEXT PRIMARY KEY,
+    units INTEGER NOT NULL,
+    prereqs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS classes (
+    course_name TEXT NOT NULL,
+    classroom TEXT NOT NULL,
+    capacity INTEGER,
+    waitlist TEXT NOT NULL DEFAULT '',
+    times TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (course_name, classroom)
+);
+CREATE INDEX IF NOT EXISTS classes_course_name ON classes (course_name);
+CREATE TABLE IF NOT EXISTS enrolments (
+    course_name TEXT NOT NULL,
+    classroom TEXT NOT NULL,
+    student_id TEXT NOT NULL,
+    PRIMARY KEY (course_name, classroom, student_id)
+);
+CREATE INDEX IF NOT EXISTS enrolments_student_id ON enrolments (student_id);
+CREATE TABLE IF NOT EXISTS prev_enrolments (
+    student_id TEXT PRIMARY KEY,
+    prev_enrolled TEXT NOT NULL
+);
+'''
+
+class SqliteStorage:
+    '''Stores the Lozol data in an SQLite database instead of the text files.
+
+    Besides loading and saving everything like TextStorage, finding a user, checking eligibility, enrolling,
+    and dropping can be done straight against the database. These only read the rows of the student,
+    the class, and the courses involved, and each runs in a single transaction.
+
+    Attributes:
+        path: The path to the database file
+        conn: The connection to the database
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.executescript(SCHEMA)
+        # Databases made before seat limits and meeting times were added are missing their columns
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(classes)')]
+        if 'capacity' not in columns:
+            self.conn.execute('ALTER TABLE classes ADD COLUMN capacity INTEGER')
+            self.conn.execute("ALTER TABLE classes ADD COLUMN waitlist TEXT NOT NULL DEFAULT ''")
+        if 'times' not in columns:
+            self.conn.execute("ALTER TABLE classes ADD COLUMN times TEXT NOT NULL DEFAULT ''")
+
+    def close(self):
+        self.conn.close()
+
+    def load(self):
+        '''Returns a tuple of the users, courses, classes, and previous enrolments in the database.'''
+        users = UserList()
+        courses = CourseList()
+        classes = ClassList(courses)
+        prev_enrolments = Records()
+
+        for row in self.conn.execute('SELECT kind, username, password, name, unit_limit FROM users ORDER BY rowid'):
+            users[row[1]] = self._user(row)
+
+        for course_name, units, prereqs in self.conn.execute('SELECT course_name, units, prereqs FROM courses ORDER BY rowid'):
+            try:
+                courses[course_name] = Course(course_name, units, prereqs.split())
+            except ValueError as e:
+                print(f'Skipping course {course_name}: {e}')
+
+        rosters = {}
+        for course_name, classroom, student_id in self.conn.execute('SELECT course_name, classroom, student_id FROM enrolments ORDER BY rowid'):
+            rosters.setdefault(f'{course_name} / {classroom}', []).append(student_id)
+        for course_name, classroom, capacity, waitlist, times in self.conn.execute(
+                'SELECT course_name, classroom, capacity, waitlist, times FROM classes ORDER BY rowid'):
+            key = f'{course_name} / {classroom}'
+            classes[key] = Class(course_name, classroom, rosters.get(key, ()), capacity, parse_waitlist(waitlist),
+                                 parse_times(times))
+
+        for student_id, prev_enrolled in self.conn.execute('SELECT student_id, prev_enrolled FROM prev_enrolments ORDER BY rowid'):
+            prev_enrolments[student_id] = PrevEnrolments(student_id, prev_enrolled.split())
+
+        for records in (users, courses, classes, prev_enrolments):
+            records.mark_saved()
+        return users, courses, classes, prev_enrolments
+
+    def save(self, users, courses, classes, prev_enrolments):
+        '''Saves the records that were changed since they were last saved, in a single transaction.
+
+        The students this session enrolled in or dropped from a class are merged into the class as it is in
+        the database, so enrolments saved by another session in the meantime are kept (see ClassList.merge()).
+
+        Returns:
+            A list of the changes that could not be saved because another session changed the same classes.
+        '''
+        return self._save_keys(users, courses, classes, prev_enrolments,
+                               [list(users.changed), list(courses.changed), list(classes.changed),
+                                list(prev_enrolments.changed)])
+
+    def import_data(self, users, courses, classes, prev_enrolments):
+        '''Saves every record into the database in order, whether it was changed or not.'''
+        classes.load_all()
+        self._save_keys(users, courses, classes, prev_enrolments,
+                        [list(users), list(courses), list(classes), list(prev_enrolments)])
+
+    def _save_keys(self, users, courses, classes, prev_enrolments, keys):
+        user_keys, course_keys, class_keys, prev_enrolment_keys = keys
+        rejected = []
+        with self.transaction():
+            for username in user_keys:
+                if username in users:
+                    self._save_user(users[username])
+                else:
+                    self.conn.execute('DELETE FROM users WHERE username = ?', (username,))
+
+            for course_name in course_keys:
+                if course_name in courses:
+                    course = courses[course_name]
+                    self.conn.execute('INSERT INTO courses VALUES (?, ?, ?) ON CONFLICT (course_name) '
+                                      'DO UPDATE SET units = excluded.units, prereqs = excluded.prereqs',
+                                      (course.course_name, course.units, ' '.join(course.prereqs)))
+                else:
+                    self.conn.execute('DELETE FROM courses WHERE course_name = ?', (course_name,))
+
+            for key in class_keys:
+                course_name, classroom = key.split(' / ')
+                if key in classes.bases:
+                    # Only the students were changed, so they are merged with the class as it is saved now
+                    theirs = self._class(course_name, classroom)
+                    left_out = classes.merge(key, theirs)
+                    if left_out is None:
+                        rejected.append(f'{key} (changed by another session)')
+                        take_theirs(classes, key, theirs)
+                        continue
+                    rejected.extend(left_out)
+                self.conn.execute('DELETE FROM enrolments WHERE course_name = ? AND classroom = ?', (course_name, classroom))
+                if key in classes:
+                    cl = classes[key]
+                    self.conn.execute('INSERT INTO classes VALUES (?, ?, ?, ?, ?) ON CONFLICT (course_name, classroom) '
+                                      'DO UPDATE SET capacity = excluded.capacity, waitlist = excluded.waitlist, '
+                                      'times = excluded.times',
+                                      (course_name, classroom, cl.capacity, cl.waitlist.info(), format_times(cl.times)))
+                    self.conn.executemany('INSERT INTO enrolments VALUES (?, ?, ?)',
+                                          [(course_name, classroom, s_id) for s_id in classes[key].student_ids])
+                else:
+                    self.conn.execute('DELETE FROM classes WHERE course_name = ? AND classroom = ?', (course_name, classroom))
+
+            for student_id in prev_enrolment_keys:
+                if student_id in prev_enrolments:
+                    self.conn.execute('INSERT INTO prev_enrolments VALUES (?, ?) ON CONFLICT (student_id) '
+                                      'DO UPDATE SET prev_enrolled = excluded.prev_enrolled',
+                                      (student_id, ' '.join(prev_enrolments[student_id].prev_enrolled)))
+                else:
+                    self.conn.execute('DELETE FROM prev_enrolments WHERE student_id = ?', (student_id,))
+
+        for records in (users, courses, classes, prev_enrolments):
+            records.mark_saved()
+        return rejected
+
+    def _class(self, course_name, classroom):
+        '''Returns the class as it is in the database, or None if it is not there.'''
+        row = self.conn.execute('SELECT capacity, waitlist, times FROM classes WHERE course_name = ? AND classroom = ?',
+                                (course_name, classroom)).fetchone()
+        if row is None:
+            return None
+        student_ids = [s_id for s_id, in self.conn.execute(
+            'SELECT student_id FROM enrolments WHERE course_name = ? AND classroom = ? ORDER BY rowid', (course_name, classroom))]
+        return Class(course_name, classroom, student_ids, row[0], parse_waitlist(row[1]), parse_times(row[2]))
+
+    def transaction(self):
+        return _Transaction(self.conn)
+
+    def find_user(self, username):
+        '''Returns the user with the given username, or None if there is none.'''
+        row = self.conn.execute('SELECT kind, username, password, name, unit_limit FROM users WHERE username = ?',
+                                (username,)).fetchone()
+        return self._user(row) if row is not None else None
+
+    def save_password(self, user):
+        '''Saves a user's changed password.'''
+        with self.transaction():
+            self.conn.execute('UPDATE users SET password = ? WHERE username = ?', (user.password, user.username))
+
+    def check_enrolment(self, student_id, course_name, classroom):
+        '''Checks whether the student can enrol in the class, reading only the rows that are needed.
+
+        Returns:
+            None if the student can enrol in the class, otherwise a string with the reason they cannot.
+        '''
+        row = self.conn.execute('SELECT kind, username, password, name, unit_limit FROM users WHERE username = ?',
+                                (student_id,)).fetchone()
+        if row is None or row[0] != 'Student':
+            return 'student not found'
+        student = self._user(row)
+
+        # Only the class being enrolled in, the classes the student is already in, and their courses are needed
+        classes = ClassList()
+        row = self.conn.execute('SELECT capacity, times FROM classes WHERE course_name = ? AND classroom = ?',
+                                (course_name, classroom)).fetchone()
+        if row is None:
+            return 'class not found'
+        capacity = row[0]
+        classes[f'{course_name} / {classroom}'] = Class(course_name, classroom, (), times=parse_times(row[1]))
+        for enrolled_course, enrolled_classroom, times in self.conn.execute(
+                'SELECT course_name, classroom, times FROM enrolments JOIN classes USING (course_name, classroom) '
+                'WHERE student_id = ?', (student_id,)):
+            classes[f'{enrolled_course} / {enrolled_classroom}'] = Class(enrolled_course, enrolled_classroom, (student_id,),
+                                                                          times=parse_times(times))
+
+        courses = {}
+        course_names = {cl.course_name for cl in classes.values()}
+        placeholders = ', '.join('?' for _ in course_names)
+        for name, units, prereqs in self.conn.execute(
+                f'SELECT course_name, units, prereqs FROM courses WHERE course_name IN ({placeholders})', tuple(course_names)):
+            courses[name] = Course(name, units, prereqs.split())
+
+        prev_enrolled = []
+        row = self.conn.execute('SELECT prev_enrolled FROM prev_enrolments WHERE student_id = ?', (student_id,)).fetchone()
+        if row is not None:
+            prev_enrolled = row[0].split()
+
+        reason = Eligibility(student, courses, classes, prev_enrolled).check(f'{course_name} / {classroom}')
+        if reason is None and capacity is not None:
+            # The roster of the class was not read, so its seat limit is checked by counting its enrolments
+            taken, = self.conn.execute('SELECT COUNT(*) FROM enrolments WHERE course_name = ? AND classroom = ?',
+                                       (course_name, classroom)).fetchone()
+            if taken >= capacity:
+                return 'class is full'
+        return reason
+
+    def enrol(self, student_id, course_name, classroom):
+        '''Enrols the student in the class if they are allowed to.
+
+        Returns:
+            None if the student was enrolled, otherwise a string with the reason they were not.
+        '''
+        with self.transaction():
+            reason = self.check_enrolment(student_id, course_name, classroom)
+            if reason is None:
+                self.conn.execute('INSERT INTO enrolments VALUES (?, ?, ?)', (course_name, classroom, student_id))
+        return reason
+
+    def drop(self, student_id, course_name, classroom):
+        '''Drops the student from the class.
+
+        Returns:
+            None if the student was dropped, otherwise a string with the reason they were not.
+        '''
+        with self.transaction():
+            deleted = self.conn.execute('DELETE FROM enrolments WHERE course_name = ? AND classroom = ? AND student_id = ?',
+                                        (course_name, classroom, student_id)).rowcount
+            if deleted:
+                self.promote(course_name, classroom)
+        if not deleted:
+            return 'not enrolled in class'
+        return None
+
+    def join_waitlist(self, student_id, course_name, classroom):
+        '''Adds the student to the waitlist of the class if they could otherwise enrol in it.
+
+        Returns:
+            None if the student was added, otherwise a string with the reason they were not.
+        '''
+        with self.transaction():
+            reason = self.check_enrolment(student_id, course_name, classroom)
+            if reason != 'class is full':
+                return reason or 'class is not full'
+            row = self.conn.execute('SELECT prev_enrolled FROM prev_enrolments WHERE student_id = ?', (student_id,)).fetchone()
+            prev_enrolled = row[0].split() if row is not None else []
+            student = self._user(self.conn.execute('SELECT kind, username, password, name, unit_limit FROM users '
+                                                   'WHERE username = ?', (student_id,)).fetchone())
+            waitlist = self._waitlist(course_name, classroom)
+            if not waitlist.add(student_id, waitlist_priority(student, prev_enrolled)):
+                return 'already on waitlist'
+            self.conn.execute('UPDATE classes SET waitlist = ? WHERE course_name = ? AND classroom = ?',
+                              (waitlist.info(), course_name, classroom))
+        return None
+
+    def promote(self, course_name, classroom):
+        '''Enrols students from the waitlist of the class into its free seats, skipping those who can no longer take it.
+
+        Returns:
+            A list of the student IDs that were enrolled.
+        '''
+        promoted = []
+        with self.transaction():
+            capacity, waitlist = self.conn.execute('SELECT capacity, waitlist FROM classes WHERE course_name = ? AND classroom = ?',
+                                                   (course_name, classroom)).fetchone()
+            waitlist = parse_waitlist(waitlist)
+            taken, = self.conn.execute('SELECT COUNT(*) FROM enrolments WHERE course_name = ? AND classroom = ?',
+                                       (course_name, classroom)).fetchone()
+            while waitlist and (capacity is None or taken < capacity):
+                s_id = waitlist.pop()
+                if self.check_enrolment(s_id, course_name, classroom) is None:
+                    self.conn.execute('INSERT INTO enrolments VALUES (?, ?, ?)', (course_name, classroom, s_id))
+                    promoted.append(s_id)
+                    taken += 1
+            self.conn.execute('UPDATE classes SET waitlist = ? WHERE course_name = ? AND classroom = ?',
+                              (waitlist.info(), course_name, classroom))
+        return promoted
+
+    def _waitlist(self, course_name, classroom):
+        row = self.conn.execute('SELECT waitlist FROM classes WHERE course_name = ? AND classroom = ?',
+                                (course_name, classroom)).fetchone()
+        return parse_waitlist(row[0] if row is not None else '')
+
+    def student_classes(self, student_id):
+        '''Returns a list of (course name, classroom) of the classes the student is enrolled in.'''
+        return self.conn.execute('SELECT course_name, classroom FROM enrolments WHERE student_id = ?', (student_id,)).fetchall()
+
+    def listing(self, student):
+        '''Returns a tuple of the sorted (course name, classroom) of the classes the student can enrol in and is enrolled in.'''
+        enrolled = self.student_classes(student.username)
+        courses = {}
+        for name, units, prereqs in self.conn.execute('SELECT course_name, units, prereqs FROM courses'):
+            courses[name] = Course(name, units, prereqs.split())
+        classes = ClassList()
+        for course_name, classroom in self.conn.execute('SELECT course_name, classroom FROM classes'):
+            classes[f'{course_name} / {classroom}'] = Class(course_name, classroom, ())
+        for course_name, classroom in enrolled:
+            classes.enrol(f'{course_name} / {classroom}', student.username)
+
+        prev_enrolled = []
+        row = self.conn.execute('SELECT prev_enrolled FROM prev_enrolments WHERE student_id = ?', (student.username,)).fetchone()
+        if row is not None:
+            prev_enrolled = row[0].split()
+
+        avail = Eligibility(student, courses, classes, prev_enrolled).available_classes()
+        return sorted((cl.course_name, cl.classroom) for cl in avail), sorted(enrolled)
+
+    def _user(self, row):
+        kind, username, password, name, unit_limit = row
+        if kind == 'Student':
+            return Student(username, password, name, unit_limit)
+        return Admin(username, password)
+
+    def _save_user(self, user):
+        if isinstance(user, Student):
+            row = (user.username, 'Student', user.password, user.name, user.unit_limit)
+        else:
+            row = (user.username, 'Admin', user.password, None, None)
+        self.conn.execute('INSERT INTO users VALUES (?, ?, ?, ?, ?) ON CONFLICT (username) DO UPDATE SET '
+                          'kind = excluded.kind, password = excluded.password, name = excluded.name, '
+                          'unit_limit = excluded.unit_limit', row)
+
+class _Transaction:
+    '''Runs the statements inside a with block as one transaction, nesting inside an outer one if there is one.'''
+    def __init__(self, conn):
+        self.conn = conn
+        self.outer = False
+
+    def __enter__(self):
+        self.outer = self.conn.in_transaction
+        if not self.outer:
+            self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.outer:
+            return False
+        if exc_type is None:
+            self.conn.execute('COMMIT')
+        else:
+            self.conn.execute('ROLLBACK')
+        return False
+
+def main():
+    if len(sys.argv) != 2:
+        print(f'Usage: python {sys.argv[0]} <database file>')
+        print('Copies users.txt, courses.txt, classes.txt, and prev_enrolments.txt into the database.')
+        sys.exit(1)
+
+    storage = SqliteStorage(sys.argv[1])
+    storage.import_data(*TextStorage().load())
+    storage.close()
+    print(f'Text files copied into {sys.argv[1]}.')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import random
+
+from COMET import Class, load_data, parse_data, save_data
+from allocate import allocate, allocate_parallel, confirm_saved, department, draft_order, split_departments
+from generate_data import write_data
+
+def test_sections_another_session_filled_first_are_not_reported_as_allocated(data_dir):
+    data = load_data()
+    data[2]['magic / R9'] = Class('magic', 'R9', [], 1)
+    save_data(*data)
+    other = load_data()
+    term = load_data()
+    other[2].enrol('magic / R9', '100')
+    save_data(*other)
+
+    results = allocate(['200'], {'200': ['magic / R9', 'CCPROG1 / G302B']}, *term)
+    assert results == {'200': [('magic / R9', None), ('CCPROG1 / G302B', 'already enrolled in course')]}
+    assert save_data(*term) == ['enrolment of 200 in magic / R9 (the class is full)']
+    assert confirm_saved(results, term[2]) == {
+        '200': [('magic / R9', 'not saved, another session changed the section first'),
+                ('CCPROG1 / G302B', 'already enrolled in course')],
+    }
+
+def generated_term(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_data(300, 40, 120, seed=5)
+    rng = random.Random(5)
+    data = parse_data()
+    classes = data[2]
+    for cl in classes.values():
+        cl.capacity = len(cl.student_ids) + rng.randint(0, 3)
+    # Each student ranks sections of a single department, so the departments can be allocated on their own
+    by_department = {}
+    for key in sorted(classes):
+        by_department.setdefault(department(key, 7), []).append(key)
+    preferences = {}
+    for student_id in sorted(data[0].students):
+        keys = by_department[rng.choice(sorted(by_department))]
+        preferences[student_id] = rng.sample(keys, min(len(keys), 6))
+    return data, preferences
+
+def test_allocation_respects_every_rule(tmp_path, monkeypatch):
+    (users, courses, classes, prev_enrolments), preferences = generated_term(tmp_path, monkeypatch)
+    before = {key: set(cl.student_ids) for key, cl in classes.items()}
+    results = allocate(draft_order(preferences, seed=1), preferences, users, courses, classes, prev_enrolments)
+    assert sum(reason is None for checked in results.values() for _, reason in checked) > 20
+
+    for key, cl in classes.items():
+        added = set(cl.student_ids) - before[key]
+        assert len(cl.student_ids) <= cl.capacity
+        for student_id in added:
+            assert (key, None) in results[student_id]
+    for student_id, checked in results.items():
+        taken = set(prev_enrolments[student_id].prev_enrolled)
+        # The generated rosters are random, so only the allocated sections are held to the rules
+        enrolled = [cl.course_name for cl in classes.student_classes(student_id)]
+        for key, reason in checked:
+            if reason is None:
+                course = courses[classes[key].course_name]
+                assert course.course_name not in taken and set(course.prereqs) <= taken
+                assert enrolled.count(course.course_name) == 1
+        if any(reason is None for _, reason in checked):
+            assert sum(courses[name].units for name in enrolled) <= users[student_id].unit_limit
+
+def test_parallel_allocation_gives_the_same_result(tmp_path, monkeypatch):
+    data, preferences = generated_term(tmp_path, monkeypatch)
+    order = draft_order(preferences, seed=1)
+    serial = allocate(order, preferences, *data)
+
+    data, _ = generated_term(tmp_path, monkeypatch)
+    parallel = allocate_parallel(order, preferences, *data, processes=2, prefix=7)
+    assert parallel == serial
+    assert len(split_departments(order, preferences, 7)) > 1
@@ -0,0 +1,40 @@
+import csv
+import io
+
+from COMET import Eligibility, parse_data
+from audit import audit, make_catalogue, make_profiles
+from generate_data import write_data
+
+def report(data, processes):
+    users, courses, classes, prev_enrolments = data
+    out = io.StringIO()
+    rows = audit(make_profiles(users, classes, courses, prev_enrolments), make_catalogue(courses), out,
+                 processes, shard_size=40)
+    return rows, out.getvalue()
+
+def test_reasons_match_eligibility_check(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_data(150, 30, 90, seed=11)
+    users, courses, classes, prev_enrolments = data = parse_data()
+    rows, text = report(data, 1)
+    assert rows == 150 * 30
+
+    compared = 0
+    for student_id, course_name, eligible, reason in list(csv.reader(io.StringIO(text)))[1:]:
+        # Any class of the course the student is not already in gives the same answer, since the generated
+        # classes have no seat limits or meeting times
+        keys = [f'{cl.course_name} / {cl.classroom}' for cl in classes.course_classes(course_name)
+                if student_id not in cl.student_ids]
+        if not keys:
+            continue
+        prev_enrolled = prev_enrolments[student_id].prev_enrolled
+        expected = Eligibility(users[student_id], courses, classes, prev_enrolled).check(keys[0])
+        assert (eligible, reason) == (('yes', '') if expected is None else ('no', expected))
+        compared += 1
+    assert compared > rows // 2
+
+def test_parallel_audit_writes_the_same_report(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_data(150, 30, 90, seed=11)
+    data = parse_data()
+    assert report(data, 2) == report(data, 1)
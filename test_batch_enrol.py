@@ -0,0 +1,58 @@
+from COMET import Class, Course, load_data, save_data
+from batch_enrol import confirm_saved, enrol_batch
+
+def add_class_with_one_seat(key):
+    data = load_data()
+    course_name, classroom = key.split(' / ')
+    data[2][key] = Class(course_name, classroom, [], 1)
+    save_data(*data)
+
+def test_enrolments_another_session_filled_first_are_not_reported_as_accepted(data_dir):
+    add_class_with_one_seat('magic / R9')
+    other = load_data()
+    batch = load_data()
+    other[2].enrol('magic / R9', '100')
+    save_data(*other)
+
+    results = enrol_batch(['200 / magic / R9', '300 / CCPROG2 / G302A'], *batch)
+    assert [reason for _, reason in results] == [None, 'missing prerequisites: CCPROG1']
+    assert save_data(*batch) == ['enrolment of 200 in magic / R9 (the class is full)']
+    assert confirm_saved(results, batch[2]) == [
+        ('200 / magic / R9', 'not saved, another session changed the class first'),
+        ('300 / CCPROG2 / G302A', 'missing prerequisites: CCPROG1'),
+    ]
+
+def test_each_request_gets_the_reason_enrol_class_would_give(data_dir):
+    data = load_data()
+    requests = [
+        '300 / CCPROG1 / G302B\n',
+        'not a request\n',
+        '\n',
+        '999 / magic / M204\n',
+        '100 / CCPROG1 / G302B\n',
+        '200 / CCPROG2 / G302A\n',
+        '200 / CCPROG1 / G302B\n',
+        '300 / CCPROG2 / G302A\n',
+        '100 / NOPE / R1\n',
+    ]
+    assert enrol_batch(requests, *data) == [
+        ('300 / CCPROG1 / G302B', None),
+        ('not a request', 'malformed request'),
+        ('999 / magic / M204', 'student not found'),
+        ('100 / CCPROG1 / G302B', 'course previously taken'),
+        ('200 / CCPROG2 / G302A', 'missing prerequisites: CCPROG1'),
+        ('200 / CCPROG1 / G302B', 'already enrolled in course'),
+        # Enrolling in CCPROG1 does not count as having taken it
+        ('300 / CCPROG2 / G302A', 'missing prerequisites: CCPROG1'),
+        ('100 / NOPE / R1', 'class not found'),
+    ]
+    assert list(data[2]['CCPROG1 / G302B'].student_ids) == ['300']
+
+def test_requests_are_applied_in_order(data_dir):
+    # 300 has four of their six units left after magic, enough for CCPROG1 or ART but not both
+    for first, second in (('CCPROG1 / G302B', 'ART / A1'), ('ART / A1', 'CCPROG1 / G302B')):
+        data = load_data()
+        data[1]['ART'] = Course('ART', 2, [])
+        data[2]['ART / A1'] = Class('ART', 'A1', [])
+        results = enrol_batch([f'300 / {first}', f'300 / {second}'], *data)
+        assert results == [(f'300 / {first}', None), (f'300 / {second}', 'not enough units remaining')]
@@ -0,0 +1,71 @@
+import csv
+import io
+
+from COMET import Course, CourseList, parse_data, save_data
+from bulk import export_rows, import_rows
+
+def run_import(kind, text, data, **options):
+    out = io.StringIO()
+    added, rejects = import_rows(kind, csv.DictReader(io.StringIO(text)), *data[:3], csv.writer(out), **options)
+    return added, rejects, list(csv.reader(io.StringIO(out.getvalue())))
+
+def test_short_course_rows_are_rejected(data_dir):
+    data = parse_data()
+    added, rejects, rejected = run_import('courses', 'course_name,units,prereqs\nNEWA\nNEWB,3\n', data)
+    assert (added, rejects) == (1, 1)
+    assert rejected == [['2', 'Units must be a single integer', 'NEWA', '', '']]
+    assert 'NEWB' in data[1]
+
+def test_class_rows_check_each_student_like_enrol_class(data_dir):
+    data = parse_data()
+    run_import('courses', 'course_name,units\nART,2\n', data)
+    text = ('course_name,classroom,capacity,times,student_ids\n'
+            'CCPROG1,R1,10,MON0900-1000,100\n'
+            'magic,R2,10,MON0900-1000,200\n'
+            'ART,R3,10,MON0930-1030,200\n'
+            'ART,R4,10,WED0900-1000,200\n')
+    added, rejects, rejected = run_import('classes', text, data, prev_enrolments=data[3])
+    assert (added, rejects) == (2, 2)
+    assert [row[:2] for row in rejected] == [['2', 'Student 100 cannot enrol: course previously taken'],
+                                             ['4', 'Student 200 cannot enrol: time clash with magic / R2']]
+    classes = data[2]
+    assert 'CCPROG1 / R1' not in classes and 'ART / R3' not in classes
+    assert {cl.classroom for cl in classes.student_classes('200')} == {'G303', 'R2', 'R4'}
+
+def test_class_rows_with_overlapping_times_are_rejected(data_dir):
+    data = parse_data()
+    text = ('course_name,classroom,capacity,times,student_ids\n'
+            'magic,R1,10,MON0000-2000 MON0100-0200,\n'
+            'magic,R2,10,MON0900-1000 MON1000-1100,\n')
+    added, rejects, rejected = run_import('classes', text, data)
+    assert (added, rejects) == (1, 1)
+    assert rejected[0][:2] == ['2', 'Meeting times MON0000-2000 and MON0100-0200 overlap']
+    assert 'magic / R1' not in data[2]
+
+def test_exported_courses_can_be_imported_again(data_dir):
+    data = parse_data()
+    # Redefining CCPROG1 moves it after CCPROG2 in the dictionary, but CCPROG2 still requires it
+    run_import('courses', 'course_name,units,prereqs\nINTRO,1,\n', data)
+    data[1]['CCPROG1'] = Course('CCPROG1', 3, ['INTRO'])
+    out = io.StringIO()
+    export_rows('courses', csv.writer(out), *data[:3])
+    names = [row[0] for row in csv.reader(io.StringIO(out.getvalue()))][1:]
+    assert names.index('INTRO') < names.index('CCPROG1') < names.index('CCPROG2')
+
+    fresh = (data[0], CourseList(), data[2])
+    added, rejects, _ = run_import('courses', out.getvalue(), fresh)
+    assert (added, rejects) == (len(names), 0)
+
+def test_fields_with_line_breaks_or_tabs_are_rejected(data_dir):
+    data = parse_data()
+    text = ('kind,username,password,name,unit_limit\n'
+            'Student,"bob\nx",pw,Bob,20\n'
+            'Student,400,pw,"Eve\r\nMallory",20\n'
+            'Student,500,pw,Tab\tName,20\n'
+            'Student,600,pw,Dan Reyes,20\n')
+    added, rejects, rejected = run_import('users', text, data)
+    assert (added, rejects) == (1, 3)
+    assert {row[1] for row in rejected} == {'Fields cannot contain line breaks or tabs'}
+
+    save_data(*data)
+    assert set(parse_data()[0]) == {'admin', '100', '200', '300', '600'}
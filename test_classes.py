@@ -0,0 +1,54 @@
+from COMET import Class, ClassList, Roster, parse_as_class, parse_data
+
+def scanned_classes(classes, student_id):
+    # What enrol_class and drop_class used to find by looking through every class
+    return {key for key, cl in classes.items() if student_id in cl.student_ids}
+
+def indexed_classes(classes, student_id):
+    return {f'{cl.course_name} / {cl.classroom}' for cl in classes.student_classes(student_id)}
+
+def test_student_classes_are_indexed_when_loading(data_dir):
+    classes = parse_data()[2]
+    for student_id in ('100', '200', '300', '999'):
+        assert indexed_classes(classes, student_id) == scanned_classes(classes, student_id)
+
+def test_index_follows_enrolments_drops_and_class_changes(data_dir):
+    classes = parse_data()[2]
+    classes.enrol('CCPROG1 / G302B', '300')
+    classes.enrol('CCPROG2 / G302A', '300')
+    classes.drop('magic / M204', '300')
+    assert indexed_classes(classes, '300') == {'CCPROG1 / G302B', 'CCPROG2 / G302A'}
+
+    del classes['CCPROG2 / G302A']
+    classes['magic / M205'] = Class('magic', 'M205', ['300', '100'])
+    # Replacing a class drops the students who are not on its new roster
+    classes['CCPROG1 / G302B'] = Class('CCPROG1', 'G302B', ['100'])
+    for student_id in ('100', '200', '300'):
+        assert indexed_classes(classes, student_id) == scanned_classes(classes, student_id)
+    assert indexed_classes(classes, '300') == {'magic / M205'}
+
+def test_classes_of_a_course_are_indexed():
+    classes = ClassList()
+    classes['A / R1'] = Class('A', 'R1', [])
+    classes['A / R2'] = Class('A', 'R2', [])
+    classes['B / R1'] = Class('B', 'R1', [])
+    del classes['A / R1']
+    assert [cl.classroom for cl in classes.course_classes('A')] == ['R2']
+
+def test_roster_keeps_enrolment_order_and_rejects_duplicates():
+    roster = Roster(['300', '100'])
+    assert roster.add('200')
+    assert not roster.add('100')
+    assert list(roster) == ['300', '100', '200']
+    assert roster.discard('100')
+    assert not roster.discard('100')
+    assert '100' not in roster and '200' in roster
+    assert list(roster) == ['300', '200'] and len(roster) == 2
+
+def test_class_lines_are_written_as_they_were_read():
+    for line in ('CCPROG1 / G302B / ', 'magic / M204 / 300 100 200 ', 'CCPROG1 / G303 / 200  / 1 /  / TUE0900-1030'):
+        assert parse_as_class(line).info() == line
+    cl = parse_as_class('magic / M204 / 300 100 ')
+    cl.student_ids.add('200')
+    cl.student_ids.discard('300')
+    assert cl.info() == 'magic / M204 / 100 200 '
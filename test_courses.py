@@ -0,0 +1,110 @@
+import pytest
+
+from COMET import Class, Course, CourseList, parse_data
+
+def add(courses, name, *prereqs):
+    courses[name] = Course(name, 3, list(prereqs))
+
+def test_a_course_cannot_require_itself_or_close_a_cycle():
+    courses = CourseList()
+    add(courses, 'A')
+    add(courses, 'B', 'A')
+    add(courses, 'C', 'B')
+    with pytest.raises(ValueError):
+        add(courses, 'D', 'D')
+    with pytest.raises(ValueError):
+        add(courses, 'A', 'C')
+    assert courses['A'].prereqs == []
+    assert courses.all_prereqs('C') == {'A', 'B'}
+
+def test_a_rejected_course_does_not_leave_a_stale_cache_behind():
+    courses = CourseList()
+    add(courses, 'C2', 'C3', 'C5')
+    with pytest.raises(ValueError):
+        add(courses, 'C5', 'C1', 'C2')
+    add(courses, 'C1', 'C5', 'C2')
+    add(courses, 'C0')
+    add(courses, 'C4', 'C5')
+    # C3 requiring C1 would make C1 -> C2 -> C3 -> C1
+    with pytest.raises(ValueError):
+        add(courses, 'C3', 'C0', 'C1')
+    assert 'C3' not in courses
+
+def test_deletable_courses_are_the_ones_nothing_refers_to():
+    courses = CourseList()
+    add(courses, 'A')
+    add(courses, 'B', 'A')
+    assert list(courses.deletable) == ['B']
+    del courses['B']
+    assert list(courses.deletable) == ['A']
+
+def test_prerequisites_shared_by_two_paths_are_worked_out_in_full():
+    courses = CourseList()
+    add(courses, 'D')
+    add(courses, 'B', 'D')
+    add(courses, 'C', 'B')
+    add(courses, 'A', 'B', 'C')
+    # A reaches B both directly and through C, so B is on the stack twice while A is worked out
+    assert courses.all_prereqs('A') == {'B', 'C', 'D'}
+    assert courses.all_prereqs('C') == {'B', 'D'}
+    # D requiring C would make D -> C -> B -> D
+    with pytest.raises(ValueError):
+        add(courses, 'D', 'C')
+    assert courses['D'].prereqs == []
+
+def test_courses_are_ordered_after_their_prerequisites():
+    courses = CourseList()
+    # Courses can be loaded before the courses they require
+    add(courses, 'C', 'B')
+    add(courses, 'X')
+    add(courses, 'B', 'A')
+    add(courses, 'A')
+    order = courses.topological_order()
+    assert sorted(order) == ['A', 'B', 'C', 'X']
+    assert order.index('A') < order.index('B') < order.index('C')
+
+    # Making X a prerequisite of A moves it ahead of A and everything that requires A
+    add(courses, 'A', 'X')
+    order = courses.topological_order()
+    assert order.index('X') < order.index('A') < order.index('B') < order.index('C')
+    del courses['C']
+    assert 'C' not in courses.topological_order()
+
+def test_closures_are_updated_without_working_out_unrelated_ones_again():
+    courses = CourseList()
+    add(courses, 'C', 'B')
+    add(courses, 'Y', 'X')
+    assert courses.all_prereqs('C') == {'B'}
+    assert courses.all_prereqs('Y') == {'X'}
+    add(courses, 'B', 'A')
+    assert courses.all_prereqs('C') == {'A', 'B'}
+    assert courses.requires('C', 'A')
+    assert courses.all_dependents('A') == {'B', 'C'}
+
+    del courses['B']
+    assert courses.all_prereqs('C') == {'B'}
+    assert not courses.requires('C', 'A')
+    # Y never depended on anything that changed, so its closure was kept
+    assert 'Y' in courses._all_prereqs
+
+def rebuilt_deletable(courses, classes):
+    # The blocked set remove_course used to rebuild on every pass
+    blocked = {pr for course in courses.values() for pr in course.prereqs}
+    blocked.update(cl.course_name for cl in classes.values())
+    return sorted(set(courses) - blocked)
+
+def test_deletable_courses_follow_class_and_course_changes(data_dir):
+    _, courses, classes, _ = parse_data()
+    assert list(courses.deletable) == rebuilt_deletable(courses, classes) == []
+
+    del classes['CCPROG2 / G302A']
+    assert list(courses.deletable) == rebuilt_deletable(courses, classes) == ['CCPROG2']
+    add(courses, 'ART')
+    classes['ART / A1'] = Class('ART', 'A1', [])
+    assert list(courses.deletable) == rebuilt_deletable(courses, classes) == ['CCPROG2']
+
+    del courses['CCPROG2']
+    del classes['CCPROG1 / G302B']
+    assert list(courses.deletable) == rebuilt_deletable(courses, classes) == []
+    del classes['CCPROG1 / G303']
+    assert list(courses.deletable) == rebuilt_deletable(courses, classes) == ['CCPROG1']
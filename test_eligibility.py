@@ -0,0 +1,47 @@
+from COMET import Class, Eligibility, parse_data
+from generate_data import write_data
+
+def scanned_available(student, courses, classes, prev_enrolled):
+    # The rule enrol_class used to apply to every class on every pass
+    enrolled = [cl for cl in classes.values() if student.username in cl.student_ids]
+    units_remaining = student.unit_limit - sum(courses[cl.course_name].units for cl in enrolled)
+    enrolled_courses = {cl.course_name for cl in enrolled}
+    available = set()
+    for cl in classes.values():
+        course = courses[cl.course_name]
+        if (course.units <= units_remaining and cl.course_name not in enrolled_courses
+                and cl.course_name not in prev_enrolled and all(pr in prev_enrolled for pr in course.prereqs)):
+            available.add(cl)
+    return available
+
+def eligibilities(data):
+    users, courses, classes, prev_enrolments = data
+    for student_id in sorted(users.students)[:50]:
+        prev_enrolled = prev_enrolments[student_id].prev_enrolled if student_id in prev_enrolments else ()
+        yield Eligibility(users[student_id], courses, classes, prev_enrolled)
+
+def test_available_classes_match_checking_every_class(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_data(200, 40, 120, seed=3)
+    users, courses, classes, prev_enrolments = data = parse_data()
+    for eligibility in eligibilities(data):
+        expected = scanned_available(eligibility.student, courses, classes, eligibility.prev_enrolled)
+        assert eligibility.available_classes() == expected
+
+def test_available_classes_change_with_enrolments_and_unit_limit(data_dir):
+    users, courses, classes, prev_enrolments = parse_data()
+    student = users['200']
+    eligibility = Eligibility(student, courses, classes, ())
+    def available():
+        assert eligibility.available_classes() == scanned_available(student, courses, classes, ())
+        return {f'{cl.course_name} / {cl.classroom}' for cl in eligibility.available_classes()}
+
+    assert available() == {'magic / M204'}
+    classes.enrol('magic / M204', '200')
+    assert available() == set()
+    classes.drop('CCPROG1 / G303', '200')
+    assert available() == {'CCPROG1 / G302B', 'CCPROG1 / G303'}
+    classes['CCPROG1 / G304'] = Class('CCPROG1', 'G304', [])
+    assert available() == {'CCPROG1 / G302B', 'CCPROG1 / G303', 'CCPROG1 / G304'}
+    student.unit_limit = 4
+    assert available() == set()
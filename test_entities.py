@@ -0,0 +1,25 @@
+from COMET import parse_as_class, parse_as_course, parse_as_prev_enrolments, parse_as_user, parse_data
+
+def test_records_are_written_back_byte_for_byte():
+    for parse, line in ((parse_as_user, 'Student / 100 / pw / Ana Reyes / 20'),
+                        (parse_as_user, 'Admin / admin / admin'),
+                        (parse_as_course, 'CCPROG2 / 3 / CCPROG1 magic '),
+                        (parse_as_course, 'magic / 2 / '),
+                        (parse_as_class, 'magic / M204 / 300 100 '),
+                        (parse_as_prev_enrolments, '100 / CCPROG1 magic '),
+                        (parse_as_prev_enrolments, '200 /  ')):
+        assert parse(line).info() == line
+
+def test_records_have_no_instance_dictionaries():
+    for record in (parse_as_user('Student / 100 / pw / Ana Reyes / 20'), parse_as_user('Admin / admin / admin'),
+                   parse_as_course('magic / 2 / '), parse_as_class('magic / M204 / 300 '),
+                   parse_as_prev_enrolments('100 / CCPROG1')):
+        assert not hasattr(record, '__dict__')
+
+def test_repeated_names_share_one_string(data_dir):
+    users, courses, classes, prev_enrolments = parse_data()
+    g302b, g303 = classes['CCPROG1 / G302B'], classes['CCPROG1 / G303']
+    assert g302b.course_name is g303.course_name is courses['CCPROG1'].course_name
+    assert courses['CCPROG2'].prereqs[0] is courses['CCPROG1'].course_name
+    assert next(iter(g303.student_ids)) is users['200'].username
+    assert prev_enrolments['100'].prev_enrolled[0] is courses['CCPROG1'].course_name
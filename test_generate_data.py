@@ -0,0 +1,54 @@
+import json
+import sys
+
+import bench_memory
+import benchmark
+from COMET import parse_data
+from generate_data import write_data
+
+DATA_FILES = ('users.txt', 'courses.txt', 'classes.txt', 'prev_enrolments.txt')
+
+def test_generated_data_is_valid(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    write_data(300, 50, 120, seed=7)
+    users, courses, classes, prev_enrolments = parse_data()
+    # Nothing was skipped for being malformed or closing a cycle of prerequisites
+    assert 'Skipping' not in capsys.readouterr().out
+    assert (len(users.students), len(courses), len(classes), len(prev_enrolments)) == (300, 50, 120, 300)
+
+    order = courses.topological_order()
+    for course in courses.values():
+        assert all(order.index(pr) < order.index(course.course_name) for pr in course.prereqs)
+    for cl in classes.values():
+        assert cl.course_name in courses
+        assert all(s_id in users for s_id in cl.student_ids)
+    for student_id in prev_enrolments:
+        taken = prev_enrolments[student_id].prev_enrolled
+        for course_name in taken:
+            assert set(courses[course_name].prereqs) <= set(taken)
+
+def test_the_same_seed_makes_the_same_data(tmp_path, monkeypatch):
+    contents = []
+    for seed in (1, 1, 2):
+        monkeypatch.chdir(tmp_path)
+        write_data(50, 10, 20, seed=seed)
+        contents.append([(tmp_path / name).read_text() for name in DATA_FILES])
+    assert contents[0] == contents[1] != contents[2]
+
+def test_benchmark_writes_json_results(tmp_path, monkeypatch):
+    output = tmp_path / 'results.json'
+    monkeypatch.setattr(sys, 'argv', ['benchmark.py', '--students', '50', '--courses', '10', '--sections', '20',
+                                      '--repeat', '1', '--sample', '5', '--output', str(output)])
+    benchmark.main()
+    report = json.loads(output.read_text())
+    assert report['parameters']['students'] == 50
+    for name in ('parse_data', 'load_snapshot', 'available_classes', 'student_classes', 'save_one_change'):
+        assert set(report['results'][name]) == {'median', 'min', 'max'}
+
+def test_memory_benchmark_reads_every_previous_enrolment(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['bench_memory.py', '--students', '2000', '--courses', '50', '--classes', '200'])
+    bench_memory.main()
+    used = {line.split(':')[0]: float(line.split(':')[1].split()[0]) for line in capsys.readouterr().out.splitlines()
+            if line.endswith(' MB')}
+    assert used['Total (every previous enrolment read)'] > used['On start (previous enrolments only indexed)']
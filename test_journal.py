@@ -0,0 +1,76 @@
+import asyncio
+import os
+
+from COMET import Journal, compact_interval, is_hashed, load_data, parse_data
+from server import EnrolmentServer, MemoryEnrolments
+
+def test_journal_is_compacted_every_few_changes(data_dir):
+    data = load_data()
+    journal = Journal(None, *data, compact_every=2)
+    journal.open()
+    data[2].enrol('CCPROG1 / G302B', '100')
+    journal.record('enrol', '100', 'CCPROG1', 'G302B')
+    assert os.path.getsize(journal.path) > 0
+    assert list(parse_data()[2]['CCPROG1 / G302B'].student_ids) == []
+
+    data[2].enrol('CCPROG1 / G302B', '200')
+    journal.record('enrol', '200', 'CCPROG1', 'G302B')
+    assert os.path.getsize(journal.path) == 0
+    assert set(parse_data()[2]['CCPROG1 / G302B'].student_ids) == {'100', '200'}
+    journal.close()
+    assert not os.path.exists(journal.path)
+
+def test_server_changes_are_journalled_and_compacted(data_dir):
+    data = load_data()
+    journal = Journal(None, *data, compact_every=3)
+    journal.open()
+    server = EnrolmentServer(MemoryEnrolments(*data, journal=journal))
+    session = {}
+
+    async def send(op, **request):
+        return await server.handle(session, dict(request, op=op))
+    asyncio.run(send('login', username='100', password='pw'))
+    asyncio.run(send('enrol', course_name='magic', classroom='M204'))
+    # The plain text password was rehashed and the enrolment made, both only in the journal so far
+    with open(journal.path) as journal_txt:
+        assert [line.split(' / ')[0] for line in journal_txt] == ['password', 'enrol']
+    assert list(parse_data()[2]['magic / M204'].student_ids) == ['300']
+
+    asyncio.run(send('enrol', course_name='CCPROG2', classroom='G302A'))
+    assert os.path.getsize(journal.path) == 0
+    saved = parse_data()
+    assert is_hashed(saved[0]['100'].password)
+    assert list(saved[2]['magic / M204'].student_ids) == ['300', '100']
+    assert list(saved[2]['CCPROG2 / G302A'].student_ids) == ['100']
+    server.enrolments.close()
+
+def test_interactive_sessions_only_compact_when_saving(data_dir, monkeypatch):
+    monkeypatch.delenv('LOZOL_COMPACT_EVERY', raising=False)
+    assert compact_interval(0) is None
+    assert compact_interval(100) == 100
+
+    data = load_data()
+    journal = Journal(None, *data, compact_every=compact_interval(0))
+    journal.open()
+    for student_id in ['100', '200', '300']:
+        data[2].enrol('CCPROG1 / G302B', student_id)
+        journal.record('enrol', student_id, 'CCPROG1', 'G302B')
+    assert journal.compactions == 0
+    journal.discard_session()
+    assert list(parse_data()[2]['CCPROG1 / G302B'].student_ids) == []
+    journal.close()
+
+    monkeypatch.setenv('LOZOL_COMPACT_EVERY', '5')
+    assert compact_interval(0) == 5
+
+def test_replayed_enrolment_that_now_clashes_is_ignored(data_dir):
+    with open(data_dir / 'classes.txt', 'a') as classes_txt:
+        classes_txt.write('\nmagic / M205 /  / 5 /  / TUE1000-1100')
+    # A session left behind a journal enrolling 100 in magic / M205, and meanwhile 100 was enrolled in G303
+    (data_dir / 'journal.left.txt').write_text('enrol / 100 / magic / M205\n')
+    data = load_data()
+    data[2].enrol('CCPROG1 / G303', '100')
+    journal = Journal(None, *data)
+    assert journal.replay() == 1
+    assert list(data[2]['magic / M205'].student_ids) == []
+    journal.close()
@@ -0,0 +1,32 @@
+from COMET import PAGE_SIZE, Student, UserList, show_listing
+
+def make_students():
+    users = UserList()
+    for number in range(PAGE_SIZE * 2):
+        users[str(1000 + number)] = Student(str(1000 + number), 'pw', f'Student {number}', 20)
+    users['9000'] = Student('9000', 'pw', 'Maria Clara', 20)
+    users['9001'] = Student('9001', 'pw', 'Jose Rizal', 20)
+    return users
+
+def listed_rows(users, answers, monkeypatch, capsys, prompts=None):
+    answers = iter(answers)
+    def answer(prompt):
+        if prompts is not None:
+            prompts.append(prompt)
+        return next(answers)
+    monkeypatch.setattr('builtins.input', answer)
+    show_listing('Students', users.students, lambda key: f'row {key}', search=users.find)
+    return [line for line in capsys.readouterr().out.splitlines() if line.startswith('row ')]
+
+def test_student_filter_matches_names(monkeypatch, capsys):
+    rows = listed_rows(make_students(), ['f', 'rizal', ''], monkeypatch, capsys)
+    assert rows[PAGE_SIZE:] == ['row 9001']
+
+def test_student_filter_matches_id_numbers(monkeypatch, capsys):
+    rows = listed_rows(make_students(), ['f', '900', ''], monkeypatch, capsys)
+    assert rows[PAGE_SIZE:] == ['row 9000', 'row 9001']
+
+def test_student_filter_prompt_says_it_searches(monkeypatch, capsys):
+    prompts = []
+    listed_rows(make_students(), ['f', 'maria', ''], monkeypatch, capsys, prompts)
+    assert prompts[1] == 'Search names and ID numbers (leave blank for all): '
@@ -0,0 +1,18 @@
+import COMET
+from metrics import COMET_FUNCTIONS, COMET_METHODS, instrument_comet
+
+def test_parsing_is_timed(data_dir, monkeypatch):
+    # Lets monkeypatch put back the functions instrument_comet() replaces
+    for attribute in COMET_FUNCTIONS:
+        monkeypatch.setattr(COMET, attribute, getattr(COMET, attribute))
+    for class_name, attribute in COMET_METHODS:
+        owner = getattr(COMET, class_name)
+        monkeypatch.setattr(owner, attribute, getattr(owner, attribute))
+    metrics = instrument_comet(COMET)
+
+    COMET.parse_data()
+    counts = {name: timings['count'] for name, timings in metrics.to_json().items()}
+    assert counts['parse_data'] == 1
+    assert counts['parse_as_user'] == 4
+    assert counts['parse_as_course'] == 3
+    assert counts['parse_as_class'] == 4
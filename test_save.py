@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+import shards
+from COMET import Student, file_stamp, load_data, parse_data, save_data, write_atomic
+
+def test_concurrent_enrolments_in_the_same_class_are_merged(data_dir):
+    first = load_data()
+    second = load_data()
+    first[2].enrol('CCPROG1 / G302B', '100')
+    second[2].enrol('CCPROG1 / G302B', '200')
+
+    assert save_data(*first) == []
+    assert save_data(*second) == []
+
+    classes = parse_data()[2]
+    assert set(classes['CCPROG1 / G302B'].student_ids) == {'100', '200'}
+
+def test_conflicting_user_edits_keep_the_first_save(data_dir):
+    first = load_data()
+    second = load_data()
+    first[0]['100'] = Student('100', 'pw', 'Ana R', 20)
+    second[0]['100'] = Student('100', 'pw', 'Ana Reyes-Cruz', 20)
+
+    assert save_data(*first) == []
+    assert save_data(*second) == ['100 (changed by another session)']
+    assert parse_data()[0]['100'].name == 'Ana R'
+
+def test_enrolment_past_capacity_is_rejected(data_dir):
+    first = load_data()
+    second = load_data()
+    first[2].drop('CCPROG1 / G303', '200')
+    first[2].enrol('CCPROG1 / G303', '100')
+    second[2].enrol('CCPROG1 / G303', '300')
+
+    assert save_data(*first) == []
+    assert save_data(*second) == ['enrolment of 300 in CCPROG1 / G303 (the class is full)']
+    assert list(parse_data()[2]['CCPROG1 / G303'].student_ids) == ['100']
+
+def test_enrolment_clashing_with_another_sessions_is_rejected(data_dir):
+    with open(data_dir / 'classes.txt', 'a') as classes_txt:
+        classes_txt.write('\nmagic / M205 /  / 5 /  / TUE1000-1100\nCCPROG2 / G305 /  / 5 /  / TUE1000-1100')
+    first = load_data()
+    second = load_data()
+    first[2].enrol('CCPROG2 / G305', '300')
+    first[2].enrol('magic / M205', '200')
+    second[2].enrol('magic / M205', '300')
+
+    assert save_data(*first) == []
+    assert save_data(*second) == ['enrolment of 300 in magic / M205 (clashes with CCPROG2 / G305, changed by another session)']
+    classes = parse_data()[2]
+    assert list(classes['magic / M205'].student_ids) == ['200']
+    assert list(classes['CCPROG2 / G305'].student_ids) == ['300']
+    assert second[2].student_clash('300', 'magic / M205') == 'CCPROG2 / G305'
+
+def test_concurrent_enrolments_in_sharded_classes_are_merged(data_dir):
+    shards.split(0)
+    first = load_data()
+    second = load_data()
+    first[2].enrol('CCPROG1 / G302B', '100')
+    second[2].enrol('CCPROG1 / G302B', '200')
+    second[2].drop('magic / M204', '300')
+
+    assert save_data(*first) == []
+    assert save_data(*second) == []
+
+    classes = parse_data()[2]
+    assert set(classes['CCPROG1 / G302B'].student_ids) == {'100', '200'}
+    assert list(classes['magic / M204'].student_ids) == []
+    assert classes.student_entry('200').shards == ('CCPROG1',)
+    assert classes.student_entry('300') is None
+
+def stamps(data_dir):
+    return {path.name: file_stamp(path) for path in data_dir.iterdir() if path.suffix == '.txt'}
+
+def test_only_the_files_with_changes_are_written(data_dir):
+    data = load_data()
+    before = stamps(data_dir)
+    assert save_data(*data) == []
+    assert stamps(data_dir) == before
+
+    data[2].enrol('CCPROG1 / G302B', '300')
+    assert save_data(*data) == []
+    after = stamps(data_dir)
+    assert {name for name in before if after[name] != before[name]} == {'classes.txt'}
+    assert not list(data_dir.glob('*.tmp'))
+
+def test_unchanged_records_are_written_back_as_they_were(data_dir):
+    original = (data_dir / 'users.txt').read_text()
+    data = load_data()
+    data[0].touch('100')
+    save_data(*data)
+    assert (data_dir / 'users.txt').read_text() == original
+
+def test_a_failed_write_leaves_the_old_file(data_dir, monkeypatch):
+    def fail(fd):
+        raise OSError('disk full')
+    original = (data_dir / 'users.txt').read_text()
+    monkeypatch.setattr(os, 'fsync', fail)
+    with pytest.raises(OSError):
+        write_atomic('users.txt', ['Admin / admin / admin'])
+    assert (data_dir / 'users.txt').read_text() == original
@@ -0,0 +1,42 @@
+from COMET import Admin, SearchIndex, Student, UserList, parse_data
+
+def test_words_are_found_by_their_start_or_with_one_mistake():
+    index = SearchIndex([('a', ['Maria', 'Clara']), ('b', ['Mario']), ('c', ['Clarissa'])])
+    assert index.starts_with('mar') == {'a', 'b'}
+    assert index.starts_with('CLAR') == {'a', 'c'}
+    assert index.fuzzy('clra') == {'a'}
+    assert index.fuzzy('mraio') == set()
+
+def test_updating_a_record_replaces_its_words():
+    index = SearchIndex([('a', ['Maria'])])
+    index.update('a', ['Jose'])
+    assert index.starts_with('mar') == set()
+    assert index.starts_with('jo') == {'a'}
+    index.update('a', ())
+    assert index.starts_with('jo') == set()
+
+def test_students_are_found_by_id_and_name():
+    users = UserList()
+    users['admin'] = Admin('admin', 'pw')
+    users['100'] = Student('100', 'pw', 'Ana Reyes', 20)
+    users['200'] = Student('200', 'pw', 'Ben Reyes', 20)
+    assert users.find('reyes') == {'100', '200'}
+    assert users.find('ana reyes') == {'100'}
+    assert users.find('Reyez') == {'100', '200'}
+    assert users.find('20') == {'200'}
+    assert users.find('admin') == set()
+
+    # The index is kept up to date once it is built
+    users['100'].name = 'Ana Lopez'
+    users.touch('100')
+    users['300'] = Student('300', 'pw', 'Cara Lopez', 20)
+    del users['200']
+    assert users.find('lopez') == {'100', '300'}
+    assert users.find('reyes') == set()
+
+def test_classes_and_courses_are_found_by_name(data_dir):
+    users, courses, classes, _ = parse_data()
+    assert classes.find('ccprog1') == {'CCPROG1 / G302B', 'CCPROG1 / G303'}
+    assert classes.find('ccprog1 g303') == {'CCPROG1 / G303'}
+    assert classes.find('CCPROG3') == {'CCPROG1 / G302B', 'CCPROG1 / G303', 'CCPROG2 / G302A'}
+    assert courses.find('mag') == {'magic'}
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import time
+
+from COMET import Class, hash_password, is_hashed, parse_data
+from server import EnrolmentServer, MemoryEnrolments
+
+def test_login_does_not_hold_up_other_clients(data_dir, monkeypatch):
+    monkeypatch.setenv('LOZOL_KDF', 'scrypt:15')
+    enrolments = MemoryEnrolments(*parse_data())
+    enrolments.users['100'].password = hash_password('pw')
+    server = EnrolmentServer(enrolments)
+
+    async def run():
+        gaps = []
+        async def tick():
+            # Records the longest time the event loop went without running this client
+            last = time.perf_counter()
+            for _ in range(40):
+                await asyncio.sleep(0.005)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+        async def logins():
+            await asyncio.sleep(0.02)
+            return await asyncio.gather(*(server.handle({}, {'op': 'login', 'username': '100', 'password': password})
+                                          for password in ('pw', 'wrong', 'pw')))
+        responses, _ = await asyncio.gather(logins(), tick())
+        return responses, max(gaps)
+
+    responses, longest_gap = asyncio.run(run())
+    assert [response['ok'] for response in responses] == [True, False, True]
+    # Each scrypt check takes over 100ms, which would show up as a gap if it ran on the event loop
+    assert longest_gap < 0.08
+
+def test_login_rehashes_plain_text_passwords(data_dir):
+    enrolments = MemoryEnrolments(*parse_data())
+    server = EnrolmentServer(enrolments)
+    response = asyncio.run(server.handle({}, {'op': 'login', 'username': '200', 'password': 'pw'}))
+    assert response == {'ok': True, 'name': 'Ben Cruz'}
+    assert is_hashed(enrolments.users['200'].password)
+    assert '200' in enrolments.users.changed
+
+def test_eligibilities_are_kept_for_as_many_students_as_previous_enrolments(data_dir):
+    enrolments = MemoryEnrolments(*parse_data())
+    enrolments.prev_enrolments.max_size = 2
+    for student_id in ('100', '200', '100', '300'):
+        enrolments.listing(enrolments.users[student_id])
+    assert list(enrolments.eligibilities) == ['100', '300']
+    assert len(enrolments.prev_enrolments.cache) <= 2
+
+def logged_in(server, username):
+    session = {}
+    response = asyncio.run(server.handle(session, {'op': 'login', 'username': username, 'password': 'pw'}))
+    assert response['ok']
+    return session
+
+def test_list_enrol_and_drop(data_dir):
+    server = EnrolmentServer(MemoryEnrolments(*parse_data()))
+    session = logged_in(server, '300')
+
+    def send(op, **request):
+        return asyncio.run(server.handle(session, dict(request, op=op)))
+    # Full classes are listed too, since the student can join their waitlist
+    assert send('list') == {'ok': True, 'available': [('CCPROG1', 'G302B'), ('CCPROG1', 'G303')],
+                            'enrolled': [('magic', 'M204')]}
+    assert send('enrol', course_name='CCPROG1', classroom='G302B') == {'ok': True}
+    assert send('enrol', course_name='CCPROG2', classroom='G302A') == \
+        {'ok': False, 'error': 'missing prerequisites: CCPROG1'}
+    assert send('drop', course_name='magic', classroom='M204') == {'ok': True}
+    assert send('drop', course_name='magic', classroom='M204') == {'ok': False, 'error': 'not enrolled in class'}
+    assert send('list')['enrolled'] == [('CCPROG1', 'G302B')]
+    assert send('shout') == {'ok': False, 'error': "unknown op 'shout'"}
+    assert asyncio.run(server.handle({}, {'op': 'list'})) == {'ok': False, 'error': 'not logged in'}
+    assert asyncio.run(server.handle({}, {'op': 'login', 'username': 'admin', 'password': 'admin'})) == \
+        {'ok': False, 'error': 'only students can use the enrolment server'}
+
+def test_only_one_of_many_clients_gets_the_last_seat(data_dir):
+    enrolments = MemoryEnrolments(*parse_data())
+    enrolments.classes['magic / M205'] = Class('magic', 'M205', [], 1)
+    server = EnrolmentServer(enrolments)
+    sessions = [logged_in(server, username) for username in ('100', '200')]
+
+    async def run():
+        return await asyncio.gather(*(server.handle(session, {'op': 'enrol', 'course_name': 'magic', 'classroom': 'M205'})
+                                      for session in sessions))
+    responses = asyncio.run(run())
+    assert sorted(response['ok'] for response in responses) == [False, True]
+    assert len(enrolments.classes['magic / M205'].student_ids) == 1
+    # Locks are dropped once no request is using them
+    assert server.class_locks == {} and server.student_locks == {}
+
+def test_requests_over_tcp(data_dir):
+    server = EnrolmentServer(MemoryEnrolments(*parse_data()))
+
+    async def run():
+        tcp_server = await asyncio.start_server(server.serve_client, '127.0.0.1', 0)
+        port = tcp_server.sockets[0].getsockname()[1]
+        async with tcp_server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            responses = []
+            for line in (b'{"op": "login", "username": "300", "password": "pw"}\n', b'not json\n',
+                         b'{"op": "login", "username": ["300"], "password": "pw"}\n',
+                         b'{"op": "enrol", "course_name": {}, "classroom": "G302B"}\n', b'{"op": "list"}\n'):
+                writer.write(line)
+                await writer.drain()
+                responses.append(json.loads(await reader.readline()))
+            writer.close()
+            return responses
+    login, *malformed, listing = asyncio.run(run())
+    assert login == {'ok': True, 'name': 'Cara Santos'}
+    assert malformed == [{'ok': False, 'error': 'malformed request'}] * 3
+    assert listing['enrolled'] == [['magic', 'M204']]
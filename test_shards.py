@@ -0,0 +1,42 @@
+import os
+
+import shards
+from COMET import SHARD_INDEX, load_data, parse_data, save_data
+
+def test_split_save_reload_and_join(data_dir):
+    assert shards.split(0) == (4, 3)
+    users, courses, classes, prev_enrolments = load_data()
+    assert classes.loaded == {} and classes.student_buckets == {}
+
+    assert [cl.classroom for cl in classes.student_classes('300')] == ['M204']
+    assert set(classes.loaded) == {'magic'}
+
+    classes.drop('magic / M204', '300')
+    classes.enrol('CCPROG1 / G302B', '300')
+    assert 'CCPROG2' not in classes.loaded
+    assert save_data(users, courses, classes, prev_enrolments) == []
+
+    classes = parse_data()[2]
+    assert [cl.classroom for cl in classes.student_classes('300')] == ['G302B']
+    assert classes.student_entry('300').shards == ('CCPROG1',)
+    assert 'magic' not in classes.loaded
+
+    assert shards.join() == 4
+    assert not os.path.exists(SHARD_INDEX)
+    classes = parse_data()[2]
+    assert list(classes['CCPROG1 / G302B'].student_ids) == ['300']
+    assert list(classes['magic / M204'].student_ids) == []
+
+def test_student_index_entries_from_two_sessions_are_merged(data_dir):
+    shards.split(0)
+    first = load_data()
+    second = load_data()
+    first[2].enrol('CCPROG1 / G302B', '100')
+    second[2].enrol('magic / M204', '100')
+
+    assert save_data(*first) == []
+    assert save_data(*second) == []
+
+    classes = parse_data()[2]
+    assert classes.student_entry('100').shards == ('CCPROG1', 'magic')
+    assert {cl.classroom for cl in classes.student_classes('100')} == {'G302B', 'M204'}
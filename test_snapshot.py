@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+import COMET
+from COMET import load_data, load_snapshot, parse_data
+
+def lines(data):
+    users, courses, classes, prev_enrolments = data
+    return [sorted(record.info() for record in records.values()) for records in (users, courses, classes, prev_enrolments)]
+
+def test_the_snapshot_is_loaded_instead_of_the_text_files(data_dir, monkeypatch):
+    parsed = load_data()
+    assert (data_dir / COMET.SNAPSHOT_PATH).exists()
+    def parse_data():
+        raise AssertionError('the text files were parsed')
+    monkeypatch.setattr(COMET, 'parse_data', parse_data)
+
+    loaded = load_data()
+    assert lines(loaded) == lines(parsed)
+    users, courses, classes, prev_enrolments = loaded
+    # The indexes come back with the records
+    assert [cl.classroom for cl in classes.student_classes('200')] == ['G303']
+    assert courses.all_prereqs('CCPROG2') == {'CCPROG1'}
+    assert courses.references == parsed[1].references == {'CCPROG1': 3, 'magic': 1, 'CCPROG2': 1}
+    assert users.find('cara') == {'300'}
+
+def test_a_stale_snapshot_is_parsed_again(data_dir):
+    load_data()
+    with open(data_dir / 'users.txt', 'a') as users_txt:
+        users_txt.write('\nStudent / 400 / pw / Dan Reyes / 20')
+    assert '400' in load_data()[0]
+    assert lines(load_data()) == lines(parse_data())
+
+def test_a_damaged_snapshot_is_ignored(data_dir):
+    load_data()
+    (data_dir / COMET.SNAPSHOT_PATH).write_bytes(b'not a snapshot')
+    assert lines(load_data()) == lines(parse_data())
+
+def test_a_snapshot_others_could_write_is_not_unpickled(data_dir):
+    for path in COMET.DATA_FILES:
+        os.chmod(data_dir / path, 0o644)
+    load_data()
+    snapshot = data_dir / COMET.SNAPSHOT_PATH
+    assert os.stat(snapshot).st_mode & 0o777 == 0o644
+    assert load_snapshot() is not None
+
+    os.chmod(snapshot, 0o666)
+    assert load_snapshot() is None
+    # Once the text files can be written by everyone too, the snapshot is no easier to tamper with than they are
+    for path in COMET.DATA_FILES:
+        os.chmod(data_dir / path, 0o666)
+    assert load_snapshot() is not None
+
+@pytest.mark.skipif(not hasattr(os, 'getuid') or os.getuid() != 0, reason='changing the owner of a file needs root')
+def test_a_snapshot_owned_by_someone_else_is_not_unpickled(data_dir):
+    load_data()
+    os.chown(data_dir / COMET.SNAPSHOT_PATH, 12345, -1)
+    assert load_snapshot() is None
+    assert lines(load_data()) == lines(parse_data())
@@ -0,0 +1,34 @@
+from COMET import TextStorage
+from sqlite_storage import SqliteStorage
+
+def open_database(path):
+    storage = SqliteStorage(str(path))
+    storage.import_data(*TextStorage().load())
+    return storage
+
+def test_concurrent_enrolments_in_the_same_class_are_merged(data_dir):
+    path = data_dir / 'lozol.db'
+    open_database(path).close()
+    first, second = SqliteStorage(str(path)), SqliteStorage(str(path))
+    first_data, second_data = first.load(), second.load()
+    first_data[2].enrol('CCPROG1 / G302B', '100')
+    second_data[2].enrol('CCPROG1 / G302B', '200')
+
+    assert first.save(*first_data) == []
+    assert second.save(*second_data) == []
+
+    classes = SqliteStorage(str(path)).load()[2]
+    assert set(classes['CCPROG1 / G302B'].student_ids) == {'100', '200'}
+
+def test_enrolment_past_capacity_is_rejected(data_dir):
+    path = data_dir / 'lozol.db'
+    open_database(path).close()
+    first, second = SqliteStorage(str(path)), SqliteStorage(str(path))
+    first_data, second_data = first.load(), second.load()
+    first_data[2].drop('CCPROG1 / G303', '200')
+    first_data[2].enrol('CCPROG1 / G303', '100')
+    second_data[2].enrol('CCPROG1 / G303', '300')
+
+    assert first.save(*first_data) == []
+    assert second.save(*second_data) == ['enrolment of 300 in CCPROG1 / G303 (the class is full)']
+    assert list(SqliteStorage(str(path)).load()[2]['CCPROG1 / G303'].student_ids) == ['100']
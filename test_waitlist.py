@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from COMET import (Waitlist, load_data, parse_data, parse_waitlist, promote_waitlisted, save_data,
+                   waitlist_priority)
+from server import EnrolmentServer, MemoryEnrolments
+
+def test_waitlist_promotes_by_priority_then_joining_order():
+    waitlist = Waitlist()
+    for student_id, priority in (('100', 0), ('200', -2), ('300', 0), ('400', -2)):
+        assert waitlist.add(student_id, priority)
+    assert not waitlist.add('100', -5)
+    assert waitlist.discard('400')
+    assert not waitlist.discard('400')
+    assert waitlist.entries() == [('200', -2), ('100', 0), ('300', 0)]
+    assert parse_waitlist(waitlist.info()).entries() == waitlist.entries()
+    assert [waitlist.pop() for _ in range(4)] == ['200', '100', '300', None]
+
+def test_waitlist_priority_setting(monkeypatch):
+    assert waitlist_priority(None, ['CCPROG1', 'magic']) == 0
+    monkeypatch.setenv('LOZOL_WAITLIST', 'seniority')
+    assert waitlist_priority(None, ['CCPROG1', 'magic']) == -2
+    monkeypatch.setenv('LOZOL_WAITLIST', 'alphabetical')
+    with pytest.raises(ValueError):
+        waitlist_priority(None, [])
+
+def test_dropping_promotes_the_next_student_who_can_still_enrol(data_dir):
+    users, courses, classes, prev_enrolments = data = parse_data()
+    # 100 already took CCPROG1, so is passed over and taken off the waitlist
+    classes.join_waitlist('CCPROG1 / G303', '100')
+    classes.join_waitlist('CCPROG1 / G303', '300')
+    classes.drop('CCPROG1 / G303', '200')
+    assert promote_waitlisted('CCPROG1 / G303', *data) == ['300']
+    assert list(classes['CCPROG1 / G303'].student_ids) == ['300']
+    assert len(classes['CCPROG1 / G303'].waitlist) == 0
+
+def test_waitlists_from_two_sessions_are_merged_on_save(data_dir):
+    first = load_data()
+    second = load_data()
+    first[2].join_waitlist('CCPROG1 / G303', '300')
+    second[2].join_waitlist('CCPROG1 / G303', '100', -1)
+
+    assert save_data(*first) == []
+    assert save_data(*second) == []
+    assert parse_data()[2]['CCPROG1 / G303'].waitlist.entries() == [('100', -1), ('300', 0)]
+
+def test_server_only_waitlists_students_for_full_classes(data_dir):
+    server = EnrolmentServer(MemoryEnrolments(*parse_data()))
+    session = {}
+
+    async def send(op, **request):
+        return await server.handle(session, dict(request, op=op))
+    asyncio.run(send('login', username='300', password='pw'))
+    assert asyncio.run(send('waitlist', course_name='CCPROG1', classroom='G302B')) == \
+        {'ok': False, 'error': 'class is not full'}
+    assert asyncio.run(send('waitlist', course_name='CCPROG1', classroom='G303')) == {'ok': True}
+    assert asyncio.run(send('waitlist', course_name='CCPROG1', classroom='G303')) == \
+        {'ok': False, 'error': 'already on waitlist'}